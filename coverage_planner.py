@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Coverage planner: แบ่งอำเภอ/จังหวัดเป็น grid แล้วรัน Stage 1 แบบ geo-anchored ทีละ tile 🗺️
+- ขอบเขตพื้นที่: --bounds > data/th_bounds.json > พิกัดของ places ใน DB ที่ที่อยู่ตรงกับอำเภอ/จังหวัด
+- แต่ละ tile = scraper 1 ตัว (-geo lat,lon -zoom z) รันผ่าน stage1_runner (warm container, หลาย shard)
+- ผลต่อ tile เก็บในตาราง geo_tiles: tile ที่รอบก่อนได้ place ใหม่น้อย (อิ่มตัว) ถูกข้าม,
+  tile ที่ผลชนเพดานของ Google Maps ถูกแบ่งเป็น 4 tile ย่อยในรอบถัดไป
+รันจาก root: python coverage_planner.py --query "ร้านอาหาร" --province กรุงเทพมหานคร --amphoe สายไหม
+"""
+import sys
+import os
+import json
+import math
+import time
+import argparse
+
+import pipeline_db
+from stage1_runner import ShardedStage1Runner, install_stop_handler, read_result_ids
+
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except Exception:
+        pass
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+BOUNDS_FILE = os.path.join(PROJECT_ROOT, 'data', 'th_bounds.json')
+
+RESULT_CAP = 120  # Google Maps แสดงผลต่อการค้นหาได้ประมาณนี้ — ถึงเพดาน = tile หนาแน่น ควรแบ่งย่อย
+MIN_PLACES_FOR_BOUNDS = 5
+KM_PER_DEG_LAT = 110.574
+
+
+def load_bounds_table(path=BOUNDS_FILE):
+    """{province: {amphoe หรือ '*': [south, west, north, east]}}"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def bounds_from_places(conn, province, amphoe=None):
+    """ขอบเขตจากพิกัดของ places ที่ที่อยู่มีชื่ออำเภอ/จังหวัด (ตัด outlier หัวท้าย 2%)"""
+    sql = "SELECT latitude, longitude FROM places WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND address LIKE ?"
+    params = [f"%{province}%"]
+    if amphoe:
+        sql += " AND address LIKE ?"
+        params.append(f"%{amphoe}%")
+    points = conn.execute(sql, params).fetchall()
+    if len(points) < MIN_PLACES_FOR_BOUNDS:
+        return None
+
+    lats = sorted(p[0] for p in points)
+    lons = sorted(p[1] for p in points)
+    trim = len(points) // 50
+    return [lats[trim], lons[trim], lats[-1 - trim], lons[-1 - trim]]
+
+
+def resolve_bounds(conn, province, amphoe=None, bounds=None):
+    """
+    คืน ([south, west, north, east], source) หรือ (None, None)
+    amphoe ที่ไม่รู้ขอบเขต → (None, None) ไม่ใช้กรอบทั้งจังหวัดแทน (ทั้งจังหวัด = หลายร้อย tile)
+    """
+    if bounds:
+        return bounds, 'manual'
+    table = load_bounds_table().get(province, {})
+    if amphoe and amphoe in table:
+        return table[amphoe], BOUNDS_FILE
+    if not amphoe and '*' in table:
+        return table['*'], BOUNDS_FILE
+    found = bounds_from_places(conn, province, amphoe)
+    if found:
+        return found, 'places'
+    return None, None
+
+
+def zoom_for_tile(size_km, lat):
+    """zoom ที่หน้าจอ Maps (~1000px) กว้างประมาณ size_km"""
+    width_km_at_zoom0 = 4 * 40075 * math.cos(math.radians(lat))
+    return max(10, min(18, round(math.log2(width_km_at_zoom0 / size_km))))
+
+
+def make_tile(south, west, size_km):
+    lat_step = size_km / KM_PER_DEG_LAT
+    lon_step = size_km / (111.320 * math.cos(math.radians(south + lat_step / 2)))
+    north, east = south + lat_step, west + lon_step
+    center_lat = (south + north) / 2
+    return {
+        'key': f"{south:.5f},{west:.5f},{size_km:g}",
+        'south': south, 'west': west, 'north': north, 'east': east,
+        'size_km': size_km,
+        'center': (center_lat, (west + east) / 2),
+        'zoom': zoom_for_tile(size_km, center_lat),
+    }
+
+
+def grid_tiles(bounds, size_km):
+    """แบ่ง bounds เป็น tile ขนาด size_km × size_km"""
+    south, west, north, east = bounds
+    tiles = []
+    lat = south
+    while lat < north:
+        first = make_tile(lat, west, size_km)
+        lon = west
+        while lon < east:
+            tiles.append(make_tile(lat, lon, size_km))
+            lon = tiles[-1]['east']
+        lat = first['north']
+    return tiles
+
+
+def split_tile(tile):
+    half = tile['size_km'] / 2
+    mid_lat = (tile['south'] + tile['north']) / 2
+    children = []
+    for south in (tile['south'], mid_lat):
+        first = make_tile(south, tile['west'], half)
+        children.append(first)
+        children.append(make_tile(south, first['east'], half))
+    return children
+
+
+class CoveragePlanner:
+    def __init__(self, db_path, query, tile_km=2.0, min_tile_km=0.5, min_new=5):
+        """
+        Args:
+            db_path: SQLite database
+            query: คำค้นหา (ใช้กับทุก tile)
+            tile_km: ขนาด tile เริ่มต้น (km)
+            min_tile_km: tile หนาแน่นแบ่งย่อยได้ไม่เล็กกว่านี้
+            min_new: รอบก่อนได้ place ใหม่น้อยกว่านี้ = tile อิ่มตัว (ข้าม)
+        """
+        self.db_path = db_path
+        self.query = query
+        self.tile_km = tile_km
+        self.min_tile_km = min_tile_km
+        self.min_new = min_new
+
+    def load_history(self, conn):
+        """{tile_key: (results, new_results)} ของ query นี้"""
+        return {
+            key: (results, new_results)
+            for key, results, new_results in conn.execute(
+                "SELECT tile_key, results, new_results FROM geo_tiles WHERE query = ?", (self.query,)
+            )
+        }
+
+    def plan(self, conn, bounds):
+        """คืน list ของ tile พร้อม status: pending / saturated / done (+ coverage = places ใน DB ที่อยู่ใน tile)"""
+        history = self.load_history(conn)
+
+        def expand(tile):
+            results, new_results = history.get(tile['key'], (None, None))
+            if results is not None and results >= RESULT_CAP and tile['size_km'] / 2 >= self.min_tile_km:
+                return [t for child in split_tile(tile) for t in expand(child)]
+            if results is None:
+                tile['status'] = 'pending'
+            elif new_results is not None and new_results < self.min_new:
+                tile['status'] = 'saturated'
+            else:
+                tile['status'] = 'done'
+            tile['last_results'] = results
+            return [tile]
+
+        tiles = [t for tile in grid_tiles(bounds, self.tile_km) for t in expand(tile)]
+
+        # coverage: นับ places ใน DB ตามพิกัด (โหลดครั้งเดียว แล้ว bin ผ่าน cell 0.01° ไม่ต้องเทียบทุก tile)
+        cells = {}
+        for tile in tiles:
+            tile['coverage'] = 0
+            for lat_cell in range(math.floor(tile['south'] * 100), math.floor(tile['north'] * 100) + 1):
+                for lon_cell in range(math.floor(tile['west'] * 100), math.floor(tile['east'] * 100) + 1):
+                    cells.setdefault((lat_cell, lon_cell), []).append(tile)
+        south, west, north, east = bounds
+        points = conn.execute("""
+            SELECT latitude, longitude FROM places
+            WHERE latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?
+        """, (south, north + 0.1, west, east + 0.1)).fetchall()
+        for lat, lon in points:
+            for tile in cells.get((math.floor(lat * 100), math.floor(lon * 100)), ()):
+                if tile['south'] <= lat < tile['north'] and tile['west'] <= lon < tile['east']:
+                    tile['coverage'] += 1
+                    break
+        return tiles
+
+    def record(self, conn, tile, results, new_results):
+        conn.execute("""
+            INSERT INTO geo_tiles (query, tile_key, south, west, north, east, zoom, runs, results, new_results, last_run_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?, ?, strftime('%s', 'now'))
+            ON CONFLICT(query, tile_key) DO UPDATE SET
+                runs = geo_tiles.runs + 1,
+                results = excluded.results,
+                new_results = excluded.new_results,
+                last_run_at = excluded.last_run_at
+        """, (self.query, tile['key'], tile['south'], tile['west'], tile['north'], tile['east'], tile['zoom'],
+              results, new_results))
+
+    def run(self, runner, tiles, rerun_done=False):
+        """รัน tile ที่ยังไม่อิ่มตัวผ่าน runner — คืน True ถ้าทุก tile สำเร็จ"""
+        todo = [t for t in tiles if t['status'] == 'pending' or (rerun_done and t['status'] == 'done')]
+        if not todo:
+            print("[INFO] ทุก tile อิ่มตัวแล้ว — ไม่มีอะไรต้องรัน")
+            return True
+
+        conn = pipeline_db.connect(self.db_path)
+        try:
+            known = {row[0] for row in conn.execute("SELECT place_id FROM places")}
+        finally:
+            conn.close()
+
+        print(f"[START] Coverage: {len(todo)} tile(s) ({len(tiles) - len(todo)} skipped)", flush=True)
+        ok = runner.run(
+            groups=[[self.query] for _ in todo],
+            max_parallel=runner.shards,
+            shard_args=[['-geo', f"{t['center'][0]:.6f},{t['center'][1]:.6f}", '-zoom', str(t['zoom'])] for t in todo],
+        )
+
+        conn = pipeline_db.connect(self.db_path)
+        try:
+            for shard_no, tile in enumerate(todo, 1):
+                shard = runner.stats[shard_no]
+                if shard['returncode'] != 0:
+                    continue
+                ids = read_result_ids(os.path.join(PROJECT_ROOT, shard['results_file']))
+                new_ids = ids - known
+                known |= ids
+                self.record(conn, tile, len(ids), len(new_ids))
+                tile['last_results'] = len(ids)
+                tile['status'] = 'saturated' if len(new_ids) < self.min_new else 'done'
+                if len(ids) >= RESULT_CAP:
+                    tile['status'] = 'dense'  # รอบหน้าแบ่งเป็น 4 tile ย่อย
+            conn.commit()
+        finally:
+            conn.close()
+        return ok
+
+
+def print_plan(tiles):
+    print(f"\n{'tile':<28} {'center':<22} {'zoom':>4} {'cover':>6} {'last':>5}  status")
+    for tile in tiles:
+        center = f"{tile['center'][0]:.4f},{tile['center'][1]:.4f}"
+        last = tile.get('last_results')
+        print(f"{tile['key']:<28} {center:<22} {tile['zoom']:>4} {tile['coverage']:>6} {last if last is not None else '-':>5}  {tile['status']}")
+    counts = {}
+    for tile in tiles:
+        counts[tile['status']] = counts.get(tile['status'], 0) + 1
+    print(f"\n[PLAN] {len(tiles)} tiles: " + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Coverage planner: รัน Stage 1 แบบ geo-anchored ทีละ tile')
+    parser.add_argument('--db', default='pipeline.db', help='SQLite database path')
+    parser.add_argument('--query', required=True, help='คำค้นหา เช่น "ร้านอาหาร สายไหม กรุงเทพมหานคร"')
+    parser.add_argument('--province', required=True, help='จังหวัด (หาขอบเขตพื้นที่)')
+    parser.add_argument('--amphoe', help='เขต/อำเภอ')
+    parser.add_argument('--whole-province', action='store_true',
+                        help='tile ทั้งจังหวัด (ไม่ใส่ --amphoe) — จังหวัดหนึ่งอาจมีหลายร้อย tile ต้องเลือกเอง')
+    parser.add_argument('--bounds', help='กำหนดขอบเขตเอง: south,west,north,east')
+    parser.add_argument('--tile-km', type=float, default=2.0, help='ขนาด tile (km)')
+    parser.add_argument('--min-tile-km', type=float, default=0.5, help='tile หนาแน่นแบ่งย่อยได้ไม่เล็กกว่านี้ (km)')
+    parser.add_argument('--min-new', type=int, default=5, help='รอบก่อนได้ place ใหม่น้อยกว่านี้ = tile อิ่มตัว')
+    parser.add_argument('--rerun-done', action='store_true', help='รัน tile ที่เคยรันแล้วแต่ยังไม่อิ่มตัวซ้ำ')
+    parser.add_argument('--plan-only', action='store_true', help='แสดงแผน/coverage อย่างเดียว ไม่รัน scraper')
+    parser.add_argument('--shards', type=int, default=2, help='จำนวน containers ที่รันพร้อมกัน')
+    parser.add_argument('--depth', type=int, default=1, help='Search depth ต่อ tile')
+    parser.add_argument('--work-dir', help='path ของ project ที่ Docker daemon เห็น (default: project root)')
+    parser.add_argument('--upsert', action='store_true', help='นำเข้าแบบ upsert (อัปเดต place ที่ข้อมูลเปลี่ยน)')
+    args = parser.parse_args()
+    if not (args.amphoe or args.bounds or args.whole_province):
+        parser.error('ใส่ --amphoe หรือ --bounds (หรือ --whole-province ถ้าต้องการ tile ทั้งจังหวัดจริง ๆ)')
+    install_stop_handler()
+
+    print("=" * 60)
+    print("Coverage Planner 🗺️")
+    print("=" * 60)
+
+    db_path = os.path.abspath(args.db)
+    manual = [float(x) for x in args.bounds.split(',')] if args.bounds else None
+    if manual and len(manual) != 4:
+        parser.error('--bounds ต้องเป็น south,west,north,east')
+
+    planner = CoveragePlanner(db_path, args.query, args.tile_km, args.min_tile_km, args.min_new)
+    conn = pipeline_db.connect(db_path)
+    try:
+        bounds, source = resolve_bounds(conn, args.province, args.amphoe, manual)
+        if not bounds:
+            print(f"[ERROR] ไม่รู้ขอบเขตของ {args.amphoe or ''} {args.province} — ใส่ --bounds หรือเพิ่มใน {BOUNDS_FILE}"
+                  " (ยังไม่มี place ในพื้นที่นี้มากพอจะประมาณขอบเขต)")
+            sys.exit(1)
+        print(f"[INFO] Bounds {', '.join(f'{b:.4f}' for b in bounds)} (from {source})")
+        tiles = planner.plan(conn, bounds)
+    finally:
+        conn.close()
+    print_plan(tiles)
+
+    if args.plan_only:
+        return
+
+    runner = ShardedStage1Runner(
+        db_path=db_path,
+        queries_path=None,
+        shards=args.shards,
+        depth=args.depth,
+        work_dir=args.work_dir,
+        ingest_args=['--upsert'] if args.upsert else [],
+    )
+    started = time.time()
+    ok = planner.run(runner, tiles, rerun_done=args.rerun_done)
+    print_plan(tiles)
+    print(f"[INFO] Finished in {time.time() - started:.0f}s")
+    if not ok:
+        print("\n[ERROR] Some tiles failed")
+        sys.exit(1)
+
+    print("\n[DONE] Coverage run completed! ✅")
+
+
+if __name__ == "__main__":
+    main()
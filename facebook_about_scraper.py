@@ -7,10 +7,14 @@ Facebook Playwright Scraper - FAST VERSION
 
 import sys
 import argparse
-import sqlite3
 import re
 import time
 from playwright.sync_api import sync_playwright
+from pipeline_db import connect as pipeline_db_connect
+from fetch_ledger import FetchLedger
+from facebook_page_cache import FacebookPageCache
+from page_archive import PageArchive, DEFAULT_ARCHIVE_PATH
+from progress_events import ProgressReporter
 
 # Fix Windows console encoding
 if sys.platform == 'win32':
@@ -21,14 +25,22 @@ if sys.platform == 'win32':
 
 
 class FacebookPlaywrightScraper:
-    def __init__(self, db_path='pipeline.db', verbose=True):
+    def __init__(self, db_path='pipeline.db', verbose=True, ledger_ttl=24, archive_path=None, reextract=False,
+                 page_cache_ttl=168):
         """Initialize scraper"""
         self.db_path = db_path
         self.verbose = verbose
+        self.ledger_ttl = ledger_ttl  # ชั่วโมง, 0 = ไม่ใช้ fetch ledger
+        self.page_cache_ttl = page_cache_ttl  # ชั่วโมง, 0 = ไม่ใช้ Facebook page cache
+        self.archive_path = archive_path or (DEFAULT_ARCHIVE_PATH if reextract else None)
+        self.archive = None
+        self.reextract = reextract  # True = อ่าน HTML จาก archive แทนการเปิด browser
         
         # Database
         self.conn = None
         self.cursor = None
+        self.ledger = None
+        self.page_cache = None
         
         # Regex patterns
         self.email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
@@ -43,6 +55,7 @@ class FacebookPlaywrightScraper:
             'emails_found': 0,
             'phones_found': 0
         }
+        self.progress = ProgressReporter('stage3')
     
     def log(self, message):
         """Print log message"""
@@ -53,8 +66,14 @@ class FacebookPlaywrightScraper:
     
     def connect_db(self):
         """Connect to database"""
-        self.conn = sqlite3.connect(self.db_path)
+        self.conn = pipeline_db_connect(self.db_path)
         self.cursor = self.conn.cursor()
+        if self.ledger_ttl and not self.reextract:
+            self.ledger = FetchLedger(self.conn, 'STAGE3', ttl_hours=self.ledger_ttl)
+        if self.page_cache_ttl and not self.reextract:
+            self.page_cache = FacebookPageCache(self.conn, 'STAGE3', ttl_hours=self.page_cache_ttl)
+        if self.archive_path:
+            self.archive = PageArchive(self.archive_path)
         self.log(f"[DB] Connected: {self.db_path}")
     
     def get_facebook_urls(self):
@@ -62,7 +81,7 @@ class FacebookPlaywrightScraper:
         query = """
             SELECT place_id, name, website 
             FROM places 
-            WHERE website LIKE '%facebook.com%'
+            WHERE website_kind = 'facebook'
             ORDER BY name
         """
         self.cursor.execute(query)
@@ -123,6 +142,9 @@ class FacebookPlaywrightScraper:
     
     def close_db(self):
         """Close database"""
+        if self.archive:
+            self.archive.close()
+            self.archive = None
         if self.conn:
             self.conn.close()
             self.log("[DB] Closed")
@@ -131,13 +153,14 @@ class FacebookPlaywrightScraper:
     
     def extract_data(self, html):
         """Extract email and phone from HTML"""
-        data = {'email': None, 'phone': None}
+        data = {'email': None, 'phone': None, 'emails': []}
         
         # Find emails
         emails = re.findall(self.email_pattern, html)
         emails = [e for e in emails if 'facebook' not in e.lower() and 'fb.com' not in e.lower()]
         if emails:
             data['email'] = emails[0]
+            data['emails'] = list(dict.fromkeys(emails))
         
         # Find phones
         phones = re.findall(self.phone_pattern, html)
@@ -157,18 +180,43 @@ class FacebookPlaywrightScraper:
         """Scrape Facebook page - ไปที่หน้า About เพื่อดึงอีเมล/เบอร์"""
         try:
             about_url = self._facebook_about_url(fb_url)
-            self.log(f"   [SCRAPE] {about_url}")
             
-            # Navigate to About page (email/phone อยู่ที่แท็บ About)
-            page.goto(about_url, wait_until='domcontentloaded', timeout=12000)
-            page.wait_for_timeout(2500)  # รอให้ About โหลด
-            
-            # Get content
-            html = page.content()
-            data = self.extract_data(html)
+            # ไม่ใช้ผลจาก fetch ledger — ledger ไม่เก็บเบอร์โทร (ใช้แล้วเบอร์หาย) ส่วน page cache เก็บครบทั้งอีเมลและเบอร์
+            cached = self.page_cache.lookup(fb_url) if self.page_cache else None
+            if cached:
+                # เพจเดียวกัน (place อื่นลิงก์มา หรือ Stage 4 เคย scrape) → ไม่ต้อง render ซ้ำ
+                self.log(f"   [CACHE] Reuse {cached['fetched_by']} result of page '{cached['page_key']}'")
+                data = {'email': cached['email'], 'phone': cached['phone'], 'emails': cached['emails']}
+                website_urls = cached['websites']
+            elif self.reextract:
+                # Replay จาก archive (ไม่มี browser)
+                html = self.archive.latest(about_url)
+                if html is None:
+                    return {'email': None, 'phone': None, 'emails': []}
+                data = self.extract_data(html)
+                website_urls = self.find_website_urls(html)
+            else:
+                self.log(f"   [SCRAPE] {about_url}")
+                
+                # Navigate to About page (email/phone อยู่ที่แท็บ About) — ไป final URL ตรงๆ ถ้าเคย redirect
+                nav_url = self.ledger.resolve(about_url) if self.ledger else about_url
+                page.goto(nav_url, wait_until='domcontentloaded', timeout=12000)
+                page.wait_for_timeout(2500)  # รอให้ About โหลด
+                
+                # Get content
+                html = page.content()
+                if self.archive:
+                    self.archive.store(about_url, page.url, html, 'STAGE3')
+                data = self.extract_data(html)
+                website_urls = self.find_website_urls(html)
+                
+                if self.ledger:
+                    self.ledger.record(about_url, page.url, data['emails'], [(web_url, 'WEBSITE') for web_url in website_urls])
+                if self.page_cache:
+                    self.page_cache.record(page.url, data['emails'], data['phone'], website_urls)
+                    self.page_cache.record(fb_url, data['emails'], data['phone'], website_urls)
             
             # 🔗 NEW: Find and save Website URLs
-            website_urls = self.find_website_urls(html)
             if website_urls:
                 self.log(f"   [FOUND] {len(website_urls)} Website URL(s) → saving to discovered_urls")
                 for web_url in website_urls[:5]:  # Save max 5 URLs
@@ -178,10 +226,40 @@ class FacebookPlaywrightScraper:
             
         except Exception as e:
             self.log(f"   [ERROR] {e}")
-            return {'email': None, 'phone': None}
+            return {'email': None, 'phone': None, 'emails': []}
     
     # ==================== Main ====================
     
+    def process_pages(self, page, fb_urls):
+        """Scrape ทุกหน้า (page=None ตอน re-extract จาก archive)"""
+        print()
+        print("-"*70)
+        
+        for i, (place_id, name, fb_url) in enumerate(fb_urls, 1):
+            print(f"\n[{i}/{len(fb_urls)}] {name}")
+            
+            data = self.scrape_page(page, fb_url, place_id)  # Pass place_id
+            
+            if data['email']:
+                print(f"   [FOUND] Email: {data['email']}")
+                self.save_email(place_id, data['email'])
+                self.stats['emails_found'] += 1
+                self.stats['success'] += 1
+            else:
+                print(f"   [NOT FOUND] No email")
+            
+            if data['phone']:
+                print(f"   [FOUND] Phone: {data['phone']}")
+                self.stats['phones_found'] += 1
+            
+            self.progress.report(
+                i, self.stats['success'], i - self.stats['success'], self.stats['emails_found'], len(fb_urls)
+            )
+            
+            # Small delay
+            if i < len(fb_urls) and not self.reextract:
+                time.sleep(0.5)
+    
     def run(self):
         """Main execution"""
         print("="*70)
@@ -195,6 +273,7 @@ class FacebookPlaywrightScraper:
         fb_urls = self.get_facebook_urls()
         if not fb_urls:
             print("[INFO] No Facebook pages found")
+            self.progress.finish(0, total=0)
             return
         
         self.stats['total'] = len(fb_urls)
@@ -202,69 +281,54 @@ class FacebookPlaywrightScraper:
         # Start measuring time
         start_time = time.time()
         
-        # Launch Playwright
-        with sync_playwright() as p:
-            self.log("[BROWSER] Launching Chromium (headless + optimized)...")
-            
-            browser = p.chromium.launch(
-                headless=True,
-                args=[
-                    '--disable-blink-features=AutomationControlled',
-                    '--disable-gpu',
-                    '--no-sandbox',
-                    '--disable-dev-shm-usage',
-                    '--disable-web-security',
-                    '--disable-features=IsolateOrigins,site-per-process',
-                ]
-            )
-            
-            # Create context
-            context = browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                bypass_csp=True,
-            )
-            
-            # Block images/CSS for speed
-            context.route("**/*.{png,jpg,jpeg,gif,svg,webp,mp4,avi,mov}", lambda route: route.abort())
-            context.route("**/*.css", lambda route: route.abort())
-            
-            page = context.new_page()
-            
-            self.log("[BROWSER] Started")
-            self.log("[INFO] Running without login (for public pages)")
-            
-            # Process each page
-            print()
-            print("-"*70)
-            
-            for i, (place_id, name, fb_url) in enumerate(fb_urls, 1):
-                print(f"\n[{i}/{len(fb_urls)}] {name}")
+        if self.reextract:
+            self.log(f"[ARCHIVE] Re-extracting from {self.archive_path} (no browser)")
+            self.process_pages(None, fb_urls)
+        else:
+            # Launch Playwright
+            with sync_playwright() as p:
+                self.log("[BROWSER] Launching Chromium (headless + optimized)...")
                 
-                data = self.scrape_page(page, fb_url, place_id)  # Pass place_id
+                browser = p.chromium.launch(
+                    headless=True,
+                    args=[
+                        '--disable-blink-features=AutomationControlled',
+                        '--disable-gpu',
+                        '--no-sandbox',
+                        '--disable-dev-shm-usage',
+                        '--disable-web-security',
+                        '--disable-features=IsolateOrigins,site-per-process',
+                    ]
+                )
                 
-                if data['email']:
-                    print(f"   [FOUND] Email: {data['email']}")
-                    self.save_email(place_id, data['email'])
-                    self.stats['emails_found'] += 1
-                    self.stats['success'] += 1
-                else:
-                    print(f"   [NOT FOUND] No email")
+                # Create context
+                context = browser.new_context(
+                    viewport={'width': 1920, 'height': 1080},
+                    user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+                    bypass_csp=True,
+                )
                 
-                if data['phone']:
-                    print(f"   [FOUND] Phone: {data['phone']}")
-                    self.stats['phones_found'] += 1
+                # Block images/CSS for speed
+                context.route("**/*.{png,jpg,jpeg,gif,svg,webp,mp4,avi,mov}", lambda route: route.abort())
+                context.route("**/*.css", lambda route: route.abort())
                 
-                # Small delay
-                if i < len(fb_urls):
-                    time.sleep(0.5)
-            
-            # Close browser
-            browser.close()
-            self.log("\n[BROWSER] Closed")
+                page = context.new_page()
+                
+                self.log("[BROWSER] Started")
+                self.log("[INFO] Running without login (for public pages)")
+                
+                self.process_pages(page, fb_urls)
+                
+                # Close browser
+                browser.close()
+                self.log("\n[BROWSER] Closed")
         
         # Calculate time
         elapsed = time.time() - start_time
+        self.progress.finish(
+            self.stats['total'], self.stats['success'], self.stats['total'] - self.stats['success'],
+            self.stats['emails_found'], self.stats['total']
+        )
         
         # Summary
         print()
@@ -279,6 +343,10 @@ class FacebookPlaywrightScraper:
             print(f"Success rate:  {self.stats['emails_found']}/{self.stats['total']} ({success_rate:.1f}%)")
         print(f"Total time:    {elapsed:.1f} seconds")
         print(f"Average/page:  {elapsed/self.stats['total']:.1f} seconds")
+        if self.page_cache:
+            print(f"Page cache:    {self.page_cache.summary()}")
+        if self.archive:
+            print(f"Archive:       {self.archive.summary()}")
         print("="*70)
         
         # Cleanup
@@ -291,6 +359,10 @@ def main():
     """Main function"""
     parser = argparse.ArgumentParser(description='Stage 3: Facebook About Scraper')
     parser.add_argument('--db', default='pipeline.db', help='SQLite database path')
+    parser.add_argument('--ledger-ttl', type=float, default=24, help='บันทึกผล fetch ลง ledger ให้ Stage 2/4 ใช้ต่อ (ชั่วโมง, 0 = ไม่บันทึก)')
+    parser.add_argument('--page-cache-ttl', type=float, default=168, help='อายุผล Facebook page ที่ใช้ซ้ำได้ (ชั่วโมง, 0 = ไม่ใช้ cache)')
+    parser.add_argument('--archive', nargs='?', const=DEFAULT_ARCHIVE_PATH, help=f'เก็บ HTML ที่ fetch ลง archive (default: {DEFAULT_ARCHIVE_PATH})')
+    parser.add_argument('--reextract', action='store_true', help='รัน extraction ใหม่จาก archive โดยไม่เปิด browser')
     parser.add_argument('--verbose', '-v', action='store_true', default=True, help='แสดงข้อความละเอียด')
     args = parser.parse_args()
 
@@ -302,7 +374,11 @@ def main():
 
     scraper = FacebookPlaywrightScraper(
         db_path=args.db,
-        verbose=args.verbose
+        verbose=args.verbose,
+        ledger_ttl=args.ledger_ttl,
+        archive_path=args.archive,
+        reextract=args.reextract,
+        page_cache_ttl=args.page_cache_ttl
     )
 
     try:
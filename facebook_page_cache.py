@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Facebook Page Cache 📘
+ผล scrape หน้า About ต่อ 1 Facebook page (อีเมล, เบอร์, เว็บไซต์) ใช้ร่วมกัน Stage 3 / Stage 4
+- key = page id/slug แบบ canonical: facebook.com/X, m.facebook.com/X/about?..., web.facebook.com/X → 'x'
+- เพจแฟรนไชส์/ห้างที่หลาย place ลิงก์ไป render ครั้งเดียว ใช้ได้ทุก place จนหมดอายุ
+"""
+import json
+import re
+import time
+from urllib.parse import urlparse, parse_qs
+
+# path แรกที่ไม่ใช่เพจ (login, รูป, โพสต์, ...)
+NON_PAGE_PATHS = {
+    'login', 'login.php', 'recover', 'photo', 'photo.php', 'photos', 'groups', 'events', 'hashtag',
+    'share', 'sharer', 'sharer.php', 'plugins', 'tr', 'l.php', 'watch', 'story.php', 'permalink.php',
+    'dialog', 'help', 'policies', 'privacy', 'settings', 'home.php', 'marketplace', 'reel', 'stories',
+}
+
+
+def facebook_page_key(url):
+    """
+    Canonical key ของ Facebook page หรือ None ถ้าไม่ใช่ URL ของเพจ
+    - profile.php?id=123 / pages/.../Name-123 → 'id:123'
+    - facebook.com/Slug/about → 'slug'
+    """
+    try:
+        parsed = urlparse((url or '').strip().replace('&amp;', '&'))
+    except ValueError:
+        return None
+    host = (parsed.hostname or '').lower()
+    if not (host in ('facebook.com', 'fb.com') or host.endswith('.facebook.com')):
+        return None
+    
+    parts = [part for part in parsed.path.split('/') if part]
+    if not parts:
+        return None
+    first = parts[0].lower()
+    
+    if first == 'profile.php':
+        page_id = (parse_qs(parsed.query).get('id') or [''])[0]
+        return f"id:{page_id}" if page_id.isdigit() else None
+    if first in ('pages', 'people'):
+        for part in reversed(parts):
+            match = re.search(r'(\d{6,})$', part)
+            if match:
+                return f"id:{match.group(1)}"
+        return None
+    if first in NON_PAGE_PATHS:
+        return None
+    return first
+
+
+class FacebookPageCache:
+    def __init__(self, conn, stage, ttl_hours=168):
+        """
+        Args:
+            conn: sqlite3 connection (ต้องรัน migration 0005 แล้ว)
+            stage: ชื่อ stage ที่บันทึก เช่น 'STAGE3'
+            ttl_hours: ผลที่เก่ากว่านี้ถือว่าหมดอายุ (ต้อง scrape ใหม่)
+        """
+        self.conn = conn
+        self.stage = stage
+        self.ttl_seconds = int(ttl_hours * 3600)
+        
+        # Stats
+        self.hits = 0
+        self.misses = 0
+    
+    def lookup(self, url):
+        """คืนผลที่ยังไม่หมดอายุของเพจที่ url ชี้ไป หรือ None"""
+        page_key = facebook_page_key(url)
+        if not page_key:
+            return None
+        
+        row = self.conn.execute("""
+            SELECT page_key, email, phone, website, emails, websites, fetched_by, fetched_at
+            FROM facebook_page_cache
+            WHERE page_key=? AND fetched_at>=?
+        """, (page_key, int(time.time()) - self.ttl_seconds)).fetchone()
+        if not row:
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        return {
+            'page_key': row[0],
+            'email': row[1],
+            'phone': row[2],
+            'website': row[3],
+            'emails': json.loads(row[4]),
+            'websites': json.loads(row[5]),
+            'fetched_by': row[6],
+            'fetched_at': row[7],
+        }
+    
+    def record(self, url, emails, phone, websites):
+        """บันทึกผล scrape ของเพจที่ url ชี้ไป (URL ที่ไม่ใช่เพจไม่บันทึก)"""
+        page_key = facebook_page_key(url)
+        if not page_key:
+            return
+        emails = list(dict.fromkeys(emails))
+        websites = list(dict.fromkeys(websites))
+        self.conn.execute("""
+            INSERT OR REPLACE INTO facebook_page_cache
+            (page_key, email, phone, website, emails, websites, fetched_by, fetched_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, strftime('%s', 'now'))
+        """, (
+            page_key,
+            emails[0] if emails else None,
+            phone,
+            websites[0] if websites else None,
+            json.dumps(emails, ensure_ascii=False),
+            json.dumps(websites, ensure_ascii=False),
+            self.stage,
+        ))
+        self.conn.commit()
+    
+    def summary(self):
+        """ข้อความสรุป hit rate สำหรับพิมพ์ท้าย stage"""
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0.0
+        return f"{self.hits}/{total} hits ({rate:.1f}%)"
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fetch Ledger 📒
+บันทึกหน้าที่ stage ใด stage หนึ่ง render ไปแล้ว (URL, final URL, เวลา, อีเมล, links)
+- Stage อื่นใช้ผลเดิมได้เลยถ้ายังไม่หมดอายุ (ไม่ต้อง navigate ซ้ำ)
+- จำ redirect: รอบถัดไป navigate ไปที่ final URL ตรงๆ
+"""
+import json
+import time
+
+
+class FetchLedger:
+    def __init__(self, conn, stage, ttl_hours=24):
+        """
+        Args:
+            conn: sqlite3 connection (ต้องรัน migration 0004 แล้ว)
+            stage: ชื่อ stage ที่บันทึก เช่น 'STAGE2'
+            ttl_hours: entry ที่เก่ากว่านี้ถือว่าหมดอายุ (ต้อง fetch ใหม่)
+        """
+        self.conn = conn
+        self.stage = stage
+        self.ttl_seconds = int(ttl_hours * 3600)
+        
+        # Stats
+        self.hits = 0
+        self.misses = 0
+    
+    def _get(self, url, min_fetched_at):
+        row = self.conn.execute(
+            "SELECT url, final_url, fetched_by, emails, links, fetched_at FROM fetch_ledger WHERE url=? AND fetched_at>=?",
+            (url, min_fetched_at)
+        ).fetchone()
+        if not row:
+            return None
+        return {
+            'url': row[0],
+            'final_url': row[1],
+            'fetched_by': row[2],
+            'emails': json.loads(row[3]),
+            'links': [tuple(link) for link in json.loads(row[4])],
+            'fetched_at': row[5],
+        }
+    
+    def lookup(self, url):
+        """คืน entry ที่ยังไม่หมดอายุของ url (หรือของ final URL ที่ url เคย redirect ไป) หรือ None"""
+        min_fetched_at = int(time.time()) - self.ttl_seconds
+        entry = self._get(url, min_fetched_at)
+        if not entry:
+            final_url = self.resolve(url)
+            if final_url != url:
+                entry = self._get(final_url, min_fetched_at)
+        
+        if entry:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return entry
+    
+    def resolve(self, url):
+        """คืน final URL ที่ url เคย redirect ไป (ไม่สนอายุ) — ถ้าไม่เคยเจอคืน url เดิม"""
+        row = self.conn.execute("SELECT final_url FROM fetch_ledger WHERE url=?", (url,)).fetchone()
+        return row[0] if row and row[0] else url
+    
+    def record(self, url, final_url, emails, links):
+        """บันทึกผลการ fetch — ถ้า redirect บันทึกใต้ final URL ด้วย"""
+        final_url = final_url or url
+        emails_json = json.dumps(sorted(set(emails)), ensure_ascii=False)
+        links_json = json.dumps([list(link) for link in links], ensure_ascii=False)
+        for key in {url, final_url}:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO fetch_ledger (url, final_url, fetched_by, emails, links, fetched_at)
+                VALUES (?, ?, ?, ?, ?, strftime('%s', 'now'))
+            """, (key, final_url, self.stage, emails_json, links_json))
+        self.conn.commit()
+    
+    def summary(self):
+        """ข้อความสรุป hit rate สำหรับพิมพ์ท้าย stage"""
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0.0
+        return f"{self.hits}/{total} hits ({rate:.1f}%)"
@@ -6,13 +6,13 @@
 """
 import streamlit as st
 import subprocess
-import sqlite3
 import pandas as pd
 from pathlib import Path
 import time
 import sys
 import os
 import threading
+import functools
 import re
 from contextlib import contextmanager
 try:
@@ -21,6 +21,11 @@ except ImportError:
     KeywordGenerator = None  # e.g. google-generativeai not installed
 from dotenv import load_dotenv
 import json
+from pipeline_db import read_stats_counters, rebuild_stats_counters, connect as pipeline_db_connect, classify_website
+from pipeline_db import fts_match_expr, EMAIL_SEARCH_HITS_SQL, PLACE_SEARCH_HITS_SQL
+from results_export import EXPORT_FORMATS, available_formats, export_to_temp
+from pipeline_jobs import ACTIVE_STATUSES, STAGE_LABELS, submit_job, cancel_job, list_jobs, job_stages, progress_path
+from progress_events import read_latest as read_progress
 
 # โหลด API key จาก .env file
 load_dotenv()
@@ -32,8 +37,16 @@ load_dotenv()
 PROJECT_ROOT = Path(__file__).resolve().parent
 
 DB_FILE = "pipeline.db"
+ARCHIVE_FILE = "archive.db"
 QUERIES_FILE = "config/queries.txt"
-RESULTS_CSV = "output/results.csv"
+# log ของ process เบื้องหลัง
+STAGE1_PREWARM_LOG_FILE = "output/stage1_prewarm.log"
+# Pipeline jobs (pipeline_jobs.py) — ความถี่ที่หน้า Runner ดึงสถานะใหม่ระหว่างมีงาน
+JOBS_REFRESH_SECONDS = 2
+EXPORT_DIR = "output/exports"
+# Health monitor — ตรวจ Docker/DB/ไฟล์พื้นที่เบื้องหลังทุก INTERVAL วินาที, ผลเก่ากว่า TTL → rerun ถัดไปปลุกให้ตรวจใหม่
+HEALTH_INTERVAL_SECONDS = 30
+HEALTH_TTL_SECONDS = 10
 
 TH_LOCATIONS_FILE = "data/th_locations.json"
 
@@ -218,90 +231,394 @@ def check_docker():
         return False
 
 
+class HealthMonitor:
+    """
+    ตรวจสถานะ Docker / DB / ไฟล์พื้นที่ใน thread เบื้องหลัง แล้วเก็บผลล่าสุดไว้
+    ทุก rerun อ่านจาก snapshot() ทันที — ไม่ spawn `docker` (timeout 5s × 2) ทุกครั้งที่คลิก
+    """
+
+    def __init__(self, interval=HEALTH_INTERVAL_SECONDS, ttl=HEALTH_TTL_SECONDS):
+        self.interval = interval
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.ready = threading.Event()
+        self.state = {
+            "docker_ok": False,
+            "db_exists": False,
+            "loc_ok": False,
+            "docker_work_dir": None,  # path ของ project ที่ Docker daemon เห็น (ไม่เปลี่ยนระหว่างที่แอปรัน)
+            "checked_at": 0.0,
+        }
+        threading.Thread(target=self._loop, name="health-monitor", daemon=True).start()
+
+    def probe(self):
+        """ตรวจทุกอย่างหนึ่งรอบแล้วอัปเดตผล"""
+        docker_ok = check_docker()
+        work_dir = self.state["docker_work_dir"]
+        if docker_ok and work_dir is None:
+            work_dir = get_docker_host_path_for_app_mount("/app") or str(PROJECT_ROOT)
+        state = {
+            "docker_ok": docker_ok,
+            "db_exists": Path(DB_FILE).exists(),
+            "loc_ok": Path(TH_LOCATIONS_FILE).exists(),
+            "docker_work_dir": work_dir,
+            "checked_at": time.time(),
+        }
+        with self.lock:
+            self.state = state
+        return state
+
+    def _loop(self):
+        while True:
+            try:
+                self.probe()
+            except Exception:
+                pass
+            finally:
+                self.ready.set()  # snapshot() ไม่ค้างรอแม้รอบแรกล้มเหลว
+            self.wake.wait(self.interval)
+            self.wake.clear()
+
+    def snapshot(self):
+        """ผลตรวจล่าสุด (ครั้งแรกรอรอบแรกจบ) — ผลเก่ากว่า ttl ปลุก thread ให้ตรวจใหม่ในเบื้องหลัง"""
+        self.ready.wait()
+        with self.lock:
+            state = dict(self.state)
+        if time.time() - state["checked_at"] > self.ttl:
+            self.wake.set()
+        return state
+
+
+@st.cache_resource
+def health_monitor():
+    return HealthMonitor()
+
+
+# ========== DB read connection + result cache ==========
+
+class ReadDB:
+    """
+    connection อ่านที่ใช้ร่วมกันทุก rerun/session (เปิดครั้งเดียว + รัน migration ที่ค้าง)
+    Streamlit รันแต่ละ session คนละ thread — ใช้ผ่าน `with read_db() as conn:` ซึ่งล็อกให้
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = None
+        self.inode = None
+
+    def _open(self, inode):
+        if self.conn is not None:
+            self.conn.close()
+        self.conn = pipeline_db_connect(self.path, check_same_thread=False)
+        self.inode = inode
+
+    def version(self):
+        """
+        key ของ result cache: (inode, mtime, PRAGMA data_version) — data_version เปลี่ยนเมื่อ connection อื่น
+        (stage ต่าง ๆ, การแก้ไขใน GUI) commit; ไฟล์ถูกแทนที่ → inode เปลี่ยน → เปิด connection ใหม่
+        None = ยังไม่มีไฟล์ DB
+        """
+        try:
+            st_ = os.stat(self.path)
+        except OSError:
+            return None
+        with self.lock:
+            if self.conn is None or self.inode != st_.st_ino:
+                self._open(st_.st_ino)
+                st_ = os.stat(self.path)  # migration ตอนเปิดอาจเขียนไฟล์
+            return (st_.st_ino, st_.st_mtime_ns, self.conn.execute("PRAGMA data_version").fetchone()[0])
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            if not os.path.exists(self.path):
+                raise FileNotFoundError(self.path)
+            if self.conn is None:
+                self._open(os.stat(self.path).st_ino)
+        except Exception:
+            self.lock.release()
+            raise
+        return self.conn
+
+    def __exit__(self, *exc):
+        self.lock.release()
+        return False
+
+
+@st.cache_resource
+def read_db(path=None):
+    return ReadDB(path or str(PROJECT_ROOT / DB_FILE))
+
+
+def db_cached(fn):
+    """cache ผลของ query อ่าน DB จนกว่า DB จะเปลี่ยนจริง (ดู ReadDB.version) — ไม่ต้อง query ซ้ำทุก rerun"""
+    @st.cache_data(max_entries=256, show_spinner=False)
+    def cached(name, version, *args, **kwargs):
+        # name แยก cache ของแต่ละฟังก์ชัน (ทุกตัวใช้ wrapper เดียวกัน)
+        return fn(*args, **kwargs)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return cached(fn.__qualname__, read_db().version(), *args, **kwargs)
+    return wrapper
+
+
+@db_cached
 def get_statistics(db_path):
-    """ดึง statistics จาก database"""
+    """ดึง statistics จาก database (stats_counters ถ้ามี — ไม่ต้อง scan ทั้งตาราง)"""
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Total places
-        cursor.execute("SELECT COUNT(*) FROM places")
-        total_places = cursor.fetchone()[0]
-        
-        # Status breakdown
-        cursor.execute("SELECT status, COUNT(*) FROM places GROUP BY status")
-        status_breakdown = dict(cursor.fetchall())
-        
-        # Total emails
-        cursor.execute("SELECT COUNT(*) FROM emails")
-        total_emails = cursor.fetchone()[0]
-        
-        # Source breakdown
-        cursor.execute("SELECT source, COUNT(*) FROM emails GROUP BY source")
-        source_breakdown = dict(cursor.fetchall())
-        
-        # 🆕 Discovered URLs
-        try:
-            cursor.execute("SELECT COUNT(*) FROM discovered_urls")
-            total_discovered = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT status, COUNT(*) FROM discovered_urls GROUP BY status")
-            discovered_breakdown = dict(cursor.fetchall())
-            
-            cursor.execute("SELECT url_type, COUNT(*) FROM discovered_urls GROUP BY url_type")
-            discovered_types = dict(cursor.fetchall())
-        except:
-            total_discovered = 0
-            discovered_breakdown = {}
-            discovered_types = {}
-        
-        conn.close()
-        
+        with read_db(str(PROJECT_ROOT / db_path)) as conn:
+            return read_statistics(conn)
+    except Exception:
+        return None
+
+
+def read_statistics(conn):
+    """นับ statistics จาก connection ที่เปิดอยู่ (ใช้ stats_counters ถ้ามี)"""
+    counters = read_stats_counters(conn)
+    if counters is not None:
         return {
-            'total_places': total_places,
-            'status_breakdown': status_breakdown,
-            'total_emails': total_emails,
-            'source_breakdown': source_breakdown,
-            'total_discovered': total_discovered,
-            'discovered_breakdown': discovered_breakdown,
-            'discovered_types': discovered_types
+            'total_places': sum(counters['places.status'].values()),
+            'status_breakdown': counters['places.status'],
+            'total_emails': sum(counters['emails.source'].values()),
+            'source_breakdown': counters['emails.source'],
+            'total_discovered': sum(counters['discovered_urls.status'].values()),
+            'discovered_breakdown': counters['discovered_urls.status'],
+            'discovered_types': counters['discovered_urls.url_type'],
         }
-    except Exception as e:
-        return None
+    
+    # DB ที่ยังไม่ได้รัน migration 0012 — นับจากตารางตรง ๆ
+    cursor = conn.cursor()
+    
+    # Total places
+    cursor.execute("SELECT COUNT(*) FROM places")
+    total_places = cursor.fetchone()[0]
+    
+    # Status breakdown
+    cursor.execute("SELECT status, COUNT(*) FROM places GROUP BY status")
+    status_breakdown = dict(cursor.fetchall())
+    
+    # Total emails
+    cursor.execute("SELECT COUNT(*) FROM emails")
+    total_emails = cursor.fetchone()[0]
+    
+    # Source breakdown
+    cursor.execute("SELECT source, COUNT(*) FROM emails GROUP BY source")
+    source_breakdown = dict(cursor.fetchall())
+    
+    # 🆕 Discovered URLs
+    try:
+        cursor.execute("SELECT COUNT(*) FROM discovered_urls")
+        total_discovered = cursor.fetchone()[0]
+        
+        cursor.execute("SELECT status, COUNT(*) FROM discovered_urls GROUP BY status")
+        discovered_breakdown = dict(cursor.fetchall())
+        
+        cursor.execute("SELECT url_type, COUNT(*) FROM discovered_urls GROUP BY url_type")
+        discovered_types = dict(cursor.fetchall())
+    except:
+        total_discovered = 0
+        discovered_breakdown = {}
+        discovered_types = {}
+    
+    return {
+        'total_places': total_places,
+        'status_breakdown': status_breakdown,
+        'total_emails': total_emails,
+        'source_breakdown': source_breakdown,
+        'total_discovered': total_discovered,
+        'discovered_breakdown': discovered_breakdown,
+        'discovered_types': discovered_types
+    }
 
 
-def _is_valid_email(s):
-    """ตรวจว่า string เป็นรูปแบบอีเมลที่ถูกต้องหรือไม่"""
-    if pd.isna(s) or not str(s).strip():
-        return False
-    s = str(s).strip()
-    import re
-    return bool(re.match(r"^[^\s@]+@[^\s@]+\.[^\s@]+$", s))
+# ========== Emails explorer ==========
+
+EMAILS_COLUMNS = """
+    e.id,
+    p.name AS place_name,
+    p.category,
+    p.phone,
+    p.website,
+    e.email,
+    e.source,
+    datetime(e.created_at, 'unixepoch') AS found_at
+"""
+
+# คอลัมน์ที่แก้ได้ใน data_editor → คอลัมน์ในตาราง
+EMAIL_EDIT_COLUMNS = {"email": "email", "source": "source"}
+PLACE_EDIT_COLUMNS = {"place_name": "name", "category": "category", "phone": "phone", "website": "website"}
+
+# ตัวเลือกการเรียง → ORDER BY (whitelist — ไม่ต่อ string จาก input ตรง ๆ)
+EMAILS_SORTS = {
+    "พบล่าสุด": "e.created_at DESC, e.id DESC",
+    "พบเก่าสุด": "e.created_at ASC, e.id ASC",
+    "อีเมล A→Z": "e.email ASC, e.id ASC",
+    "ชื่อสถานที่ A→Z": "p.name ASC, e.id ASC",
+    "Source": "e.source ASC, e.created_at DESC",
+}
+
+
+def build_emails_query(filters):
+    """
+    FROM + WHERE + params + ORDER BY นำหน้า ของแท็บ Emails ตามตัวกรอง (ทุกค่าเป็น parameter)
+    คำค้นใช้ FTS5 (เรียงตามความตรง) — คำที่สั้นกว่า FTS_MIN_TERM ถอยไปใช้ LIKE
+    """
+    source = "emails e JOIN places p ON e.place_id = p.place_id"
+    clauses = []
+    params = []
+    order = ""
+    search = (filters.get("search") or "").strip()
+    match = fts_match_expr(search)
+    if match:
+        source += f" JOIN ({EMAIL_SEARCH_HITS_SQL}) h ON h.id = e.id"
+        params.extend([match, match])
+        order = "h.score, "
+    elif search:
+        clauses.append("(p.name LIKE ? OR e.email LIKE ? OR p.category LIKE ?)")
+        params.extend([f"%{search}%"] * 3)
+    if filters.get("source"):
+        clauses.append("e.source = ?")
+        params.append(filters["source"])
+    if filters.get("category"):
+        clauses.append("p.category = ?")
+        params.append(filters["category"])
+    if filters.get("valid") is not None:
+        clauses.append("e.is_valid = ?")
+        params.append(int(filters["valid"]))
+    return source, (" AND ".join(clauses) or "1"), params, order
+
+
+def read_emails_frame(conn, sql, params):
+    """อ่านผล query เป็น DataFrame แบบ Arrow-backed (ส่งต่อให้ Streamlit โดยไม่ต้องแปลงจาก object)"""
+    return pd.read_sql_query(sql, conn, params=params, dtype_backend="pyarrow")
+
+
+@db_cached
+def get_emails_total(filters):
+    with read_db() as conn:
+        source, where, params, _order = build_emails_query(filters)
+        return conn.execute(f"SELECT COUNT(*) FROM {source} WHERE {where}", params).fetchone()[0]
+
+
+def emails_page_sql(filters, sort="พบล่าสุด", limit=None, offset=0):
+    """SQL + params ของอีเมลตามตัวกรอง/การเรียง — limit=None = ทั้งหมด (export)"""
+    source, where, params, order = build_emails_query(filters)
+    sql = f"""
+        SELECT {EMAILS_COLUMNS}
+        FROM {source}
+        WHERE {where}
+        ORDER BY {order}{EMAILS_SORTS.get(sort, EMAILS_SORTS["พบล่าสุด"])}
+    """
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params = params + [limit, offset]
+    return sql, params
+
+
+def emails_by_ids_sql(ids):
+    """SQL + params ของอีเมลตาม id (ส่งเป็น JSON array parameter เดียว — ไม่ติดจำนวน ? สูงสุด)"""
+    sql = f"""
+        SELECT {EMAILS_COLUMNS}
+        FROM emails e
+        JOIN places p ON e.place_id = p.place_id
+        WHERE e.id IN (SELECT value FROM json_each(?))
+        ORDER BY e.id DESC
+    """
+    return sql, [json.dumps(sorted(int(i) for i in ids))]
+
+
+@db_cached
+def get_emails_page(filters, sort="พบล่าสุด", limit=None, offset=0):
+    """อีเมล 1 หน้าตามตัวกรอง/การเรียง"""
+    with read_db() as conn:
+        sql, params = emails_page_sql(filters, sort=sort, limit=limit, offset=offset)
+        return read_emails_frame(conn, sql, params)
+
 
+@db_cached
+def get_emails_by_ids(ids):
+    """อีเมลตาม id ที่เลือก (ข้ามหน้า)"""
+    with read_db() as conn:
+        sql, params = emails_by_ids_sql(ids)
+        return read_emails_frame(conn, sql, params)
 
-def get_emails_dataframe(db_path):
-    """ดึงข้อมูลอีเมลเป็น DataFrame"""
+
+def fold_email_edits(edited_rows, ids, edits, selected):
+    """
+    แปลง edited_rows ของ st.data_editor ({ตำแหน่งแถว: {คอลัมน์: ค่าใหม่}}) → ผูกกับ id
+    - ช่องที่แก้ → edits ({id: {คอลัมน์: ค่าใหม่}})
+    - checkbox "เลือก" → เพิ่ม/เอา id ออกจาก selected
+    ids = id ของแถวตามลำดับตอนสร้าง editor นั้น (แถวของหน้าอาจเลื่อนไปแล้วเมื่อมีอีเมลใหม่เข้ามา)
+    """
+    for pos, changes in edited_rows.items():
+        email_id = ids[int(pos)]
+        if "เลือก" in changes:
+            (selected.add if changes["เลือก"] else selected.discard)(email_id)
+        changes = {col: v for col, v in changes.items() if col in EMAIL_EDIT_COLUMNS or col in PLACE_EDIT_COLUMNS}
+        if changes:
+            edits.setdefault(email_id, {}).update(changes)
+    return edits
+
+
+def save_email_edits(page_df, edits):
+    """
+    บันทึกการแก้ไข ({id อีเมล: {คอลัมน์: ค่าใหม่}}) ลง DB — เทียบกับค่าเดิมของแถวใน page_df
+    id ที่ไม่อยู่ในหน้าแล้ว (ถูกดันออกไปโดยอีเมลใหม่) → ValueError ไม่เดาแถว
+    รวมเป็น UPDATE แบบ executemany ใน transaction เดียว — คืน (จำนวนอีเมลที่แก้, จำนวนแถวสถานที่ที่แก้)
+    """
+    def _str(v):
+        return "" if v is None or pd.isna(v) else str(v).strip()
+
+    rows = {int(row["id"]): row for _, row in page_df.iterrows()}
+    missing = sorted(set(edits) - set(rows))
+    if missing:
+        raise ValueError(f"อีเมล id {', '.join(map(str, missing))} ไม่อยู่ในหน้านี้แล้ว (มีอีเมลใหม่เข้ามาดันแถวเลื่อนไป) — ยังไม่ได้บันทึกอะไร")
+
+    email_updates = []
+    place_updates = []
+    for email_id, changes in edits.items():
+        row = rows[email_id]
+        new = {col: _str(changes.get(col, row[col])) for col in (*EMAIL_EDIT_COLUMNS, *PLACE_EDIT_COLUMNS)}
+        if any(new[col] != _str(row[col]) for col in EMAIL_EDIT_COLUMNS):
+            email_updates.append((new["email"], new["source"] or "WEBSITE", email_id))
+        if any(new[col] != _str(row[col]) for col in PLACE_EDIT_COLUMNS):
+            kind, host = classify_website(new["website"])
+            place_updates.append((new["place_name"], new["category"], new["phone"], new["website"], kind, host, email_id))
+
+    if not email_updates and not place_updates:
+        return 0, 0
+    conn = pipeline_db_connect(str(PROJECT_ROOT / DB_FILE))
     try:
-        conn = sqlite3.connect(db_path)
-        query = """
-            SELECT 
-                e.id,
-                p.name AS place_name,
-                p.category,
-                p.phone,
-                p.website,
-                e.email,
-                e.source,
-                datetime(e.created_at, 'unixepoch') AS found_at
-            FROM emails e
-            JOIN places p ON e.place_id = p.place_id
-            ORDER BY e.created_at DESC
-        """
-        df = pd.read_sql_query(query, conn)
+        with conn:
+            conn.executemany("UPDATE emails SET email = ?, source = ? WHERE id = ?", email_updates)
+            conn.executemany(
+                """
+                    UPDATE places
+                    SET name = ?, category = ?, phone = ?, website = ?, website_kind = ?, website_host = ?,
+                        updated_at = strftime('%s','now')
+                    WHERE place_id = (SELECT place_id FROM emails WHERE id = ?)
+                """,
+                place_updates,
+            )
+    finally:
         conn.close()
-        return df
-    except Exception as e:
-        return None
+    return len(email_updates), len(place_updates)
+
+
+@db_cached
+def get_emails_filter_options():
+    """ตัวเลือกของ Source / Category + จำนวนอีเมลรูปแบบไม่ถูกต้อง"""
+    with read_db() as conn:
+        sources = [r[0] for r in conn.execute("SELECT DISTINCT source FROM emails WHERE source IS NOT NULL ORDER BY source")]
+        categories = [r[0] for r in conn.execute(
+            "SELECT DISTINCT category FROM places WHERE category IS NOT NULL AND category != '' ORDER BY category"
+        )]
+        invalid_count = conn.execute("SELECT COUNT(*) FROM emails WHERE is_valid = 0").fetchone()[0]
+        return sources, categories, invalid_count
 
 
 def run_subprocess_with_live_output(cmd, placeholder, cwd=None):
@@ -341,6 +658,22 @@ def run_subprocess_with_live_output(cmd, placeholder, cwd=None):
         return 1, [f"Error: {str(e)}"]
 
 
+def start_background_subprocess(cmd, log_path, cwd=None):
+    """รัน subprocess เบื้องหลัง (ไม่ block UI) เขียน output ลง log_path"""
+    log_path = Path(log_path)
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    env = dict(os.environ, PYTHONUNBUFFERED="1")  # ให้ log ออกทันที ไม่ค้างใน buffer
+    # child ได้ handle ของตัวเองแล้ว → ปิดของ parent ทันที (กัน handle รั่วทุกครั้งที่เรียก)
+    with open(log_path, "w", encoding="utf-8") as log_file:
+        return subprocess.Popen(
+            cmd,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            cwd=cwd if cwd is not None else str(PROJECT_ROOT),
+            env=env,
+        )
+
+
 def get_docker_host_path_for_app_mount(container_mount_path: str = "/app") -> str | None:
     """
     When running *inside* the Streamlit container, Docker volume bind mounts in `docker run -v`
@@ -527,6 +860,11 @@ def render_sidebar_nav(docker_ok: bool, db_exists: bool, loc_ok: bool):
         _badge(f"📧 Gmail: {'ล็อกอินแล้ว' if gmail_ok else 'ยังไม่ล็อกอิน'}", "ok" if gmail_ok else "warn")
 
         st.markdown("### ✅ Status")
+        health = health_monitor().snapshot()
+        st.caption(f"ตรวจล่าสุด {time.strftime('%H:%M:%S', time.localtime(health['checked_at']))}")
+        if st.button("🔄 ตรวจใหม่", key="health_refresh", width="stretch"):
+            health_monitor().probe()
+            st.rerun()
         _badge(f"🐳 Docker: {'Running' if docker_ok else 'Down'}", "ok" if docker_ok else "bad")
         _badge(f"💾 DB: {'Ready' if db_exists else 'Empty'}", "ok" if db_exists else "warn")
         _badge(f"🧭 Dataset: {'OK' if loc_ok else 'Missing'}", "ok" if loc_ok else "warn")
@@ -631,14 +969,16 @@ def render_query_builder(loc_ok: bool):
 
     want_text = st.text_input(
         "สิ่งที่ต้องการค้นหา (เช่น ร้านอาหาร/โรงแรม/โรงเรียน)",
-        placeholder="พิมพ์ประเภทสถานที่ที่ต้องการ",
+        placeholder="พิมพ์ประเภทสถานที่ที่ต้องการ (หลายประเภทคั่นด้วย , )",
         key="want_text",
         disabled=(not loc_suffix),
     )
 
     built_query = ""
     if want_text and loc_suffix:
-        built_query = f"{want_text.strip()} {loc_suffix}".strip()
+        # หลายประเภท → 1 query ต่อบรรทัด (แบ่ง shard ให้ Stage 1 ได้)
+        wants = [w.strip() for w in want_text.split(",") if w.strip()]
+        built_query = "\n".join(f"{w} {loc_suffix}".strip() for w in wants)
     st.session_state.built_query = built_query
     return loc_suffix, built_query
 
@@ -691,6 +1031,163 @@ def render_dashboard(docker_ok: bool, db_exists: bool, loc_ok: bool):
                 st.info("ยังไม่มีฐานข้อมูล `pipeline.db` — ให้เริ่มรัน Stage 1 ก่อน")
 
 
+@st.cache_resource
+def start_stage1_prewarm(work_dir):
+    """Pre-warm Stage 1 (cache volume + warm container) ครั้งเดียวต่อ process ของแอป — ไม่ block UI"""
+    return start_background_subprocess(
+        [
+            "python", "stage1_runner.py", "--prewarm",
+            "--db", str(PROJECT_ROOT / DB_FILE), "--work-dir", work_dir,
+        ],
+        PROJECT_ROOT / STAGE1_PREWARM_LOG_FILE,
+    )
+
+
+@db_cached
+def get_stage1_startup_history(limit=5):
+    """[(run_started_at, mode, startup_seconds)] ของ Stage 1 รอบล่าสุด (shard ที่ช้าที่สุดต่อรอบ)"""
+    try:
+        with read_db() as conn:
+            return conn.execute("""
+                SELECT run_started_at, mode, MAX(startup_seconds)
+                FROM stage1_runs
+                GROUP BY run_started_at, mode
+                ORDER BY run_started_at DESC
+                LIMIT ?
+            """, (limit,)).fetchall()
+    except Exception:
+        return []
+
+
+JOB_STATUS_ICONS = {
+    "QUEUED": "⏳",
+    "RUNNING": "🔄",
+    "CANCELLING": "🛑",
+    "DONE": "✅",
+    "FAILED": "❌",
+    "CANCELLED": "⛔",
+}
+
+
+# หน่วยที่ progress ของแต่ละ stage นับ
+PROGRESS_UNITS = {
+    "stage1": "shard",
+    "ingest": "แถว",
+    "stage2": "place",
+    "stage3": "เพจ",
+    "stage4": "URL",
+}
+
+
+def read_log_tail(path, lines=30):
+    """บรรทัดท้ายของ log (ว่างถ้ายังไม่มีไฟล์)"""
+    try:
+        return Path(path).read_text(encoding="utf-8", errors="ignore").splitlines()[-lines:]
+    except OSError:
+        return []
+
+
+def format_duration(seconds):
+    seconds = int(seconds or 0)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def format_progress(stage, event, running):
+    """ข้อความสรุป progress event: จำนวน · สำเร็จ/ไม่สำเร็จ · อีเมล · rate · ETA (rate/ETA เฉพาะ stage ที่ยังรัน)"""
+    unit = PROGRESS_UNITS.get(stage, "")
+    done = f"{event['processed']:,}" + (f"/{event['total']:,}" if event.get("total") is not None else "")
+    parts = [f"{done} {unit}", f"✅ {event['succeeded']:,}", f"❌ {event['failed']:,}"]
+    if stage not in ("stage1", "ingest"):
+        parts.append(f"📧 {event['emails']:,}")
+    if running and not event.get("done"):
+        parts.append(f"{event['rate']:,.1f} {unit}/นาที")
+        if event.get("eta") is not None:
+            parts.append(f"ETA {format_duration(event['eta'])}")
+    return " · ".join(parts)
+
+
+def render_job_stages(job):
+    """สถานะ + เวลา + progress bar ของแต่ละ stage ใน job (log ท้ายไฟล์อ่านเมื่อขอดูเท่านั้น)"""
+    with read_db() as conn:
+        stages = job_stages(conn, job["id"])
+    now = int(time.time())
+    for stage in stages:
+        icon = JOB_STATUS_ICONS.get(stage["status"], "•")
+        elapsed = (stage["finished_at"] or now) - (stage["started_at"] or now)
+        label = f"{icon} {STAGE_LABELS.get(stage['stage'], stage['stage'])} · {format_duration(elapsed)}"
+        if stage["returncode"] not in (None, 0):
+            label += f" · exit {stage['returncode']}"
+        event = read_progress(progress_path(stage["log_path"])) if stage["log_path"] else None
+        if event is None:
+            st.markdown(label)
+            continue
+        text = f"{label} — {format_progress(stage['stage'], event, stage['status'] == 'RUNNING')}"
+        if event.get("total"):
+            st.progress(min(event["processed"] / event["total"], 1.0), text=text)
+        else:
+            st.progress(1.0 if event.get("done") else 0.0, text=text)
+
+    if stages and st.checkbox("📄 แสดง log", key=f"job_logs_{job['id']}"):
+        names = [stage["stage"] for stage in stages]
+        current = job["current_stage"] if job["current_stage"] in names else names[-1]
+        name = st.selectbox(
+            "Stage",
+            names,
+            index=names.index(current),
+            format_func=lambda s: STAGE_LABELS.get(s, s),
+            key=f"job_log_stage_{job['id']}",
+        )
+        log_path = next(stage["log_path"] for stage in stages if stage["stage"] == name)
+        tail = read_log_tail(log_path) if log_path else []
+        if tail:
+            st.code("\n".join(tail))
+        else:
+            st.caption("ยังไม่มี log")
+
+
+def render_pipeline_jobs():
+    """คิว pipeline ที่รันเบื้องหลัง — คืน True ถ้ายังมีงานรัน/เข้าคิว (ให้หน้า Runner refresh ต่อ)"""
+    with card("🧵 Pipeline Jobs", help_text="งานรันใน supervisor เบื้องหลัง — ปิด/refresh หน้าได้ งานที่เข้าคิวรันต่อกันทีละงาน"):
+        try:
+            with read_db() as conn:
+                jobs = list_jobs(conn, limit=10)
+        except Exception:
+            jobs = []
+        if not jobs:
+            st.caption("ยังไม่มีงาน — กด ▶️ START PIPELINE เพื่อส่งงานเข้าคิว")
+            return False
+
+        active = [job for job in jobs if job["status"] in ACTIVE_STATUSES]
+        if active:
+            st.checkbox("🔄 อัปเดตอัตโนมัติ", value=True, key="jobs_auto_refresh")
+        now = int(time.time())
+        for job in jobs:
+            icon = JOB_STATUS_ICONS.get(job["status"], "•")
+            first_query = (job["query"] or "").splitlines()[0] if job["query"] else ""
+            elapsed = (job["finished_at"] or now) - (job["started_at"] or now) if job["started_at"] else 0
+            c1, c2 = st.columns([4, 1])
+            with c1:
+                line = f"{icon} **Job #{job['id']}** · {job['status']} · {first_query}"
+                if job["status"] == "RUNNING" and job["current_stage"]:
+                    line += f" · {STAGE_LABELS.get(job['current_stage'], job['current_stage'])}"
+                if job["started_at"]:
+                    line += f" · {format_duration(elapsed)}"
+                st.markdown(line)
+                if job["error"]:
+                    st.caption(f"❌ {job['error']}")
+            with c2:
+                if job["status"] in ("QUEUED", "RUNNING"):
+                    if st.button("ยกเลิก", key=f"cancel_job_{job['id']}", width="stretch"):
+                        conn = pipeline_db_connect(str(PROJECT_ROOT / DB_FILE))
+                        cancel_job(conn, job["id"])
+                        conn.close()
+                        st.rerun()
+            # stage ของงานที่กำลังรัน + งานล่าสุดที่จบแล้ว (งานเก่ากว่านั้นแสดงแค่สรุป)
+            if job["status"] in ("RUNNING", "CANCELLING") or (job is jobs[0] and job["status"] != "QUEUED"):
+                render_job_stages(job)
+        return bool(active)
+
+
 def render_runner(docker_ok: bool, db_exists: bool, loc_ok: bool):
     badges = [
         (f"🐳 Docker: {'Running' if docker_ok else 'Down'}", "ok" if docker_ok else "bad"),
@@ -712,21 +1209,78 @@ def render_runner(docker_ok: bool, db_exists: bool, loc_ok: bool):
 
         with card("⚙️ Runner Settings", help_text="ค่าเหล่านี้ใช้ตอนรัน Stage 1–4"):
             st.info("🐳 ใช้ Docker (gosom) Scraper เป็นค่าเริ่มต้น")
+            adaptive_depth = st.checkbox(
+                "📈 Adaptive depth",
+                value=False,
+                key="runner_adaptive",
+                help="เริ่มที่ depth ตื้น แล้วเพิ่ม depth เฉพาะ query ที่ยังได้ place ใหม่ — จำ yield ของแต่ละ query ไว้ใช้รอบหน้า",
+            )
             depth = st.selectbox(
-                "Search Depth",
+                "Max Search Depth" if adaptive_depth else "Search Depth",
                 options=[1, 2, 3, 4, 5],
-                index=1,
+                index=4 if adaptive_depth else 1,
                 key="runner_depth",
-                help="Depth 2 แนะนำสำหรับเริ่มต้น",
+                help="Adaptive: depth สูงสุดที่ยอมให้ลึกถึง" if adaptive_depth else "Depth 2 แนะนำสำหรับเริ่มต้น",
             )
-            # Force sequential execution (more stable on Windows)
-            run_parallel = False
-            st.session_state["runner_parallel"] = False
+            min_new = 10
+            if adaptive_depth:
+                min_new = st.number_input(
+                    "place ใหม่ขั้นต่ำต่อ depth",
+                    min_value=1,
+                    max_value=200,
+                    value=10,
+                    key="runner_min_new",
+                    help="ถ้า depth ล่าสุดได้ place ใหม่น้อยกว่านี้ หยุดเพิ่ม depth ของ query นั้น",
+                )
+            shards = st.selectbox(
+                "Stage 1 Shards (Docker containers)",
+                options=[1, 2, 3, 4, 6, 8],
+                index=0,
+                key="runner_shards",
+                help="แบ่ง queries เป็นหลายชุดแล้วรัน scraper หลาย container พร้อมกัน (ใช้ได้เมื่อมีหลาย query เช่น ร้านอาหาร, โรงแรม)",
+            )
+            geo_tiling = st.checkbox(
+                "🗺️ Geo tiling (แบ่งพื้นที่เป็น grid)",
+                value=False,
+                key="runner_geo_tiling",
+                help="รัน scraper ทีละช่อง grid ของเขต/อำเภอ (-geo/-zoom) เพื่อให้ได้ place ครบในพื้นที่หนาแน่น — ข้ามช่องที่อิ่มตัวแล้ว",
+            )
+            tile_km = 2.0
+            if geo_tiling:
+                tile_km = st.selectbox("ขนาดช่อง (km)", options=[1.0, 2.0, 3.0, 5.0], index=1, key="runner_tile_km")
+                if st.button("🗺️ ดูแผน tiles / coverage", key="runner_geo_plan"):
+                    province = st.session_state.get("loc_province_dd", "—")
+                    amphoe = st.session_state.get("loc_amphoe_dd", "—")
+                    query_lines = (st.session_state.get("built_query") or "").splitlines()
+                    if province == "—" or amphoe == "—" or not query_lines:
+                        st.warning("เลือกพื้นที่ถึงเขต/อำเภอและใส่สิ่งที่ต้องการค้นหาก่อน")
+                    else:
+                        plan_cmd = [
+                            "python", "coverage_planner.py", "--db", str(PROJECT_ROOT / DB_FILE),
+                            "--query", query_lines[0],
+                            "--province", province, "--amphoe", amphoe, "--tile-km", str(tile_km), "--plan-only",
+                        ]
+                        run_subprocess_with_live_output(plan_cmd, st.empty())
             st.caption("โหมดการรัน: **Sequential (บังคับใช้เพื่อความเสถียร)**")
             st.caption("รัน **Stage 1–4 ครบทุกครั้ง** (ไม่มีการเลือก stage)")
-
-        # บังคับรันครบ 4 stages ทุกครั้ง
-        run_stage1 = run_stage2 = run_stage3 = run_stage4 = True
+            overlap_stage2 = st.checkbox(
+                "⚡ เริ่ม Stage 2 ระหว่างที่ Stage 1 ยังรัน",
+                value=True,
+                key="runner_overlap",
+                help="นำเข้า results.csv ทีละแถวขณะ Docker ยัง scrape อยู่ แล้วให้ Stage 2 หาอีเมลไปพร้อมกัน",
+            )
+            refresh_changed = st.checkbox(
+                "🔁 อัปเดต place เดิมที่ข้อมูลเปลี่ยน",
+                value=True,
+                key="runner_upsert",
+                help="รันพื้นที่เดิมซ้ำ: place ที่เว็บไซต์/เบอร์/อีเมลเปลี่ยนจะถูกอัปเดตและให้ Stage 2 ทำใหม่ (ที่ไม่เปลี่ยนข้าม)",
+            )
+            keep_archive = st.checkbox(
+                "🗄️ เก็บ HTML ลง Page Archive",
+                value=False,
+                key="runner_archive",
+                help=f"เก็บหน้าเว็บที่ Stage 2–4 fetch (บีบอัด) ใน `{ARCHIVE_FILE}` — ใช้ re-extract ภายหลังได้โดยไม่ต้อง scrape ใหม่",
+            )
 
         disable_start = (not docker_ok) or (not st.session_state.get("built_query"))
         if not docker_ok:
@@ -737,146 +1291,240 @@ def render_runner(docker_ok: bool, db_exists: bool, loc_ok: bool):
             try:
                 with open(QUERIES_FILE, "w", encoding="utf-8") as f:
                     f.write(built_query)
-                st.info(f"📝 ใช้ Query: **{built_query}**")
             except Exception as e:
                 st.error(f"❌ Error creating queries file: {e}")
                 st.stop()
 
-            # ========== Stage 1 ==========
-            if run_stage1:
-                st.info(
-                    "⏳ **Stage 1 ครั้งแรก:** ถ้าขึ้น log `Downloading driver path=/opt` ให้รอ **5–15 นาที** "
-                    "(ดาวน์โหลด Chrome ใน container) ครั้งถัดไปจะเร็วขึ้นมาก — อย่าปิดหรือหยุดรัน"
-                )
-                with st.status("🔄 Stage 1: Google Maps Scraper (Docker)", expanded=True) as status:
-                    output_placeholder = st.empty()
-
-                    host_project_dir = get_docker_host_path_for_app_mount("/app")
-                    cwd_str = host_project_dir or str(PROJECT_ROOT)
-
-                    results_path = Path(RESULTS_CSV)
-                    results_path.parent.mkdir(parents=True, exist_ok=True)
-                    if not results_path.exists():
-                        results_path.touch()
-
-                    cmd = [
-                        "docker",
-                        "run",
-                        "--rm",
-                        "-v",
-                        f"{cwd_str}:/work",
-                        "gosom/google-maps-scraper",
-                        "-input",
-                        f"/work/{QUERIES_FILE}",
-                        "-results",
-                        f"/work/{RESULTS_CSV}",
-                        "-depth",
-                        str(depth),
-                        "-exit-on-inactivity",
-                        "3m",
-                    ]
-
-                    returncode, _output = run_subprocess_with_live_output(cmd, output_placeholder)
-                    if returncode == 0:
-                        status.update(label="✅ Stage 1: Scraping สำเร็จ", state="complete")
-                        st.success(f"✅ Scraping สำเร็จ → {RESULTS_CSV}")
-                    else:
-                        status.update(label="❌ Stage 1: Scraping ล้มเหลว", state="error")
-                        st.error("❌ Scraping ล้มเหลว")
-                        st.stop()
-
-                with st.status("🔄 Stage 1: CSV → SQLite", expanded=False) as status:
-                    output_placeholder = st.empty()
-                    cmd = ["python", "scripts/csv_to_sqlite.py", str(PROJECT_ROOT / RESULTS_CSV), str(PROJECT_ROOT / DB_FILE)]
-                    returncode, _output = run_subprocess_with_live_output(cmd, output_placeholder)
-                    if returncode == 0:
-                        status.update(label="✅ CSV → SQLite สำเร็จ", state="complete")
-                        st.success(f"✅ แปลงสำเร็จ → {DB_FILE}")
-                    else:
-                        status.update(label="❌ CSV → SQLite ล้มเหลว", state="error")
-                        st.error("❌ แปลงล้มเหลว")
-                        st.stop()
-
-            # ========== Stage 2 & 3 ==========
-            if run_stage2 or run_stage3:
-                st.markdown("<div class='mv-divider'></div>", unsafe_allow_html=True)
-                if run_parallel and run_stage2 and run_stage3:
-                    with st.status("⚡ Stage 2 & 3: Parallel execution", expanded=True) as status:
-                        cmd = ["python", "scripts/run_parallel.py"]
-                        returncode, _output = run_subprocess_with_live_output(cmd, st.empty())
-                        if returncode == 0:
-                            status.update(label="✅ Parallel execution สำเร็จ", state="complete")
-                            st.success("✅ Parallel execution สำเร็จ")
-                        else:
-                            status.update(label="❌ Parallel execution ล้มเหลว", state="error")
-                            st.error("❌ Parallel execution ล้มเหลว")
-                            st.stop()
-                else:
-                    if run_stage2:
-                        with st.status("🌐 Stage 2: Website Email Finder", expanded=True) as status:
-                            output_placeholder = st.empty()
-                            cmd = ["python", "stage2_email_finder.py", "--db", str(PROJECT_ROOT / DB_FILE), "--verbose"]
-                            returncode, _output = run_subprocess_with_live_output(cmd, output_placeholder)
-                            if returncode == 0:
-                                status.update(label="✅ Stage 2 สำเร็จ", state="complete")
-                            else:
-                                status.update(label="❌ Stage 2 ล้มเหลว", state="error")
-                                st.stop()
-
-                    if run_stage3:
-                        with st.status("📘 Stage 3: Facebook Scraper", expanded=True) as status:
-                            output_placeholder = st.empty()
-                            cmd = ["python", "facebook_about_scraper.py", "--db", str(PROJECT_ROOT / DB_FILE), "--verbose"]
-                            returncode, _output = run_subprocess_with_live_output(cmd, output_placeholder)
-                            if returncode == 0:
-                                status.update(label="✅ Stage 3 สำเร็จ", state="complete")
-                            else:
-                                status.update(label="❌ Stage 3 ล้มเหลว", state="error")
-                                st.stop()
-
-            # ========== Stage 4 ==========
-            if run_stage4:
-                with st.status("🔗 Stage 4: Cross-Reference Scraper", expanded=True) as status:
-                    output_placeholder = st.empty()
-                    cmd = ["python", "stage4_crossref_scraper.py", "--db", str(PROJECT_ROOT / DB_FILE), "--verbose"]
-                    returncode, _output = run_subprocess_with_live_output(cmd, output_placeholder)
-                    if returncode == 0:
-                        status.update(label="✅ Stage 4 สำเร็จ", state="complete")
-                    else:
-                        status.update(label="❌ Stage 4 ล้มเหลว", state="error")
-
-            # ========== กรองอีเมลไม่ถูกต้องทิ้ง ==========
-            with st.status("🧹 กรองอีเมลไม่ถูกต้องทิ้ง", expanded=False) as status:
-                try:
-                    conn = sqlite3.connect(str(PROJECT_ROOT / DB_FILE))
-                    cursor = conn.execute("SELECT id, email FROM emails")
-                    rows = cursor.fetchall()
-                    deleted = 0
-                    for row in rows:
-                        eid, email = row[0], (row[1] or "").strip()
-                        if not _is_valid_email(email):
-                            conn.execute("DELETE FROM emails WHERE id = ?", (eid,))
-                            deleted += 1
-                    conn.commit()
-                    conn.close()
-                    if deleted > 0:
-                        status.update(label=f"✅ กรองอีเมลไม่ถูกต้องทิ้งแล้ว {deleted} รายการ", state="complete")
-                        st.caption(f"ลบอีเมลรูปแบบไม่ถูกต้องออกจาก DB แล้ว {deleted} รายการ")
-                    else:
-                        status.update(label="✅ ไม่มีอีเมลที่ไม่ถูกต้อง", state="complete")
-                except Exception as e:
-                    status.update(label="⚠️ กรองอีเมลข้าม", state="complete")
-                    st.caption(f"ข้ามขั้นตอนกรอง: {e}")
+            amphoe = st.session_state.get("loc_amphoe_dd", "—")
+            options = {
+                "depth": depth,
+                "shards": shards,
+                "adaptive": adaptive_depth,
+                "min_new": int(min_new),
+                "geo_tiling": geo_tiling,
+                "tile_km": tile_km,
+                "province": st.session_state.get("loc_province_dd", ""),
+                "amphoe": "" if amphoe == "—" else amphoe,
+                "overlap_stage2": overlap_stage2,
+                "upsert": refresh_changed,
+                "archive": keep_archive,
+                # GUI ใน container: scraper ต้อง mount path ที่ Docker daemon เห็น
+                "work_dir": get_docker_host_path_for_app_mount("/app"),
+            }
+            try:
+                job_id = submit_job(str(PROJECT_ROOT / DB_FILE), built_query, options)
+                st.success(f"📥 เข้าคิวแล้ว — Job #{job_id} (รันเบื้องหลัง ปิดหรือ refresh หน้านี้ได้ งานไม่หยุด)")
+                if not get_stage1_startup_history():
+                    st.info(
+                        "⏳ **Stage 1 ครั้งแรก:** ถ้าขึ้น log `Downloading driver path=/opt` ให้รอ **5–15 นาที** "
+                        "(ดาวน์โหลด Chrome ลง cache volume) ครั้งถัดไปจะเร็วขึ้นมาก — อย่าปิดหรือหยุดรัน"
+                    )
+            except Exception as e:
+                st.error(f"❌ ส่งงานไม่สำเร็จ: {e}")
 
-            st.success("🎉 Pipeline เสร็จสิ้น! ไปดูผลต่อได้ที่หน้า Results Explorer")
-            st.balloons()
+        jobs_active = render_pipeline_jobs()
 
     with right:
         with card("💡 Tips", help_text="เริ่มง่าย ๆ ก่อนแล้วค่อยเพิ่มความลึก"):
             st.caption("- เริ่มที่ Depth 2")
             st.caption("- รันแบบ Sequential ถูกบังคับใช้เพื่อความเสถียร")
+            st.caption("- เปิด 'เริ่ม Stage 2 ระหว่างที่ Stage 1 ยังรัน' เพื่อลดเวลารวม")
+            st.caption("- หลายประเภท (คั่นด้วย , ) + Shards > 1 = รันหลาย container พร้อมกัน")
+        with card("⏱️ Stage 1 Startup", help_text="เวลาจนกว่า scraper เริ่มทำงาน (หลังดาวน์โหลด driver)"):
+            history = get_stage1_startup_history()
+            if not history:
+                st.caption("ยังไม่มีประวัติ — รอบแรกจะดาวน์โหลด driver/browser ลง cache volume")
+            for started_at, mode, startup_seconds in history:
+                startup = f"{startup_seconds:.0f}s" if startup_seconds is not None else "-"
+                st.caption(f"- {time.strftime('%d/%m %H:%M', time.localtime(started_at))} · {mode} · startup {startup}")
             st.caption("- ให้แน่ใจว่ามีไฟล์ `data/th_locations.json` ในโปรเจกต์")
 
+    if jobs_active and st.session_state.get("jobs_auto_refresh", True):
+        # ดึงสถานะ job ใหม่ทุก 2 วินาทีระหว่างที่ยังมีงานรัน/เข้าคิว
+        time.sleep(JOBS_REFRESH_SECONDS)
+        st.rerun()
+
+
+# ========== Success / Failed (place_summary) ==========
+
+PAGE_SIZES = [50, 100, 250, 500]
+
+# ตัวกรอง "Website" ของแท็บ Failed → website_kind
+WEBSITE_STATUS_KINDS = {
+    "ไม่มีเว็บไซต์": ["none"],
+    "มีแต่ Facebook": ["facebook"],
+    "มีเว็บไซต์": ["site", "line", "instagram"],
+}
+
+SUCCESS_COLUMNS = """
+    place_id,
+    name AS place_name,
+    category,
+    phone,
+    website,
+    emails,
+    sources,
+    email_count,
+    status,
+    datetime(updated_at, 'unixepoch') AS updated_at
+"""
+
+FAILED_COLUMNS = """
+    place_id,
+    name AS place_name,
+    category,
+    phone,
+    website,
+    status,
+    CASE
+        WHEN status = 'FAILED' THEN 'ไม่เจออีเมล'
+        WHEN status = 'NEW' THEN 'ยังไม่ได้รัน'
+        WHEN status = 'PROCESSING' THEN 'กำลังประมวลผล'
+        ELSE 'ไม่ทราบสาเหตุ'
+    END AS failure_reason,
+    CASE website_kind
+        WHEN 'none' THEN 'ไม่มีเว็บไซต์'
+        WHEN 'facebook' THEN 'มีแต่ Facebook'
+        ELSE 'มีเว็บไซต์'
+    END AS website_status,
+    datetime(updated_at, 'unixepoch') AS updated_at
+"""
+
+
+def build_place_summary_query(has_email, filters):
+    """FROM + WHERE + params + ORDER BY นำหน้า ของ place_summary ตามตัวกรอง (ทุกค่าเป็น parameter)"""
+    source = "place_summary"
+    clauses = ["has_email = ?"]
+    params = []
+    order = ""
+    search = (filters.get("search") or "").strip()
+    match = fts_match_expr(search)
+    if match:
+        # ชื่อ/category/ที่อยู่/เว็บไซต์/อีเมล ผ่าน FTS5 เรียงตามความตรง
+        source += f" JOIN ({PLACE_SEARCH_HITS_SQL}) h USING (place_id)"
+        params.extend([match, match])
+        order = "h.score, "
+    params.append(has_email)
+    if filters.get("status"):
+        clauses.append("status = ?")
+        params.append(filters["status"])
+    if filters.get("website_kinds"):
+        clauses.append(f"website_kind IN ({','.join('?' * len(filters['website_kinds']))})")
+        params.extend(filters["website_kinds"])
+    if filters.get("category"):
+        clauses.append("category = ?")
+        params.append(filters["category"])
+    if filters.get("source"):
+        clauses.append("instr(',' || sources || ',', ?) > 0")
+        params.append(f",{filters['source']},")
+    if search and not match:
+        # คำสั้นเกินกว่า trigram: Success ค้นชื่อ/อีเมล, Failed ค้นชื่อ/เว็บไซต์ ด้วย LIKE
+        other = "emails" if has_email else "website"
+        clauses.append(f"(name LIKE ? OR {other} LIKE ?)")
+        params.extend([f"%{search}%", f"%{search}%"])
+    return source, " AND ".join(clauses), params, order
+
+
+@db_cached
+def get_place_summary_total(has_email, filters):
+    with read_db() as conn:
+        source, where, params, _order = build_place_summary_query(has_email, filters)
+        return conn.execute(f"SELECT COUNT(*) FROM {source} WHERE {where}", params).fetchone()[0]
+
+
+def place_summary_page_sql(has_email, filters, limit=None, offset=0):
+    """SQL + params ของ place_summary (ล่าสุดก่อน) — limit=None = ทั้งหมด (export)"""
+    source, where, params, order = build_place_summary_query(has_email, filters)
+    sql = f"""
+        SELECT {SUCCESS_COLUMNS if has_email else FAILED_COLUMNS}
+        FROM {source}
+        WHERE {where}
+        ORDER BY {order}updated_at DESC
+    """
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params = params + [limit, offset]
+    return sql, params
+
+
+@db_cached
+def get_place_summary_page(has_email, filters, limit=None, offset=0):
+    """แถว 1 หน้าของ place_summary"""
+    with read_db() as conn:
+        sql, params = place_summary_page_sql(has_email, filters, limit=limit, offset=offset)
+        return pd.read_sql_query(sql, conn, params=params)
+
+
+@db_cached
+def get_summary_categories(has_email):
+    with read_db() as conn:
+        rows = conn.execute(
+            "SELECT DISTINCT category FROM place_summary WHERE has_email = ? AND category IS NOT NULL ORDER BY category",
+            (has_email,),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+
+@db_cached
+def get_summary_statuses(has_email):
+    with read_db() as conn:
+        rows = conn.execute(
+            "SELECT DISTINCT status FROM place_summary WHERE has_email = ? AND status IS NOT NULL ORDER BY status",
+            (has_email,),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+
+def render_export(key, sql, params, name, label):
+    """
+    เลือก format + ปุ่มเตรียมไฟล์ — ไฟล์ถูกสร้างเฉพาะตอนกด (อ่านจาก cursor ทีละชุดลงไฟล์ใน EXPORT_DIR)
+    ไม่สร้าง CSV ทั้งก้อนในหน่วยความจำทุก rerun
+    """
+    fmt = st.selectbox(
+        "รูปแบบไฟล์",
+        available_formats(),
+        format_func=lambda f: EXPORT_FORMATS[f][0],
+        key=f"{key}_format",
+        help="CSV (Excel) = UTF-8 with BOM เปิดใน Excel แล้วภาษาไทยไม่เพี้ยน · Parquet = สำหรับ pandas/BI",
+    )
+    if st.button(f"📦 เตรียมไฟล์ ({label})", key=f"{key}_prepare", width="stretch"):
+        try:
+            with st.spinner("กำลังเขียนไฟล์..."):
+                path, rows = export_to_temp(
+                    str(PROJECT_ROOT / DB_FILE), sql, params, fmt, name, export_dir=str(PROJECT_ROOT / EXPORT_DIR)
+                )
+            with open(path, "rb") as f:
+                st.download_button(
+                    label=f"⬇️ Download {os.path.basename(path)} ({rows} แถว)",
+                    data=f,
+                    file_name=os.path.basename(path),
+                    mime=EXPORT_FORMATS[fmt][2],
+                    width="stretch",
+                    key=f"{key}_download",
+                )
+        except Exception as e:
+            st.error(f"❌ Export ไม่สำเร็จ: {e}")
+
+
+def render_place_summary_page(has_email, filters, key, export_name):
+    """ตาราง 1 หน้า + ตัวเลือกหน้า + export (ทุกหน้าที่ผ่านตัวกรอง สร้างเมื่อกดปุ่ม)"""
+    total = get_place_summary_total(has_email, filters)
+    p1, p2, p3 = st.columns([1, 1, 2])
+    with p1:
+        page_size = st.selectbox("ต่อหน้า", PAGE_SIZES, index=1, key=f"{key}_page_size")
+    pages = max(1, (total + page_size - 1) // page_size)
+    with p2:
+        page = st.number_input("หน้า", min_value=1, max_value=pages, value=1, step=1, key=f"{key}_page")
+    with p3:
+        first = (page - 1) * page_size
+        st.caption(f"แสดง {min(first + 1, total)}–{min(first + page_size, total)} จาก {total} places ({pages} หน้า)")
+
+    df = get_place_summary_page(has_email, filters, limit=page_size, offset=(page - 1) * page_size)
+    st.dataframe(df, use_container_width=True, hide_index=True)
+
+    sql, params = place_summary_page_sql(has_email, filters)
+    render_export(f"{key}_export", sql, params, export_name, f"{total} places")
+
 
 def render_results(docker_ok: bool, db_exists: bool, loc_ok: bool):
     badges = [
@@ -932,21 +1580,20 @@ def render_results(docker_ok: bool, db_exists: bool, loc_ok: bool):
 
     with t2:
         with card("📬 Emails", help_text="เลือกรายการอีเมลที่ต้องการ แล้ว Export หรือส่งข้อความได้"):
-            df = get_emails_dataframe(DB_FILE)
-            if df is None or len(df) == 0:
+            total_all = get_emails_total({})
+            if total_all == 0:
                 st.info("ยังไม่มีอีเมลในฐานข้อมูล")
             else:
+                source_options, category_options, invalid_count = get_emails_filter_options()
                 # ฟิลเตอร์
                 st.markdown("**🔍 ฟิลเตอร์**")
-                f1, f2, f3, f4 = st.columns(4)
+                f1, f2, f3, f4, f5 = st.columns(5)
                 with f1:
-                    search_emails = st.text_input("ค้นหา (ชื่อสถานที่, อีเมล, category)", key="emails_filter_search", placeholder="พิมพ์เพื่อค้น...")
+                    search_emails = st.text_input("ค้นหา (ชื่อสถานที่, อีเมล, category, ที่อยู่, เว็บไซต์)", key="emails_filter_search", placeholder="พิมพ์เพื่อค้น (≥ 3 ตัวอักษรใช้ index)...")
                 with f2:
-                    sources = ["All"] + sorted(df["source"].dropna().unique().tolist())
-                    filter_source = st.selectbox("Source", sources, key="emails_filter_source")
+                    filter_source = st.selectbox("Source", ["All"] + source_options, key="emails_filter_source")
                 with f3:
-                    categories = ["All"] + sorted(df["category"].dropna().unique().tolist())
-                    filter_category = st.selectbox("Category", categories, key="emails_filter_category")
+                    filter_category = st.selectbox("Category", ["All"] + category_options, key="emails_filter_category")
                 with f4:
                     filter_valid = st.selectbox(
                         "ความถูกต้องอีเมล",
@@ -954,31 +1601,53 @@ def render_results(docker_ok: bool, db_exists: bool, loc_ok: bool):
                         key="emails_filter_valid",
                         help="กรองตามรูปแบบอีเมล (มี @ และโดเมน)",
                     )
-
-                filtered_df = df.copy()
-                if search_emails and search_emails.strip():
-                    q = search_emails.strip().lower()
-                    mask = (
-                        filtered_df["place_name"].astype(str).str.lower().str.contains(q, na=False)
-                        | filtered_df["email"].astype(str).str.lower().str.contains(q, na=False)
-                        | filtered_df["category"].astype(str).str.lower().str.contains(q, na=False)
+                with f5:
+                    sort = st.selectbox("เรียงตาม", list(EMAILS_SORTS), key="emails_sort")
+
+                filters = {
+                    "search": search_emails,
+                    "source": None if filter_source == "All" else filter_source,
+                    "category": None if filter_category == "All" else filter_category,
+                    "valid": {"ถูกต้อง": True, "ไม่ถูกต้อง": False}.get(filter_valid),
+                }
+                total = get_emails_total(filters)
+
+                p1, p2, p3 = st.columns([1, 1, 2])
+                with p1:
+                    page_size = st.selectbox("ต่อหน้า", PAGE_SIZES, index=1, key="emails_page_size")
+                pages = max(1, (total + page_size - 1) // page_size)
+                with p2:
+                    page = st.number_input("หน้า", min_value=1, max_value=pages, value=1, step=1, key="emails_page")
+                offset = (page - 1) * page_size
+                with p3:
+                    st.caption(
+                        f"แสดง **{min(offset + 1, total)}–{min(offset + page_size, total)}** จาก **{total}** รายการ"
+                        f" (ทั้งหมด {total_all})"
+                        + (f" · อีเมลไม่ถูกต้อง **{invalid_count}** รายการ" if invalid_count > 0 else "")
                     )
-                    filtered_df = filtered_df[mask]
-                if filter_source != "All":
-                    filtered_df = filtered_df[filtered_df["source"] == filter_source]
-                if filter_category != "All":
-                    filtered_df = filtered_df[filtered_df["category"] == filter_category]
-                if filter_valid == "ถูกต้อง":
-                    filtered_df = filtered_df[filtered_df["email"].apply(_is_valid_email)]
-                elif filter_valid == "ไม่ถูกต้อง":
-                    filtered_df = filtered_df[~filtered_df["email"].apply(_is_valid_email)]
-
-                invalid_count = (~df["email"].apply(_is_valid_email)).sum()
-                st.caption(f"แสดง **{len(filtered_df)}** จาก **{len(df)}** รายการ" + (f" · อีเมลไม่ถูกต้อง **{invalid_count}** รายการ" if invalid_count > 0 else ""))
-
-                # เพิ่มคอลัมน์ "เลือก" สำหรับ checkbox
-                df_display = filtered_df.copy()
-                selected_ids = st.session_state.get("selected_email_ids", set())
+
+                page_df = get_emails_page(filters, sort=sort, limit=page_size, offset=offset)
+                page_ids = tuple(page_df["id"].astype(int).tolist())
+
+                # delta ของ editor ผูกกับตำแหน่งแถว แต่แถวของหน้าเลื่อนได้ทุก rerun (อีเมลใหม่จาก job เบื้องหลัง)
+                # → แปลง delta ของ editor รอบก่อน (การแก้ไข + checkbox) เป็น id ด้วยลำดับ id ตอนสร้าง editor นั้น ก่อนใช้ข้อมูลหน้าใหม่
+                view_key = (search_emails, filter_source, filter_category, filter_valid, sort, page_size, page)
+                prev_editor = st.session_state.get("emails_editor")
+                email_edits = st.session_state.get("email_edits", {})
+                selected_ids = set(st.session_state.get("selected_email_ids", set()))
+                if prev_editor:
+                    prev_key, prev_view, prev_ids = prev_editor
+                    fold_email_edits(st.session_state.get(prev_key, {}).get("edited_rows", {}), prev_ids, email_edits, selected_ids)
+                    if prev_view != view_key:
+                        email_edits = {}  # การแก้ไขที่ยังไม่บันทึกของหน้า/ตัวกรองเดิมไม่ตามมาหน้าใหม่ (การเลือกตามมา)
+                st.session_state.email_edits = email_edits
+                st.session_state.selected_email_ids = selected_ids
+
+                # เพิ่มคอลัมน์ "เลือก" สำหรับ checkbox — สถานะการเลือกเก็บเป็น id จึงคงอยู่เมื่อเปลี่ยนหน้า/ตัวกรอง
+                df_display = page_df.copy()
+                for email_id, changes in email_edits.items():
+                    for col, value in changes.items():
+                        df_display.loc[df_display["id"] == email_id, col] = value
                 df_display.insert(0, "เลือก", df_display["id"].astype(int).isin(selected_ids))
 
                 column_config = {
@@ -992,98 +1661,66 @@ def render_results(docker_ok: bool, db_exists: bool, loc_ok: bool):
                     "source": st.column_config.TextColumn("Source", disabled=False),
                     "found_at": st.column_config.DatetimeColumn("พบเมื่อ", disabled=True),
                 }
-                edited_df = st.data_editor(
+                # key ผูกกับหน้า/ตัวกรอง + id ของแถวตามลำดับ — แถวเลื่อนเมื่อไหร่ได้ editor ใหม่ ตำแหน่งใน edited_rows ไม่ชี้ผิดแถว
+                # (การแก้ไขที่ค้างอยู่ตามมาทาง email_edits ที่ผูกกับ id แล้ว)
+                # + รอบของการเลือก (เพิ่มเมื่อกด "ล้างที่เลือก") — editor ใหม่ไม่มี checkbox ที่ติ๊กค้างใน edited_rows
+                selection_gen = st.session_state.get("email_selection_gen", 0)
+                editor_key = "emails_data_editor_" + str(abs(hash((*view_key, page_ids, selection_gen))))
+                st.session_state.emails_editor = (editor_key, view_key, page_ids)
+                st.data_editor(
                     df_display,
                     column_config=column_config,
                     use_container_width=True,
                     hide_index=True,
-                    key="emails_data_editor",
+                    key=editor_key,
                 )
-                # บันทึกการแก้ไขลง DB
-                edited_data = edited_df.drop(columns=["เลือก"], errors="ignore")
+                # บันทึกการแก้ไขลง DB — ใช้ delta ของ data_editor (เฉพาะช่องที่แก้) ผูกกับ id ไม่ต้องเทียบทั้งตาราง
                 if st.button("💾 บันทึกการแก้ไข", type="primary", key="btn_save_emails_edit"):
                     try:
-                        conn = sqlite3.connect(DB_FILE)
-                        updated_count = 0
-                        for _, edited_row in edited_data.iterrows():
-                            orig = filtered_df[filtered_df["id"] == edited_row["id"]]
-                            if orig.empty:
-                                continue
-                            orig_row = orig.iloc[0]
-                            def _str(v):
-                                return "" if pd.isna(v) else str(v).strip()
-                            if (
-                                _str(orig_row.get("place_name")) != _str(edited_row.get("place_name"))
-                                or _str(orig_row.get("category")) != _str(edited_row.get("category"))
-                                or _str(orig_row.get("phone")) != _str(edited_row.get("phone"))
-                                or _str(orig_row.get("website")) != _str(edited_row.get("website"))
-                                or _str(orig_row.get("email")) != _str(edited_row.get("email"))
-                                or _str(orig_row.get("source")) != _str(edited_row.get("source"))
-                            ):
-                                place_id = conn.execute("SELECT place_id FROM emails WHERE id = ?", (int(edited_row["id"]),)).fetchone()[0]
-                                conn.execute(
-                                    "UPDATE emails SET email = ?, source = ? WHERE id = ?",
-                                    (_str(edited_row.get("email")) or "", _str(edited_row.get("source")) or "WEBSITE", int(edited_row["id"])),
-                                )
-                                conn.execute(
-                                    "UPDATE places SET name = ?, category = ?, phone = ?, website = ?, updated_at = strftime('%s','now') WHERE place_id = ?",
-                                    (
-                                        _str(edited_row.get("place_name")) or "",
-                                        _str(edited_row.get("category")) or "",
-                                        _str(edited_row.get("phone")) or "",
-                                        _str(edited_row.get("website")) or "",
-                                        place_id,
-                                    ),
-                                )
-                                updated_count += 1
-                        conn.commit()
-                        conn.close()
-                        st.success(f"บันทึกการแก้ไขเรียบร้อย (อัปเดต {updated_count} รายการ)")
+                        # การกดปุ่มคือ rerun → delta ล่าสุดของ editor ถูกแปลงเข้า email_edits ตอนต้นรอบนี้แล้ว
+                        email_count, place_count = save_email_edits(page_df, email_edits)
+                        st.session_state.email_edits = {}
+                        st.session_state.pop(editor_key, None)
+                        st.session_state.pop("emails_editor", None)
+                        st.toast(f"บันทึกการแก้ไขเรียบร้อย (อีเมล {email_count} รายการ, สถานที่ {place_count} แห่ง)")
                         st.rerun()
+                    except ValueError as e:
+                        # แถวที่หลุดจากหน้าไปแล้ว → ทิ้งการแก้ไขของแถวนั้น ที่เหลือกดบันทึกซ้ำได้
+                        st.session_state.email_edits = {i: c for i, c in email_edits.items() if i in page_ids}
+                        st.error(f"บันทึกไม่สำเร็จ: {e}")
                     except Exception as e:
                         st.error(f"บันทึกไม่สำเร็จ: {e}")
-                selected_df = edited_df[edited_df["เลือก"]]
-                st.session_state.selected_email_ids = set(selected_df["id"].astype(int).tolist()) if len(selected_df) > 0 else set()
+
+                # การเลือกเก็บเป็น id (รวมการติ๊กของรอบนี้แล้วตอนต้นรอบ) — ไม่อ่านจากตำแหน่งแถวของ editor
+                selected_df = get_emails_by_ids(tuple(sorted(st.session_state.selected_email_ids)))
                 selected_count = len(selected_df)
                 selected_emails = selected_df["email"].dropna().unique().tolist() if selected_count > 0 else []
 
-                st.caption(f"เลือกแล้ว **{selected_count}** รายการ (อีเมลไม่ซ้ำ **{len(selected_emails)}** ที่อยู่)")
+                s1, s2 = st.columns([3, 1])
+                with s1:
+                    st.caption(f"เลือกแล้ว **{selected_count}** รายการ (ทุกหน้า · อีเมลไม่ซ้ำ **{len(selected_emails)}** ที่อยู่)")
+                with s2:
+                    if selected_count > 0 and st.button("ล้างที่เลือก", key="btn_clear_selected_emails", width="stretch"):
+                        st.session_state.selected_email_ids = set()
+                        st.session_state.pop(editor_key, None)
+                        st.session_state.email_selection_gen = selection_gen + 1
+                        st.rerun()
 
                 col_export1, col_export2, col_send = st.columns(3)
                 with col_export1:
-                    csv_all = df.to_csv(index=False).encode("utf-8-sig")
-                    st.download_button(
-                        label="⬇️ Download ทั้งหมด CSV",
-                        data=csv_all,
-                        file_name="emails_all.csv",
-                        mime="text/csv",
-                        width="stretch",
-                    )
+                    sql, params = emails_page_sql({})
+                    render_export("emails_all", sql, params, "emails_all", f"ทั้งหมด {total_all}")
                 with col_export2:
-                    csv_filtered = filtered_df.to_csv(index=False).encode("utf-8-sig")
-                    st.download_button(
-                        label="⬇️ Download ที่แสดง CSV",
-                        data=csv_filtered,
-                        file_name="emails_filtered.csv",
-                        mime="text/csv",
-                        width="stretch",
-                        key="dl_emails_filtered",
-                    )
+                    sql, params = emails_page_sql(filters, sort=sort)
+                    render_export("emails_filtered", sql, params, "emails_filtered", f"ตามตัวกรอง {total}")
                 with col_send:
                     if selected_count > 0:
-                        csv_sel = selected_df.drop(columns=["เลือก"]).to_csv(index=False).encode("utf-8-sig")
-                        st.download_button(
-                            label=f"⬇️ Download ที่เลือก ({selected_count}) CSV",
-                            data=csv_sel,
-                            file_name="emails_selected.csv",
-                            mime="text/csv",
-                            width="stretch",
-                            key="dl_selected_emails",
-                        )
+                        sql, params = emails_by_ids_sql(st.session_state.selected_email_ids)
+                        render_export("emails_selected", sql, params, "emails_selected", f"ที่เลือก {selected_count}")
 
                 if selected_count > 0:
                     st.session_state.selected_emails_for_send = selected_emails
-                    st.session_state.selected_emails_df = selected_df.drop(columns=["เลือก"], errors="ignore")
+                    st.session_state.selected_emails_df = selected_df
                     with st.expander("📤 ส่งข้อความไปยังอีเมลที่เลือก", expanded=False):
                         oauth_creds = st.session_state.get("gmail_oauth_credentials")
                         smtp_user = st.session_state.get("smtp_user") or st.session_state.get("gmail_oauth_email") or os.getenv("SMTP_USER")
@@ -1158,27 +1795,8 @@ def render_results(docker_ok: bool, db_exists: bool, loc_ok: bool):
     with t3:
         with card("✅ Success places", help_text="Places ที่เจออีเมล + กรอง + export"):
             try:
-                conn = sqlite3.connect(DB_FILE)
-                query = """
-                    SELECT DISTINCT
-                        p.place_id,
-                        p.name AS place_name,
-                        p.category,
-                        p.phone,
-                        p.website,
-                        GROUP_CONCAT(DISTINCT e.email) AS emails,
-                        GROUP_CONCAT(DISTINCT e.source) AS sources,
-                        COUNT(DISTINCT e.id) AS email_count,
-                        p.status,
-                        datetime(p.updated_at, 'unixepoch') AS updated_at
-                    FROM places p
-                    JOIN emails e ON p.place_id = e.place_id
-                    GROUP BY p.place_id
-                    ORDER BY p.updated_at DESC
-                """
-                df = pd.read_sql_query(query, conn)
-                conn.close()
-                if len(df) == 0:
+                categories = get_summary_categories(has_email=1)
+                if get_place_summary_total(has_email=1, filters={}) == 0:
                     st.info("ℹ️ ยังไม่มี places ที่สำเร็จ - กรุณารัน Pipeline ก่อน")
                 else:
                     f1, f2, f3 = st.columns(3)
@@ -1186,100 +1804,41 @@ def render_results(docker_ok: bool, db_exists: bool, loc_ok: bool):
                         sources = ["All"] + ["WEBSITE", "FACEBOOK_PLAYWRIGHT", "CROSSREF_FB", "CROSSREF_WEB"]
                         selected_source = st.selectbox("Filter by Source", sources, key="success_source")
                     with f2:
-                        categories = ["All"] + list(df["category"].dropna().unique())
-                        selected_category = st.selectbox("Filter by Category", categories, key="success_category")
+                        selected_category = st.selectbox("Filter by Category", ["All"] + categories, key="success_category")
                     with f3:
-                        search = st.text_input("Search (name, email)", key="success_search")
-
-                    filtered_df = df.copy()
-                    if selected_source != "All":
-                        filtered_df = filtered_df[filtered_df["sources"].str.contains(selected_source, na=False)]
-                    if selected_category != "All":
-                        filtered_df = filtered_df[filtered_df["category"] == selected_category]
-                    if search:
-                        mask = (
-                            filtered_df["place_name"].str.contains(search, case=False, na=False)
-                            | filtered_df["emails"].str.contains(search, case=False, na=False)
-                        )
-                        filtered_df = filtered_df[mask]
-
-                    st.dataframe(filtered_df, use_container_width=True, hide_index=True)
-                    csv = filtered_df.to_csv(index=False).encode("utf-8-sig")
-                    st.download_button(
-                        label="⬇️ Download Success Places CSV",
-                        data=csv,
-                        file_name="success_places_export.csv",
-                        mime="text/csv",
-                        width="stretch",
-                    )
+                        search = st.text_input("Search (name, email, category, address, website)", key="success_search")
+
+                    filters = {
+                        "source": None if selected_source == "All" else selected_source,
+                        "category": None if selected_category == "All" else selected_category,
+                        "search": search,
+                    }
+                    render_place_summary_page(has_email=1, filters=filters, key="success", export_name="success_places_export")
             except Exception as e:
                 st.error(f"❌ Error: {e}")
 
     with t4:
         with card("❌ Failed places", help_text="Places ที่ยังไม่เจออีเมล + กรอง + export"):
             try:
-                conn = sqlite3.connect(DB_FILE)
-                query = """
-                    SELECT 
-                        p.place_id,
-                        p.name AS place_name,
-                        p.category,
-                        p.phone,
-                        p.website,
-                        p.status,
-                        CASE 
-                            WHEN p.status = 'FAILED' THEN 'ไม่เจออีเมล'
-                            WHEN p.status = 'NEW' THEN 'ยังไม่ได้รัน'
-                            WHEN p.status = 'PROCESSING' THEN 'กำลังประมวลผล'
-                            ELSE 'ไม่ทราบสาเหตุ'
-                        END AS failure_reason,
-                        CASE
-                            WHEN p.website IS NULL OR p.website = '' THEN 'ไม่มีเว็บไซต์'
-                            WHEN p.website LIKE '%facebook.com%' THEN 'มีแต่ Facebook'
-                            ELSE 'มีเว็บไซต์'
-                        END AS website_status,
-                        datetime(p.updated_at, 'unixepoch') AS updated_at
-                    FROM places p
-                    LEFT JOIN emails e ON p.place_id = e.place_id
-                    WHERE e.place_id IS NULL
-                    ORDER BY p.updated_at DESC
-                """
-                df = pd.read_sql_query(query, conn)
-                conn.close()
-                if len(df) == 0:
+                if get_place_summary_total(has_email=0, filters={}) == 0:
                     st.success("🎉 ไม่มี Failed Places - เจออีเมลครบทุก place แล้ว!")
                 else:
                     f1, f2, f3 = st.columns(3)
                     with f1:
-                        statuses = ["All"] + list(df["status"].unique())
+                        statuses = ["All"] + get_summary_statuses(has_email=0)
                         selected_status = st.selectbox("Filter by Status", statuses, key="failed_status")
                     with f2:
-                        website_statuses = ["All"] + list(df["website_status"].unique())
+                        website_statuses = ["All"] + list(WEBSITE_STATUS_KINDS)
                         selected_web_status = st.selectbox("Filter by Website", website_statuses, key="failed_web_status")
                     with f3:
-                        search = st.text_input("Search (name, website)", key="failed_search")
-
-                    filtered_df = df.copy()
-                    if selected_status != "All":
-                        filtered_df = filtered_df[filtered_df["status"] == selected_status]
-                    if selected_web_status != "All":
-                        filtered_df = filtered_df[filtered_df["website_status"] == selected_web_status]
-                    if search:
-                        mask = (
-                            filtered_df["place_name"].str.contains(search, case=False, na=False)
-                            | filtered_df["website"].str.contains(search, case=False, na=False)
-                        )
-                        filtered_df = filtered_df[mask]
-
-                    st.dataframe(filtered_df, use_container_width=True, hide_index=True)
-                    csv = filtered_df.to_csv(index=False).encode("utf-8-sig")
-                    st.download_button(
-                        label="⬇️ Download Failed Places CSV",
-                        data=csv,
-                        file_name="failed_places_export.csv",
-                        mime="text/csv",
-                        width="stretch",
-                    )
+                        search = st.text_input("Search (name, category, address, website)", key="failed_search")
+
+                    filters = {
+                        "status": None if selected_status == "All" else selected_status,
+                        "website_kinds": None if selected_web_status == "All" else WEBSITE_STATUS_KINDS[selected_web_status],
+                        "search": search,
+                    }
+                    render_place_summary_page(has_email=0, filters=filters, key="failed", export_name="failed_places_export")
             except Exception as e:
                 st.error(f"❌ Error: {e}")
 
@@ -1398,6 +1957,15 @@ def render_tools(docker_ok: bool, db_exists: bool, loc_ok: bool):
                     st.metric("Emails", stats.get("total_emails", 0))
                 with col3:
                     st.metric("Discovered URLs", stats.get("total_discovered", 0))
+                if st.button("🔄 นับตัวเลข Dashboard ใหม่", width="stretch", help="นับ stats_counters ใหม่จากตารางจริง (ถ้าตัวเลขดูเพี้ยน)"):
+                    try:
+                        conn = pipeline_db_connect(DB_FILE)
+                        rebuild_stats_counters(conn)
+                        conn.close()
+                        st.success("✅ นับใหม่แล้ว")
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"❌ Error: {e}")
 
                 if "confirm_clear_all_data" not in st.session_state:
                     st.session_state.confirm_clear_all_data = False
@@ -1412,10 +1980,11 @@ def render_tools(docker_ok: bool, db_exists: bool, loc_ok: bool):
                     with colA:
                         if st.button("✅ ยืนยันลบทั้งหมด", width="stretch"):
                             try:
-                                conn = sqlite3.connect(DB_FILE)
+                                conn = pipeline_db_connect(DB_FILE)
                                 cursor = conn.cursor()
                                 cursor.execute("DELETE FROM emails")
                                 cursor.execute("DELETE FROM discovered_urls")
+                                cursor.execute("DELETE FROM place_raw_data")
                                 cursor.execute("DELETE FROM places")
                                 cursor.execute("DELETE FROM sqlite_sequence WHERE name='places'")
                                 cursor.execute("DELETE FROM sqlite_sequence WHERE name='emails'")
@@ -1432,6 +2001,32 @@ def render_tools(docker_ok: bool, db_exists: bool, loc_ok: bool):
                             st.session_state.confirm_clear_all_data = False
                             st.rerun()
 
+        with card("🗄️ Page Archive", help_text="รัน extraction ใหม่จาก HTML ที่เก็บไว้ (ไม่เปิด browser)"):
+            archive_path = PROJECT_ROOT / ARCHIVE_FILE
+            if not archive_path.exists():
+                st.info(f"ℹ️ ยังไม่มี {ARCHIVE_FILE} — เปิด 'เก็บ HTML ลง Page Archive' ใน Runner ก่อน")
+            else:
+                st.caption(f"ขนาด archive: {archive_path.stat().st_size / 1024 / 1024:.1f} MB")
+                if st.button("♻️ Re-extract Stage 2–4 จาก archive", width="stretch", disabled=not Path(DB_FILE).exists()):
+                    for label, script in [
+                        ("🌐 Stage 2", "stage2_email_finder.py"),
+                        ("📘 Stage 3", "facebook_about_scraper.py"),
+                        ("🔗 Stage 4", "stage4_crossref_scraper.py"),
+                    ]:
+                        with st.status(f"{label}: Re-extract", expanded=False) as status:
+                            cmd = [
+                                "python", script,
+                                "--db", str(PROJECT_ROOT / DB_FILE),
+                                "--archive", str(archive_path),
+                                "--reextract",
+                            ]
+                            returncode, _output = run_subprocess_with_live_output(cmd, st.empty())
+                            if returncode == 0:
+                                status.update(label=f"✅ {label}: Re-extract สำเร็จ", state="complete")
+                            else:
+                                status.update(label=f"❌ {label}: Re-extract ล้มเหลว", state="error")
+                                break
+
     with tabs[2]:
         with card("🔎 Debug info", help_text="ช่วยตรวจสภาพแวดล้อมเวลาแก้ปัญหา"):
             st.write(
@@ -1494,9 +2089,15 @@ def main():
         if k not in st.session_state:
             st.session_state[k] = v
 
-    docker_ok = check_docker()
-    db_exists = Path(DB_FILE).exists()
-    loc_ok = Path(TH_LOCATIONS_FILE).exists()
+    # สถานะจาก health monitor (ตรวจเบื้องหลัง) — ไม่รัน docker CLI ทุก rerun
+    health = health_monitor().snapshot()
+    docker_ok = health["docker_ok"]
+    db_exists = health["db_exists"]
+    loc_ok = health["loc_ok"]
+
+    if docker_ok:
+        # ดาวน์โหลด driver/browser ของ Stage 1 ลง cache volume ตั้งแต่เปิดแอป
+        start_stage1_prewarm(health["docker_work_dir"])
 
     page = render_sidebar_nav(docker_ok=docker_ok, db_exists=db_exists, loc_ok=loc_ok)
 
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Page Archive 🗄️
+เก็บ HTML ที่ทุก stage fetch มา (บีบอัด + content-addressed) ในไฟล์ SQLite แยก (default: archive.db)
+- หน้าเดียวกันที่ fetch ซ้ำแล้วเนื้อหาไม่เปลี่ยน เก็บ blob ครั้งเดียว
+- ใช้กับโหมด --reextract: รัน extraction ใหม่จาก archive โดยไม่ต้องเปิด browser
+"""
+import hashlib
+import sqlite3
+
+from pipeline_db import compress_blob, decompress_blob
+
+DEFAULT_ARCHIVE_PATH = 'archive.db'
+
+
+class PageArchive:
+    def __init__(self, path=DEFAULT_ARCHIVE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS archive_blobs (
+                content_hash TEXT PRIMARY KEY,  -- sha256 ของ HTML (ก่อนบีบอัด)
+                codec TEXT NOT NULL,  -- 'zstd' หรือ 'zlib'
+                size INTEGER NOT NULL,  -- ขนาดก่อนบีบอัด (bytes)
+                data BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS archive_pages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,  -- URL ที่ stage ขอ
+                final_url TEXT NOT NULL,  -- URL หลัง redirect
+                content_hash TEXT NOT NULL REFERENCES archive_blobs(content_hash),
+                fetched_by TEXT NOT NULL,  -- 'STAGE2', 'STAGE3', 'STAGE4'
+                fetched_at INTEGER NOT NULL DEFAULT (strftime('%s', 'now'))
+            );
+            CREATE INDEX IF NOT EXISTS idx_archive_pages_url ON archive_pages(url, fetched_at);
+            CREATE INDEX IF NOT EXISTS idx_archive_pages_final_url ON archive_pages(final_url, fetched_at);
+        """)
+        
+        # Stats
+        self.stored = 0
+        self.replayed = 0
+        self.missing = 0
+    
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+    
+    def store(self, url, final_url, html, stage):
+        """เก็บ HTML 1 หน้า (blob ซ้ำไม่เก็บซ้ำ)"""
+        data = html.encode('utf-8')
+        content_hash = hashlib.sha256(data).hexdigest()
+        exists = self.conn.execute(
+            "SELECT 1 FROM archive_blobs WHERE content_hash=?", (content_hash,)
+        ).fetchone()
+        if not exists:
+            codec, blob = compress_blob(data)
+            self.conn.execute(
+                "INSERT INTO archive_blobs (content_hash, codec, size, data) VALUES (?, ?, ?, ?)",
+                (content_hash, codec, len(data), blob)
+            )
+        self.conn.execute(
+            "INSERT INTO archive_pages (url, final_url, content_hash, fetched_by) VALUES (?, ?, ?, ?)",
+            (url, final_url or url, content_hash, stage)
+        )
+        self.conn.commit()
+        self.stored += 1
+    
+    def latest(self, url):
+        """HTML ล่าสุดของ url (ตรงกับ URL ที่ขอ หรือ final URL) หรือ None ถ้าไม่เคยเก็บ"""
+        row = self.conn.execute("""
+            SELECT b.codec, b.data
+            FROM archive_pages p
+            JOIN archive_blobs b ON b.content_hash = p.content_hash
+            WHERE p.id = (
+                SELECT id FROM (
+                    SELECT id, fetched_at FROM archive_pages WHERE url = ?
+                    UNION ALL
+                    SELECT id, fetched_at FROM archive_pages WHERE final_url = ?
+                ) ORDER BY fetched_at DESC, id DESC LIMIT 1
+            )
+        """, (url, url)).fetchone()
+        if not row:
+            self.missing += 1
+            return None
+        self.replayed += 1
+        return decompress_blob(row[0], row[1]).decode('utf-8', errors='ignore')
+    
+    def summary(self):
+        """ข้อความสรุปสำหรับพิมพ์ท้าย stage"""
+        if self.replayed or self.missing:
+            return f"replayed {self.replayed} pages, {self.missing} not in archive"
+        return f"stored {self.stored} pages → {self.path}"
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pipeline DB helpers
+- รัน migrations ใน scripts/migrations ตามลำดับชื่อไฟล์
+- จำว่ารันไฟล์ไหนไปแล้วในตาราง schema_migrations (ไฟล์ที่มี ALTER TABLE รันซ้ำไม่ได้)
+- บีบอัด/คลาย blob (zstd ถ้ามี zstandard ไม่งั้น zlib)
+- raw data ของ place (ตาราง place_raw_data) อ่าน/เขียนแบบบีบอัด คลายเฉพาะตอนเรียกใช้
+- จัดประเภท website ของ place (site / facebook / line / instagram / none) + host
+- ตัวนับของ dashboard (stats_counters — trigger อัปเดต, rebuild ได้ถ้าเพี้ยน)
+- สรุปต่อ place (place_summary) สำหรับแท็บ Success / Failed — trigger อัปเดตเช่นกัน
+"""
+import os
+import json
+import sqlite3
+import zlib
+from urllib.parse import urlsplit
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+MIGRATIONS_DIR = os.path.join(PROJECT_ROOT, 'scripts', 'migrations')
+BUSY_TIMEOUT_SECONDS = 30  # รอ lock ของ writer อื่น (importer / stage / supervisor / GUI) แทน error "database is locked"
+
+
+def get_applied_migrations(conn):
+    """คืน set ของชื่อไฟล์ migration ที่รันไปแล้ว"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            name TEXT PRIMARY KEY,
+            applied_at INTEGER NOT NULL DEFAULT (strftime('%s', 'now'))
+        )
+    """)
+    conn.commit()
+    return {row[0] for row in conn.execute("SELECT name FROM schema_migrations")}
+
+
+def apply_migrations(conn, verbose=False):
+    """
+    รัน migration ที่ยังไม่เคยรัน — แต่ละไฟล์ + hook ของไฟล์นั้นอยู่ใน transaction เดียว (พังกลางทาง = rollback ทั้งหมด รอบหน้ารันใหม่)
+    หลาย process migrate พร้อมกันได้ (ingest + Stage 2, shards, supervisor):
+    - BEGIN IMMEDIATE จอง write lock ก่อน → process อื่นรอ (busy_timeout) ไม่รันไฟล์เดียวกันซ้อนกัน
+    - บันทึกชื่อไฟล์เป็นคำสั่งแรกใน transaction → ถ้า process อื่นรันไปแล้ว PRIMARY KEY ชน → ข้ามไฟล์นั้น
+    คืน list ชื่อไฟล์ที่รันในครั้งนี้
+    """
+    if not os.path.isdir(MIGRATIONS_DIR):
+        raise FileNotFoundError(f"Migrations folder not found: {MIGRATIONS_DIR}")
+
+    applied = get_applied_migrations(conn)
+    ran = []
+    for name in sorted(os.listdir(MIGRATIONS_DIR)):
+        if not name.endswith('.sql') or name in applied:
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, name), 'r', encoding='utf-8') as f:
+            sql = f.read()
+        hook = POST_MIGRATION_HOOKS.get(name)
+        try:
+            conn.executescript(
+                "BEGIN IMMEDIATE;\n"
+                f"INSERT INTO schema_migrations (name) VALUES ('{name}');\n"
+                + sql
+            )
+            # ขั้นตอนที่ต้องทำใน Python (เช่น บีบอัดข้อมูลที่ SQL ย้ายมา) — ก่อน COMMIT ที่บันทึกว่ารันแล้ว
+            done = hook(conn) if hook else None
+            conn.commit()
+        except sqlite3.IntegrityError:
+            if conn.in_transaction:
+                conn.rollback()
+            if name in get_applied_migrations(conn):
+                continue  # process อื่นรันไฟล์นี้ไปแล้วระหว่างรอ lock
+            raise
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        ran.append(name)
+        if verbose:
+            print(f"  ✅ {name} completed")
+            if hook:
+                print(f"     ↳ {hook.__name__}: {done} rows")
+    return ran
+
+
+def connect(db_path, migrate=True, **kwargs):
+    """
+    เปิด connection + รัน migrations ที่ค้างอยู่ (kwargs ส่งต่อให้ sqlite3.connect)
+    - WAL: reader ไม่ block writer และ writer ไม่ block reader (ค่านี้ติดไปกับไฟล์ DB)
+    - busy_timeout: writer หลายตัวพร้อมกันรอคิวกันเองได้สูงสุด BUSY_TIMEOUT_SECONDS
+    """
+    kwargs.setdefault('timeout', BUSY_TIMEOUT_SECONDS)
+    conn = sqlite3.connect(db_path, **kwargs)
+    conn.execute(f"PRAGMA busy_timeout = {int(kwargs['timeout'] * 1000)}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    if migrate:
+        apply_migrations(conn)
+    return conn
+
+
+# ==================== Blob compression ====================
+
+def compress_blob(data):
+    """บีบอัด bytes/str → (codec, blob) — codec เก็บคู่กับ blob เพื่อคลายทีหลัง"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    if ZSTD_AVAILABLE:
+        return 'zstd', zstandard.ZstdCompressor(level=10).compress(data)
+    return 'zlib', zlib.compress(data, 6)
+
+
+def decompress_blob(codec, blob):
+    """คลาย blob ตาม codec → bytes"""
+    if codec == 'zstd':
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("blob นี้บีบอัดด้วย zstd — ติดตั้งก่อน: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    if codec == 'zlib':
+        return zlib.decompress(blob)
+    if codec == 'none':
+        return blob if isinstance(blob, bytes) else str(blob).encode('utf-8')
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+# ==================== Place raw data ====================
+
+def store_raw_data(conn, rows, replace=False):
+    """
+    บันทึก raw data ของ place แบบบีบอัด
+    rows: iterable ของ (place_id, raw_json) — replace=False ไม่ทับของเดิม
+    """
+    verb = 'INSERT OR REPLACE' if replace else 'INSERT OR IGNORE'
+    conn.executemany(
+        f"{verb} INTO place_raw_data (place_id, codec, data) VALUES (?, ?, ?)",
+        ((place_id, *compress_blob(raw_json)) for place_id, raw_json in rows)
+    )
+
+
+def decode_raw_data(codec, blob):
+    """(codec, blob) จาก place_raw_data → dict (ว่างถ้าไม่มี/อ่านไม่ได้)"""
+    if codec is None or blob is None:
+        return {}
+    try:
+        data = json.loads(decompress_blob(codec, blob).decode('utf-8'))
+    except (ValueError, zlib.error):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def load_raw_data(conn, place_id):
+    """raw data (dict) ของ place — ไม่มีคืน {}"""
+    row = conn.execute("SELECT codec, data FROM place_raw_data WHERE place_id=?", (place_id,)).fetchone()
+    return decode_raw_data(*row) if row else {}
+
+
+def compress_pending_raw_data(conn, batch_size=500):
+    """บีบอัดแถวที่ migration 0007 คัดลอกมาแบบ codec='none' คืนจำนวนแถว"""
+    outer = conn.in_transaction  # เรียกจาก apply_migrations → ให้ migration commit ทีเดียว
+    total = 0
+    while True:
+        rows = conn.execute(
+            "SELECT place_id, data FROM place_raw_data WHERE codec='none' LIMIT ?", (batch_size,)
+        ).fetchall()
+        if not rows:
+            return total
+        conn.executemany(
+            "UPDATE place_raw_data SET codec=?, data=? WHERE place_id=?",
+            ((*compress_blob(data), place_id) for place_id, data in rows)
+        )
+        if not outer:
+            conn.commit()
+        total += len(rows)
+
+
+# ==================== Website kind ====================
+
+SOCIAL_DOMAINS = {
+    'facebook': ('facebook.com', 'fb.com', 'fb.me', 'fb.watch'),
+    'line': ('line.me', 'lin.ee'),
+    'instagram': ('instagram.com', 'instagr.am'),
+}
+
+
+def website_host(url):
+    """host ของ URL แบบ normalize (ตัวเล็ก ไม่มี www./port) — None ถ้าไม่มี"""
+    if not url or not isinstance(url, str) or not url.strip():
+        return None
+    url = url.strip()
+    if '://' not in url:
+        url = 'https://' + url
+    try:
+        host = (urlsplit(url).hostname or '').rstrip('.')
+    except ValueError:
+        return None
+    if host.startswith('www.'):
+        host = host[4:]
+    return host or None
+
+
+def classify_website(url):
+    """(website_kind, website_host) — kind: 'site', 'facebook', 'line', 'instagram', 'none'"""
+    host = website_host(url)
+    if not host:
+        return 'none', None
+    for kind, domains in SOCIAL_DOMAINS.items():
+        if any(host == domain or host.endswith('.' + domain) for domain in domains):
+            return kind, host
+    return 'site', host
+
+
+def backfill_website_kind(conn, batch_size=1000):
+    """เติม website_kind/website_host ให้ place ที่นำเข้าก่อน migration 0011 คืนจำนวนแถว"""
+    outer = conn.in_transaction  # เรียกจาก apply_migrations → ให้ migration commit ทีเดียว
+    total = 0
+    while True:
+        rows = conn.execute(
+            "SELECT place_id, website FROM places WHERE website_kind IS NULL LIMIT ?", (batch_size,)
+        ).fetchall()
+        if not rows:
+            return total
+        conn.executemany(
+            "UPDATE places SET website_kind=?, website_host=? WHERE place_id=?",
+            ((*classify_website(website), place_id) for place_id, website in rows)
+        )
+        if not outer:
+            conn.commit()
+        total += len(rows)
+
+
+# ==================== Stats counters ====================
+
+STATS_SCOPES = {
+    'places.status': ('places', 'status'),
+    'emails.source': ('emails', 'source'),
+    'discovered_urls.status': ('discovered_urls', 'status'),
+    'discovered_urls.url_type': ('discovered_urls', 'url_type'),
+}
+
+
+def rebuild_stats_counters(conn):
+    """นับ stats_counters ใหม่จากตารางจริง (ครั้งแรกหลัง migration 0012 / ซ่อมค่าที่เพี้ยน) คืนจำนวนแถว"""
+    outer = conn.in_transaction  # เรียกจาก apply_migrations → อยู่ใน transaction ของ migration
+    if not outer:
+        conn.execute("BEGIN")
+    try:
+        conn.execute("DELETE FROM stats_counters")
+        for scope, (table, column) in STATS_SCOPES.items():
+            conn.execute(f"""
+                INSERT INTO stats_counters (scope, key, n)
+                SELECT ?, COALESCE({column}, ''), COUNT(*) FROM {table} GROUP BY COALESCE({column}, '')
+            """, (scope,))
+        if not outer:
+            conn.commit()
+    except sqlite3.Error:
+        if not outer:
+            conn.rollback()
+        raise
+    return conn.execute("SELECT COUNT(*) FROM stats_counters").fetchone()[0]
+
+
+def read_stats_counters(conn):
+    """{scope: {key: n}} จาก stats_counters (key '' → None เหมือน GROUP BY) — None ถ้ายังไม่มีตาราง"""
+    try:
+        rows = conn.execute("SELECT scope, key, n FROM stats_counters WHERE n != 0").fetchall()
+    except sqlite3.OperationalError:
+        return None
+    counters = {scope: {} for scope in STATS_SCOPES}
+    for scope, key, n in rows:
+        counters.setdefault(scope, {})[key if key != '' else None] = n
+    return counters
+
+
+# ==================== Place summary ====================
+
+def rebuild_place_summary(conn):
+    """สร้าง place_summary ใหม่จาก places + emails (ครั้งแรกหลัง migration 0013 / ซ่อม) คืนจำนวนแถว"""
+    outer = conn.in_transaction  # เรียกจาก apply_migrations → อยู่ใน transaction ของ migration
+    if not outer:
+        conn.execute("BEGIN")
+    try:
+        conn.execute("DELETE FROM place_summary")
+        conn.execute("""
+            INSERT INTO place_summary (
+                place_id, name, category, phone, website, website_kind, status,
+                has_email, email_count, emails, sources, updated_at
+            )
+            SELECT
+                p.place_id, p.name, p.category, p.phone, p.website, p.website_kind, p.status,
+                e.place_id IS NOT NULL, COALESCE(e.email_count, 0), e.emails, e.sources, p.updated_at
+            FROM places p
+            LEFT JOIN (
+                SELECT place_id, COUNT(*) AS email_count, GROUP_CONCAT(email) AS emails,
+                       GROUP_CONCAT(DISTINCT source) AS sources
+                FROM emails
+                GROUP BY place_id
+            ) e ON e.place_id = p.place_id
+        """)
+        if not outer:
+            conn.commit()
+    except sqlite3.Error:
+        if not outer:
+            conn.rollback()
+        raise
+    return conn.execute("SELECT COUNT(*) FROM place_summary").fetchone()[0]
+
+
+# ==================== Email validity ====================
+
+def purge_invalid_emails(conn):
+    """ลบอีเมลรูปแบบไม่ถูกต้อง (emails.is_valid = 0 — migration 0016) ด้วย DELETE เดียว คืนจำนวนที่ลบ"""
+    with conn:
+        return conn.execute("DELETE FROM emails WHERE is_valid = 0").rowcount
+
+
+# ==================== Search (FTS5) ====================
+
+# trigram tokenizer จับคู่ได้เฉพาะคำที่ยาว ≥ 3 ตัวอักษร — สั้นกว่านั้นให้ผู้เรียกใช้ LIKE แทน
+FTS_MIN_TERM = 3
+
+# place ที่ชื่อ/category/ที่อยู่/เว็บไซต์ หรืออีเมลใดอีเมลหนึ่งตรงคำค้น → (place_id, score) score น้อย = ตรงกว่า (bm25)
+PLACE_SEARCH_HITS_SQL = """
+    SELECT place_id, MIN(score) AS score FROM (
+        SELECT p.place_id, f.rank AS score
+        FROM places_fts f JOIN places p ON p.rowid = f.rowid
+        WHERE places_fts MATCH ?
+        UNION ALL
+        SELECT e.place_id, f.rank
+        FROM emails_fts f JOIN emails e ON e.id = f.rowid
+        WHERE emails_fts MATCH ?
+    ) GROUP BY place_id
+"""
+
+# อีเมลที่ตัวเองหรือ place ของมันตรงคำค้น → (id, score)
+EMAIL_SEARCH_HITS_SQL = """
+    SELECT id, MIN(score) AS score FROM (
+        SELECT e.id, f.rank AS score
+        FROM places_fts f
+        JOIN places p ON p.rowid = f.rowid
+        JOIN emails e ON e.place_id = p.place_id
+        WHERE places_fts MATCH ?
+        UNION ALL
+        SELECT f.rowid, f.rank
+        FROM emails_fts f
+        WHERE emails_fts MATCH ?
+    ) GROUP BY id
+"""
+
+
+def fts_match_expr(text):
+    """
+    ข้อความค้นหา → FTS5 MATCH expression (ทุกคำต้องตรง, แต่ละคำเป็น phrase ในเครื่องหมายคำพูด)
+    คืน None ถ้าว่างหรือมีคำที่สั้นกว่า FTS_MIN_TERM
+    """
+    terms = (text or '').split()
+    if not terms or any(len(term) < FTS_MIN_TERM for term in terms):
+        return None
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def rebuild_search_index(conn):
+    """สร้าง places_fts / emails_fts ใหม่จากตารางจริง (ซ่อมหลังเขียนข้าม trigger เช่น INSERT OR REPLACE)"""
+    conn.execute("INSERT INTO places_fts(places_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO emails_fts(emails_fts) VALUES ('rebuild')")
+    conn.commit()
+
+
+POST_MIGRATION_HOOKS = {
+    '0007_place_raw_data.sql': compress_pending_raw_data,
+    '0011_places_website_kind.sql': backfill_website_kind,
+    '0012_stats_counters.sql': rebuild_stats_counters,
+    '0013_place_summary.sql': rebuild_place_summary,
+}
@@ -0,0 +1,656 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pipeline Jobs 🧵
+รัน pipeline (Stage 1–4 + กรองอีเมล) เบื้องหลังใน supervisor process แยกจาก Streamlit
+- GUI แค่ submit job ลงตาราง pipeline_jobs แล้วอ่านสถานะ/log — ปิดหรือ refresh หน้าเว็บแล้วงานยังรันต่อ
+- supervisor รันงานในคิวต่อกันทีละงาน (QUEUED → RUNNING → DONE/FAILED/CANCELLED)
+- แต่ละ stage บันทึก pid, เวลา, returncode และ log path ในตาราง pipeline_job_stages
+- progress ของ stage (JSON event, ดู progress_events.py) อยู่ข้าง log: <stage>.progress.jsonl
+- ไม่มีงานค้างนาน IDLE_EXIT_SECONDS → supervisor ปิดตัวเอง (submit ครั้งถัดไปเปิดใหม่ให้)
+รันจาก root: python pipeline_jobs.py --supervise
+"""
+import sys
+import os
+import json
+import time
+import signal
+import argparse
+import subprocess
+
+import pipeline_db
+from progress_events import PROGRESS_ENV
+
+if sys.platform == 'win32':
+    import msvcrt
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except Exception:
+        pass
+else:
+    import fcntl
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+JOBS_DIR = os.path.join(PROJECT_ROOT, 'output', 'jobs')
+SUPERVISOR_PID_FILE = os.path.join(JOBS_DIR, 'supervisor.pid')
+SUPERVISOR_LOCK_FILE = os.path.join(JOBS_DIR, 'supervisor.lock')
+SUPERVISOR_LOG_FILE = os.path.join(JOBS_DIR, 'supervisor.log')
+RESULTS_CSV = 'output/results.csv'  # relative กับ project root (= /work ใน container)
+ARCHIVE_FILE = 'archive.db'
+
+IDLE_EXIT_SECONDS = 60
+POLL_SECONDS = 0.5
+STOP_TIMEOUT_SECONDS = 30  # รอ stage หยุดเอง (Stage 1 ต้องปิด container) ก่อน kill ทั้ง group
+
+ACTIVE_STATUSES = ('QUEUED', 'RUNNING', 'CANCELLING')
+
+STAGE_LABELS = {
+    'stage1': 'Stage 1: Google Maps Scraper',
+    'ingest': 'Stage 1: CSV → SQLite',
+    'stage2': 'Stage 2: Website Email Finder',
+    'stage3': 'Stage 3: Facebook Scraper',
+    'stage4': 'Stage 4: Cross-Reference Scraper',
+    'purge': 'กรองอีเมลไม่ถูกต้องทิ้ง',
+}
+
+DEFAULT_OPTIONS = {
+    'depth': 2,
+    'shards': 1,
+    'adaptive': False,
+    'min_new': 10,
+    'geo_tiling': False,
+    'tile_km': 2.0,
+    'province': '',
+    'amphoe': '',
+    'overlap_stage2': True,
+    'upsert': True,
+    'archive': False,
+    'work_dir': None,  # path ของ project ที่ Docker daemon เห็น (GUI ใน container)
+}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def pid_alive(pid):
+    """process ยังอยู่หรือไม่"""
+    if not pid:
+        return False
+    if sys.platform == 'win32':
+        result = subprocess.run(
+            ['tasklist', '/FI', f'PID eq {pid}', '/NH'], capture_output=True, text=True
+        )
+        return str(pid) in result.stdout
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def process_group_kwargs():
+    """Popen kwargs ให้ stage อยู่ใน process group ของตัวเอง — หยุดได้ทั้งกลุ่ม (รวม docker CLI ที่ stage เปิด)"""
+    if sys.platform == 'win32':
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {'start_new_session': True}
+
+
+def terminate_group(process):
+    """ส่งสัญญาณหยุดให้ทั้ง process group ของ stage"""
+    try:
+        if sys.platform == 'win32':
+            process.send_signal(signal.CTRL_BREAK_EVENT)
+        else:
+            os.killpg(process.pid, signal.SIGTERM)
+    except OSError:
+        pass  # จบไปแล้ว
+
+
+def kill_group(process):
+    """kill ทั้ง process group (stage ไม่หยุดเองภายใน STOP_TIMEOUT_SECONDS)"""
+    try:
+        if sys.platform == 'win32':
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)], capture_output=True)
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def lock_exclusive(f):
+    """
+    lock ไฟล์ที่เปิดอยู่แบบไม่รอ คืน True ถ้าได้ — OS ปล่อย lock เองเมื่อ process จบ/ตาย
+    (ไม่มี lock ค้างแบบ pid file) ใช้กันไม่ให้มี supervisor 2 ตัวรันพร้อมกัน
+    """
+    try:
+        if sys.platform == 'win32':
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def progress_path(log_path):
+    """ไฟล์ progress event ของ stage ที่ log อยู่ที่ log_path"""
+    return os.path.splitext(log_path)[0] + '.progress.jsonl'
+
+
+def supervisor_pid():
+    """pid ของ supervisor ที่ยังทำงานอยู่ (None = ไม่มี)"""
+    try:
+        with open(SUPERVISOR_PID_FILE, encoding='utf-8') as f:
+            pid = int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return None
+    return pid if pid_alive(pid) else None
+
+
+def ensure_supervisor(db_path):
+    """เปิด supervisor เบื้องหลัง (ไม่ผูกกับ process ของ Streamlit) ถ้ายังไม่มี คืน pid"""
+    pid = supervisor_pid()
+    if pid:
+        return pid
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    kwargs = {}
+    if sys.platform == 'win32':
+        kwargs['creationflags'] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs['start_new_session'] = True
+    with open(SUPERVISOR_LOG_FILE, 'a', encoding='utf-8') as log_file:
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(PROJECT_ROOT, 'pipeline_jobs.py'), '--supervise', '--db', os.path.abspath(db_path)],
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            cwd=PROJECT_ROOT,
+            env=dict(os.environ, PYTHONUNBUFFERED='1'),
+            **kwargs,
+        )
+    return process.pid
+
+
+def submit_job(db_path, query, options):
+    """เพิ่ม job เข้าคิว แล้วให้แน่ใจว่ามี supervisor รันอยู่ คืน job id"""
+    options = {**DEFAULT_OPTIONS, **options}
+    conn = pipeline_db.connect(db_path)
+    try:
+        with conn:
+            job_id = conn.execute(
+                "INSERT INTO pipeline_jobs (query, options) VALUES (?, ?)",
+                (query, json.dumps(options, ensure_ascii=False)),
+            ).lastrowid
+            conn.execute(
+                "UPDATE pipeline_jobs SET log_dir = ? WHERE id = ?",
+                (os.path.join(JOBS_DIR, str(job_id)), job_id),
+            )
+    finally:
+        conn.close()
+    ensure_supervisor(db_path)
+    return job_id
+
+
+def cancel_job(conn, job_id):
+    """ยกเลิก job: ในคิว → CANCELLED ทันที, กำลังรัน → CANCELLING (supervisor หยุด process ให้)"""
+    with conn:
+        conn.execute(
+            "UPDATE pipeline_jobs SET status = 'CANCELLED', finished_at = strftime('%s','now') "
+            "WHERE id = ? AND status = 'QUEUED'",
+            (job_id,),
+        )
+        conn.execute("UPDATE pipeline_jobs SET status = 'CANCELLING' WHERE id = ? AND status = 'RUNNING'", (job_id,))
+
+
+def list_jobs(conn, limit=10):
+    """job ล่าสุด (ใหม่ก่อน) เป็น list ของ dict"""
+    cursor = conn.execute(
+        """
+        SELECT id, status, query, current_stage, supervisor_pid, log_dir, error,
+               submitted_at, started_at, finished_at
+        FROM pipeline_jobs ORDER BY id DESC LIMIT ?
+        """,
+        (limit,),
+    )
+    columns = [d[0] for d in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def job_stages(conn, job_id):
+    """stage ของ job ตามลำดับของ pipeline"""
+    cursor = conn.execute(
+        """
+        SELECT stage, status, pid, log_path, returncode, started_at, finished_at
+        FROM pipeline_job_stages WHERE job_id = ?
+        """,
+        (job_id,),
+    )
+    columns = [d[0] for d in cursor.description]
+    stages = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    order = list(STAGE_LABELS)
+    return sorted(stages, key=lambda s: order.index(s['stage']) if s['stage'] in order else len(order))
+
+
+class PipelineJob:
+    """รัน 1 job: Stage 1 → (CSV → SQLite) → Stage 2 → 3 → 4 → กรองอีเมล ตาม options"""
+
+    def __init__(self, conn, db_path, job_id, query, options, log_dir):
+        self.conn = conn
+        self.db_path = db_path
+        self.job_id = job_id
+        self.query = query
+        self.options = {**DEFAULT_OPTIONS, **options}
+        self.log_dir = log_dir
+        self.background = {}  # stage → Popen ที่รันคู่กับ Stage 1 (overlap)
+        self.running = {}  # stage → Popen ที่ยังไม่จบ (ไว้หยุดตอนยกเลิก)
+
+        # Stats
+        self.stats = {'stages': 0, 'failed_stages': []}
+
+    # ---------- job/stage rows ----------
+
+    def _set_job(self, **fields):
+        assignments = ', '.join(f"{key} = ?" for key in fields)
+        with self.conn:
+            self.conn.execute(f"UPDATE pipeline_jobs SET {assignments} WHERE id = ?", (*fields.values(), self.job_id))
+
+    def _cancel_requested(self):
+        row = self.conn.execute("SELECT status FROM pipeline_jobs WHERE id = ?", (self.job_id,)).fetchone()
+        return row is not None and row[0] == 'CANCELLING'
+
+    def _log_path(self, stage):
+        return os.path.join(self.log_dir, f"{stage}.log")
+
+    def _start(self, stage, cmd, append=False):
+        """เริ่ม process ของ stage (log → <log_dir>/<stage>.log) และบันทึกแถว RUNNING"""
+        log_path = self._log_path(stage)
+        if not append and os.path.exists(progress_path(log_path)):
+            os.remove(progress_path(log_path))
+        with open(log_path, 'a' if append else 'w', encoding='utf-8') as log_file:
+            process = subprocess.Popen(
+                cmd,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                stdin=subprocess.DEVNULL,
+                cwd=PROJECT_ROOT,
+                # PYTHONUNBUFFERED ให้ log ออกทันที ไม่ค้างใน buffer
+                env=dict(os.environ, PYTHONUNBUFFERED='1', **{PROGRESS_ENV: progress_path(log_path)}),
+                **process_group_kwargs(),
+            )
+        with self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO pipeline_job_stages (job_id, stage, status, pid, log_path, started_at)
+                VALUES (?, ?, 'RUNNING', ?, ?, strftime('%s','now'))
+                ON CONFLICT(job_id, stage) DO UPDATE SET
+                    status = 'RUNNING', pid = excluded.pid, returncode = NULL, finished_at = NULL
+                """,
+                (self.job_id, stage, process.pid, log_path),
+            )
+        self.running[stage] = process
+        return process
+
+    def _finish_stage(self, stage, returncode, status=None):
+        status = status or ('DONE' if returncode == 0 else 'FAILED')
+        with self.conn:
+            self.conn.execute(
+                """
+                UPDATE pipeline_job_stages SET status = ?, returncode = ?, finished_at = strftime('%s','now')
+                WHERE job_id = ? AND stage = ?
+                """,
+                (status, returncode, self.job_id, stage),
+            )
+        self.stats['stages'] += 1
+        if status == 'FAILED':
+            self.stats['failed_stages'].append(stage)
+
+    def _wait(self, stage, process):
+        """รอ process จบ (เช็คคำสั่งยกเลิกระหว่างรอ) คืน returncode"""
+        while process.poll() is None:
+            if self._cancel_requested():
+                raise JobCancelled()
+            time.sleep(POLL_SECONDS)
+        self.running.pop(stage, None)
+        return process.returncode
+
+    def _run(self, stage, cmds):
+        """รันคำสั่งของ stage ต่อกันใน log เดียว (หยุดที่คำสั่งแรกที่ล้มเหลว) คืน returncode"""
+        self._set_job(current_stage=stage)
+        returncode = 0
+        for i, cmd in enumerate(cmds):
+            process = self._start(stage, cmd, append=i > 0)
+            returncode = self._wait(stage, process)
+            if returncode != 0:
+                break
+        self._finish_stage(stage, returncode)
+        return returncode
+
+    def _await_background(self, stage):
+        """รอ process ที่เริ่มไว้ตั้งแต่ Stage 1 (overlap) จบ คืน returncode"""
+        self._set_job(current_stage=stage)
+        returncode = self._wait(stage, self.background.pop(stage))
+        self._finish_stage(stage, returncode)
+        return returncode
+
+    def _stop_running(self):
+        """หยุดทุก stage ที่ยังไม่ถูกรอ (รวม ingest/Stage 2 ที่รันคู่กับ Stage 1) แล้วปิดแถวของ stage"""
+        processes = {**self.background, **self.running}  # stage → Popen (stage ละแถว)
+        stopped = set()
+        for stage, process in processes.items():
+            if process.poll() is None:
+                terminate_group(process)
+                stopped.add(stage)
+        for stage, process in processes.items():
+            try:
+                process.wait(timeout=STOP_TIMEOUT_SECONDS)
+            except subprocess.TimeoutExpired:
+                kill_group(process)
+                process.wait()
+            # stage ที่จบเองก่อนถูกหยุด (ยังไม่มีใครรอ) ได้สถานะตาม returncode
+            self._finish_stage(stage, process.returncode, status='CANCELLED' if stage in stopped else None)
+        self.running.clear()
+        self.background.clear()
+
+    # ---------- stages ----------
+
+    def _db_args(self):
+        return ['--db', self.db_path]
+
+    def _archive_args(self):
+        return ['--archive', os.path.join(PROJECT_ROOT, ARCHIVE_FILE)] if self.options['archive'] else []
+
+    def _ingest_args(self):
+        return ['--upsert'] if self.options['upsert'] else []
+
+    def _stage1(self):
+        """Stage 1 (+ เริ่ม importer/Stage 2 คู่กันถ้า overlap) คืน True ถ้าสำเร็จ"""
+        o = self.options
+        python = sys.executable
+        work_dir = o['work_dir'] or PROJECT_ROOT
+        query_lines = [q.strip() for q in self.query.splitlines() if q.strip()]
+        # หลาย shard ต้องมีหลาย query (shard ไม่เกินจำนวน query)
+        shard_count = o['shards'] if o['geo_tiling'] else max(1, min(o['shards'], len(query_lines)))
+        # adaptive/geo tiling รันหลายรอบ (1 query หรือ 1 tile ต่อ shard) และนำเข้าเองเหมือนโหมด shard
+        self.sharded = shard_count > 1 or o['adaptive'] or o['geo_tiling']
+
+        queries_path = os.path.join(self.log_dir, 'queries.txt')
+        with open(queries_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(query_lines))
+        results_path = os.path.join(PROJECT_ROOT, RESULTS_CSV)
+        os.makedirs(os.path.dirname(results_path), exist_ok=True)
+        if not os.path.exists(results_path):
+            open(results_path, 'w').close()
+
+        self.stage1_done = os.path.join(self.log_dir, 'stage1.done')
+        self.ingest_done = os.path.join(self.log_dir, 'ingest.done')
+        if o['overlap_stage2']:
+            # Importer tail results.csv + Stage 2 รอ place ใหม่ ไปพร้อมกับ Docker
+            if not self.sharded:
+                # โหมด shard นำเข้าเองทีละ shard ที่จบ — ไม่ต้อง tail results.csv
+                open(results_path, 'w').close()  # ไม่ให้ importer อ่านผลรอบก่อน
+                self.background['ingest'] = self._start('ingest', [
+                    python, 'scripts/csv_to_sqlite.py', results_path, self.db_path,
+                    '--follow', '--stop-file', self.stage1_done,
+                ] + self._ingest_args())
+            self.background['stage2'] = self._start('stage2', [
+                python, 'stage2_email_finder.py', *self._db_args(), '--verbose',
+                '--follow-stop-file', self.ingest_done,
+            ] + self._archive_args())
+
+        if o['geo_tiling']:
+            # 1 รอบ coverage ต่อ query — tile ที่อิ่มตัวแล้วถูกข้าม
+            cmds = [
+                [
+                    python, 'coverage_planner.py', *self._db_args(),
+                    '--query', query,
+                    '--province', o['province'],
+                    '--tile-km', str(o['tile_km']),
+                    '--shards', str(shard_count),
+                    '--depth', str(o['depth']),
+                    '--work-dir', work_dir,
+                ] + (['--amphoe', o['amphoe']] if o['amphoe'] else []) + self._ingest_args()
+                for query in query_lines
+            ]
+        else:
+            # warm container + cache volume (ดู stage1_runner.py) — 1 shard เขียน results.csv ให้ importer อ่าน
+            cmd = [
+                python, 'stage1_runner.py', *self._db_args(),
+                '--queries', queries_path,
+                '--shards', str(shard_count),
+                '--depth', str(o['depth']),
+                '--work-dir', work_dir,
+            ] + (self._ingest_args() if self.sharded else ['--results-file', RESULTS_CSV, '--no-import'])
+            if o['adaptive']:
+                cmd += ['--adaptive', '--min-new', str(int(o['min_new']))]
+            cmds = [cmd]
+        returncode = self._run('stage1', cmds)
+
+        if o['overlap_stage2']:
+            # Stage 1 จบ (สำเร็จหรือไม่) → importer อ่านส่วนที่เหลือแล้วหยุด
+            open(self.stage1_done, 'w').close()
+            if self.sharded or returncode != 0:
+                open(self.ingest_done, 'w').close()  # ทุก shard นำเข้าแล้ว / Stage 2 ทำที่นำเข้าแล้วให้จบ
+        return returncode == 0
+
+    def _ingest(self):
+        if self.options['overlap_stage2']:
+            returncode = self._await_background('ingest')
+            open(self.ingest_done, 'w').close()  # Stage 2 ทำ NEW ที่เหลือให้จบแล้วหยุด
+        else:
+            returncode = self._run('ingest', [[
+                sys.executable, 'scripts/csv_to_sqlite.py',
+                os.path.join(PROJECT_ROOT, RESULTS_CSV), self.db_path,
+            ] + self._ingest_args()])
+        return returncode == 0
+
+    def _stage2(self):
+        if 'stage2' in self.background:
+            # เริ่มไปแล้วตั้งแต่ Stage 1 — รอให้ทำ place ที่เหลือจนจบ
+            return self._await_background('stage2') == 0
+        return self._run('stage2', [
+            [sys.executable, 'stage2_email_finder.py', *self._db_args(), '--verbose'] + self._archive_args()
+        ]) == 0
+
+    def _purge(self):
+        self._set_job(current_stage='purge')
+        log_path = self._log_path('purge')
+        with self.conn:
+            self.conn.execute(
+                """
+                INSERT OR IGNORE INTO pipeline_job_stages (job_id, stage, status, log_path, started_at)
+                VALUES (?, 'purge', 'RUNNING', ?, strftime('%s','now'))
+                """,
+                (self.job_id, log_path),
+            )
+        deleted = pipeline_db.purge_invalid_emails(self.conn)
+        with open(log_path, 'w', encoding='utf-8') as f:
+            f.write(f"[OK] Deleted {deleted} invalid emails\n")
+        self._finish_stage('purge', 0)
+        return deleted
+
+    def run(self):
+        """รันทุก stage คืนสถานะสุดท้ายของ job (DONE / FAILED / CANCELLED)"""
+        os.makedirs(self.log_dir, exist_ok=True)
+        try:
+            if not self._stage1():
+                self._drain_background()
+                return self._fail('stage1')
+            if not self.sharded and not self._ingest():
+                self._drain_background()
+                return self._fail('ingest')
+            if not self._stage2():
+                return self._fail('stage2')
+            if self._run('stage3', [
+                [sys.executable, 'facebook_about_scraper.py', *self._db_args(), '--verbose'] + self._archive_args()
+            ]) != 0:
+                return self._fail('stage3')
+            # Stage 4 ล้มเหลวไม่หยุด pipeline (อีเมลจาก Stage 1–3 ยังใช้ได้)
+            self._run('stage4', [
+                [sys.executable, 'stage4_crossref_scraper.py', *self._db_args(), '--verbose'] + self._archive_args()
+            ])
+            self._purge()
+        except JobCancelled:
+            self._stop_running()
+            self._set_job(status='CANCELLED', finished_at=int(time.time()))
+            return 'CANCELLED'
+        except Exception as e:
+            self._stop_running()
+            self._set_job(status='FAILED', error=str(e), finished_at=int(time.time()))
+            return 'FAILED'
+        self._set_job(status='DONE', current_stage=None, finished_at=int(time.time()))
+        return 'DONE'
+
+    def _drain_background(self):
+        """stage ที่รันคู่กันอยู่ทำส่วนที่นำเข้าแล้วให้จบ (marker ถูกสร้างแล้ว) ก่อนปิด job"""
+        for stage in list(self.background):
+            self._await_background(stage)
+
+    def _fail(self, stage):
+        self._set_job(status='FAILED', error=f"{STAGE_LABELS[stage]} ล้มเหลว", finished_at=int(time.time()))
+        return 'FAILED'
+
+
+class JobSupervisor:
+    """ดึง job จากคิวมารันทีละงานจนคิวว่างเกิน idle_exit วินาที"""
+
+    def __init__(self, db_path, idle_exit=IDLE_EXIT_SECONDS):
+        self.db_path = os.path.abspath(db_path)
+        self.idle_exit = idle_exit
+        self.conn = pipeline_db.connect(self.db_path)
+        self.lock_file = None
+
+        # Stats
+        self.stats = {'jobs': 0, 'done': 0, 'failed': 0, 'cancelled': 0}
+
+    def acquire(self):
+        """
+        จอง supervisor.lock (atomic) แล้วเขียน pid file — มี supervisor อื่นถือ lock อยู่ → False
+        submit พร้อมกันหลาย session อาจเปิด supervisor หลายตัว แต่ได้ lock ตัวเดียว ตัวอื่นจบทันที
+        """
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        lock_file = open(SUPERVISOR_LOCK_FILE, 'a+')
+        if not lock_exclusive(lock_file):
+            lock_file.close()
+            return False
+        self.lock_file = lock_file
+        with open(SUPERVISOR_PID_FILE, 'w', encoding='utf-8') as f:
+            f.write(str(os.getpid()))
+        return True
+
+    def release(self):
+        if self.lock_file is None:
+            return
+        if supervisor_pid() == os.getpid():
+            os.remove(SUPERVISOR_PID_FILE)
+        self.lock_file.close()  # ปล่อย lock หลังลบ pid file
+        self.lock_file = None
+
+    def recover(self):
+        """job ที่ค้าง RUNNING แต่ supervisor ของมันไม่อยู่แล้ว (เครื่องดับ/ถูก kill) → FAILED"""
+        rows = self.conn.execute(
+            "SELECT id, supervisor_pid FROM pipeline_jobs WHERE status IN ('RUNNING', 'CANCELLING')"
+        ).fetchall()
+        for job_id, pid in rows:
+            if pid != os.getpid() and not pid_alive(pid):
+                with self.conn:
+                    self.conn.execute(
+                        """
+                        UPDATE pipeline_jobs SET status = 'FAILED', error = 'supervisor หยุดกลางคัน',
+                            finished_at = strftime('%s','now')
+                        WHERE id = ?
+                        """,
+                        (job_id,),
+                    )
+                    self.conn.execute(
+                        "UPDATE pipeline_job_stages SET status = 'FAILED' WHERE job_id = ? AND status = 'RUNNING'",
+                        (job_id,),
+                    )
+                print(f"[WARNING] Job #{job_id}: supervisor (pid {pid}) หายไป → FAILED")
+
+    def claim_next(self):
+        """job ในคิวที่เก่าสุด → RUNNING (None = คิวว่าง)"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT id, query, options, log_dir FROM pipeline_jobs WHERE status = 'QUEUED' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row:
+                self.conn.execute(
+                    """
+                    UPDATE pipeline_jobs SET status = 'RUNNING', supervisor_pid = ?, started_at = strftime('%s','now')
+                    WHERE id = ?
+                    """,
+                    (os.getpid(), row[0]),
+                )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return row
+
+    def run(self):
+        if not self.acquire():
+            print(f"[INFO] Supervisor already running (pid {supervisor_pid()})")
+            return
+        print(f"[INFO] Supervisor started (pid {os.getpid()})")
+        try:
+            self.recover()
+            idle_since = time.time()
+            while True:
+                row = self.claim_next()
+                if row is None:
+                    if time.time() - idle_since > self.idle_exit:
+                        break
+                    time.sleep(1)
+                    continue
+                job_id, query, options, log_dir = row
+                print(f"[INFO] Job #{job_id} started: {query!r}")
+                status = PipelineJob(self.conn, self.db_path, job_id, query, json.loads(options), log_dir).run()
+                print(f"[{'OK' if status == 'DONE' else 'WARNING'}] Job #{job_id} {status}")
+                self.stats['jobs'] += 1
+                self.stats[status.lower()] += 1
+                idle_since = time.time()
+        finally:
+            self.release()
+            self.conn.close()
+        print(f"[INFO] Supervisor idle — exit (jobs: {self.stats['jobs']}, done: {self.stats['done']}, "
+              f"failed: {self.stats['failed']}, cancelled: {self.stats['cancelled']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pipeline job supervisor (รัน pipeline เบื้องหลัง)')
+    parser.add_argument('--db', default='pipeline.db', help='SQLite database path')
+    parser.add_argument('--supervise', action='store_true', help='รัน supervisor: ทำงานในคิวจนว่าง')
+    parser.add_argument('--submit', metavar='QUERIES_FILE', help='ส่ง job จากไฟล์ queries (1 บรรทัดต่อ query)')
+    parser.add_argument('--cancel', type=int, metavar='JOB_ID', help='ยกเลิก job')
+    parser.add_argument('--list', action='store_true', help='แสดง job ล่าสุด')
+    parser.add_argument('--idle-exit', type=int, default=IDLE_EXIT_SECONDS, help='ปิด supervisor เมื่อคิวว่างเกิน N วินาที')
+    args = parser.parse_args()
+
+    if args.supervise:
+        JobSupervisor(args.db, idle_exit=args.idle_exit).run()
+        return
+    if args.submit:
+        with open(args.submit, encoding='utf-8') as f:
+            job_id = submit_job(args.db, f.read(), {})
+        print(f"[OK] Job #{job_id} queued")
+        return
+
+    conn = pipeline_db.connect(args.db)
+    try:
+        if args.cancel:
+            cancel_job(conn, args.cancel)
+            print(f"[OK] Job #{args.cancel} cancel requested")
+        for job in list_jobs(conn):
+            stage = STAGE_LABELS.get(job['current_stage'], '-')
+            print(f"#{job['id']:<4} {job['status']:<10} {stage:<34} {job['query'].splitlines()[0] if job['query'] else ''}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Progress Events 📈
+ช่องทาง progress แบบอ่านด้วยเครื่องระหว่าง stage process กับ GUI
+- stage เขียน event JSON 1 บรรทัดต่อครั้ง (JSON Lines) ต่อท้ายไฟล์ใน env PIPELINE_PROGRESS_FILE
+  (pipeline_jobs.py ตั้งให้เป็น output/jobs/<job id>/<stage>.progress.jsonl)
+- ส่งไม่เกิน 1 event ต่อ MIN_INTERVAL วินาที (event สุดท้าย done=true ส่งเสมอ)
+- ไม่มี env → ไม่เขียนอะไร (รัน stage เองจาก command line ได้เหมือนเดิม)
+- GUI อ่านแค่บรรทัดสุดท้ายของไฟล์ (read_latest) ไม่ต้อง parse log
+
+event: {"stage", "ts", "elapsed", "total", "processed", "succeeded", "failed", "emails", "rate", "eta", "done"}
+  rate = รายการต่อนาทีช่วง RATE_WINDOW วินาทีล่าสุด, eta = วินาทีที่เหลือ (None ถ้าไม่รู้ total)
+"""
+import os
+import json
+import time
+from collections import deque
+
+PROGRESS_ENV = 'PIPELINE_PROGRESS_FILE'
+MIN_INTERVAL = 1.0
+RATE_WINDOW = 60.0
+MIN_RATE_SPAN = 10.0  # sample ช่วงสั้นกว่านี้ → ใช้ค่าเฉลี่ยตั้งแต่เริ่ม (กัน rate กระโดด)
+TAIL_BYTES = 4096
+
+
+class ProgressReporter:
+    """เขียน progress event ของ stage (no-op ถ้าไม่มี path)"""
+
+    def __init__(self, stage, path=None, min_interval=MIN_INTERVAL):
+        self.stage = stage
+        self.path = path or os.environ.get(PROGRESS_ENV)
+        self.min_interval = min_interval
+        self.started = time.time()
+        self.last_emit = 0.0
+        self.samples = deque()  # (ts, processed) ภายใน RATE_WINDOW — คำนวณ rate ล่าสุด
+
+    def _rate(self, now, processed):
+        """รายการต่อนาทีจาก sample ช่วง RATE_WINDOW วินาทีล่าสุด"""
+        self.samples.append((now, processed))
+        while len(self.samples) > 2 and now - self.samples[0][0] > RATE_WINDOW:
+            self.samples.popleft()
+        first_ts, first_processed = self.samples[0]
+        if now - first_ts < MIN_RATE_SPAN:
+            first_ts, first_processed = self.started, 0
+        if now - first_ts < 1e-6:
+            return 0.0
+        return (processed - first_processed) / (now - first_ts) * 60
+
+    def report(self, processed, succeeded=0, failed=0, emails=0, total=None, done=False):
+        """ส่ง event (ข้ามถ้าเพิ่งส่งไปไม่ถึง min_interval วินาที ยกเว้น done) คืน True ถ้าเขียนแล้ว"""
+        if not self.path:
+            return False
+        now = time.time()
+        if not done and now - self.last_emit < self.min_interval:
+            return False
+        self.last_emit = now
+
+        rate = self._rate(now, processed)
+        eta = None
+        if total is not None and rate > 0:
+            eta = max(total - processed, 0) / rate * 60
+        event = {
+            'stage': self.stage,
+            'ts': round(now, 3),
+            'elapsed': round(now - self.started, 1),
+            'total': total,
+            'processed': processed,
+            'succeeded': succeeded,
+            'failed': failed,
+            'emails': emails,
+            'rate': round(rate, 2),
+            'eta': round(eta) if eta is not None else None,
+            'done': done,
+        }
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(event) + '\n')
+        except OSError:
+            return False  # progress ไม่ใช่งานหลัก — เขียนไม่ได้ก็ทำงานต่อ
+        return True
+
+    def finish(self, processed, succeeded=0, failed=0, emails=0, total=None):
+        """event สุดท้ายของ stage (ส่งเสมอ)"""
+        return self.report(processed, succeeded, failed, emails, total, done=True)
+
+
+def read_latest(path):
+    """event ล่าสุดในไฟล์ (None ถ้ายังไม่มี) — อ่านแค่ TAIL_BYTES ท้ายไฟล์"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(size - TAIL_BYTES, 0))
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    # บรรทัดท้ายอาจยังเขียนไม่ครบ → ถอยหาบรรทัดที่ parse ได้
+    for line in reversed(lines):
+        try:
+            return json.loads(line)
+        except ValueError:
+            continue
+    return None
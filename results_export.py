@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Results Export 📦
+เขียนผล query ลงไฟล์ทีละชุดจาก cursor (ไม่โหลดทั้งตารางเป็น DataFrame)
+- csv: UTF-8 ธรรมดา
+- excel_csv: UTF-8 with BOM + CRLF — เปิดใน Excel แล้วภาษาไทยไม่เพี้ยน
+- parquet: ต้องมี pyarrow (มากับ streamlit)
+"""
+import csv
+import os
+import sqlite3
+import tempfile
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+# format → (ชื่อที่แสดง, นามสกุลไฟล์, mime)
+EXPORT_FORMATS = {
+    'excel_csv': ('CSV (Excel)', '.csv', 'text/csv'),
+    'csv': ('CSV', '.csv', 'text/csv'),
+    'parquet': ('Parquet', '.parquet', 'application/vnd.apache.parquet'),
+}
+
+CHUNK_SIZE = 5000
+
+
+def available_formats():
+    """format ที่ใช้ได้ในเครื่องนี้ (parquet ต้องมี pyarrow)"""
+    return [fmt for fmt in EXPORT_FORMATS if fmt != 'parquet' or PARQUET_AVAILABLE]
+
+
+def connect_readonly(db_path):
+    """connection อ่านอย่างเดียวสำหรับ export — ไม่แย่ง connection ที่ GUI ใช้ร่วมกัน"""
+    return sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+
+
+def _write_csv(cursor, columns, path, excel, chunk_size):
+    rows = 0
+    encoding = 'utf-8-sig' if excel else 'utf-8'
+    with open(path, 'w', encoding=encoding, newline='') as f:
+        writer = csv.writer(f, lineterminator='\r\n' if excel else '\n')
+        writer.writerow(columns)
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            writer.writerows(chunk)
+            rows += len(chunk)
+    return rows
+
+
+def _guess_type(values):
+    """ชนิดคอลัมน์จาก chunk แรก — ชนิดปนกัน (เช่น phone เป็นทั้งตัวเลข/ข้อความ) หรือ NULL ทั้งชุด → string"""
+    try:
+        type_ = pa.array(values).type
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.string()
+    return pa.string() if pa.types.is_null(type_) else type_
+
+
+def _to_string_array(values):
+    return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+
+def _to_array(values, type_):
+    """array ตาม schema — คอลัมน์ string ที่มีค่าชนิดอื่นปนแปลงเป็น str, คอลัมน์ชนิดอื่นที่ไม่ตรง → None (ต้องขยาย schema)"""
+    try:
+        return pa.array(values, type=type_)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        if pa.types.is_string(type_):
+            return _to_string_array(values)
+        return None
+
+
+def _widen_to_string(path, schema, names):
+    """
+    chunk หลังมีค่าที่ไม่ตรงชนิดของคอลัมน์ names (เช่น int แล้วเจอ '02-123') — ParquetWriter เปลี่ยน schema กลางไฟล์ไม่ได้
+    จึงอ่านส่วนที่เขียนแล้วกลับมา cast คอลัมน์เหล่านั้นเป็น string แล้วเขียนใหม่ คืน (writer ใหม่, schema ใหม่)
+    """
+    written = pq.read_table(path)
+    schema = pa.schema([pa.field(f.name, pa.string()) if f.name in names else f for f in schema])
+    writer = pq.ParquetWriter(path, schema)
+    writer.write_table(written.cast(schema))
+    return writer, schema
+
+
+def _write_parquet(cursor, columns, path, chunk_size):
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("export Parquet ต้องติดตั้ง pyarrow ก่อน: pip install pyarrow")
+    rows = 0
+    writer = None
+    try:
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            values = list(zip(*chunk))
+            if writer is None:
+                # schema จากชุดแรก
+                schema = pa.schema([pa.field(name, _guess_type(col)) for name, col in zip(columns, values)])
+                writer = pq.ParquetWriter(path, schema)
+            arrays = [_to_array(col, field.type) for col, field in zip(values, schema)]
+            clashes = {field.name for arr, field in zip(arrays, schema) if arr is None}
+            if clashes:
+                writer.close()
+                writer = None
+                writer, schema = _widen_to_string(path, schema, clashes)
+                arrays = [
+                    _to_string_array(col) if field.name in clashes else arr
+                    for col, field, arr in zip(values, schema, arrays)
+                ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            rows += len(chunk)
+        if writer is None:
+            # ไม่มีแถว — ไฟล์ที่มีแต่ชื่อคอลัมน์
+            schema = pa.schema([pa.field(name, pa.string()) for name in columns])
+            pq.write_table(schema.empty_table(), path)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def export_query(conn, sql, params, fmt, path, chunk_size=CHUNK_SIZE):
+    """รัน sql แล้วเขียนผลลง path ตาม fmt ทีละ chunk_size แถว คืนจำนวนแถวที่เขียน"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    cursor = conn.execute(sql, params)
+    columns = [d[0] for d in cursor.description]
+    if fmt == 'parquet':
+        return _write_parquet(cursor, columns, path, chunk_size)
+    return _write_csv(cursor, columns, path, fmt == 'excel_csv', chunk_size)
+
+
+def export_to_temp(db_path, sql, params, fmt, name, export_dir=None):
+    """
+    export ลงไฟล์ชั่วคราว (export_dir หรือ temp ของระบบ) คืน (path, จำนวนแถว)
+    ไฟล์เก่าของ name+fmt เดียวกันถูกเขียนทับ — ไม่สะสมไฟล์
+    """
+    export_dir = export_dir or tempfile.gettempdir()
+    os.makedirs(export_dir, exist_ok=True)
+    path = os.path.join(export_dir, name + EXPORT_FORMATS[fmt][1])
+    tmp_path = path + '.part'
+    conn = connect_readonly(db_path)
+    try:
+        rows = export_query(conn, sql, params, fmt, tmp_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    return path, rows
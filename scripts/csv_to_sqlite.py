@@ -3,123 +3,455 @@
 CSV to SQLite Converter
 แปลงไฟล์ CSV จาก google-maps-scraper (Docker) → SQLite
 ตั้ง status='NEW' สำหรับ Stage 2 Email Finder
-รันจาก root: python scripts/csv_to_sqlite.py <csv_file> <db_file>
+อ่าน CSV แบบ streaming (csv module) แล้ว insert ทีละ batch ด้วย executemany ใน transaction เดียว
+--follow: tail CSV ที่ Stage 1 กำลังเขียน แล้ว insert แถวที่ครบทันที (Stage 2 เริ่มได้ก่อน Docker จบ)
+--upsert: place ที่มีอยู่แล้วแต่ข้อมูลเปลี่ยน (content hash ต่าง) → อัปเดต + status='NEW' ให้ Stage 2 ทำใหม่
+รันจาก root: python scripts/csv_to_sqlite.py <csv_file> <db_file> [--follow --stop-file <path>]
 """
 import sys
 import os
-import sqlite3
-import pandas as pd
+import io
+import csv
 import json
+import time
+import hashlib
+import argparse
 from pathlib import Path
-from datetime import datetime
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-MIGRATIONS_DIR = os.path.join(SCRIPT_DIR, 'migrations')
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
 
+from pipeline_db import connect as pipeline_db_connect, apply_migrations, store_raw_data, decode_raw_data, classify_website
+from progress_events import ProgressReporter
 
-def create_tables(conn):
-    """Run all migrations so places, emails, discovered_urls exist"""
-    if not os.path.isdir(MIGRATIONS_DIR):
-        raise FileNotFoundError(f"Migrations folder not found: {MIGRATIONS_DIR}")
-    for name in sorted(os.listdir(MIGRATIONS_DIR)):
-        if not name.endswith('.sql'):
-            continue
-        path = os.path.join(MIGRATIONS_DIR, name)
-        with open(path, 'r', encoding='utf-8') as f:
-            conn.executescript(f.read())
+BATCH_SIZE = 1000  # rows ต่อ executemany
+DEFER_INDEX_BYTES = 20 * 1024 * 1024  # CSV ใหญ่กว่านี้ → drop index ของ places ก่อน load แล้วสร้างใหม่ทีหลัง
+POLL_INTERVAL = 2.0  # วินาที ระหว่างการเช็คว่า CSV โตขึ้นไหม (--follow)
+
+INSERT_PLACE_SQL = """
+    INSERT OR IGNORE INTO places (
+        place_id, name, website, phone, google_maps_url,
+        address, category, review_count, review_rating,
+        latitude, longitude, website_kind, website_host, content_hash, status
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'NEW')
+"""
+
+# place เดิมที่ hash เปลี่ยน → อัปเดตทุก field + กลับไปเป็น NEW (hash เท่าเดิม = ไม่แตะ)
+UPSERT_PLACE_SQL = """
+    INSERT INTO places (
+        place_id, name, website, phone, google_maps_url,
+        address, category, review_count, review_rating,
+        latitude, longitude, website_kind, website_host, content_hash, status
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'NEW')
+    ON CONFLICT(place_id) DO UPDATE SET
+        name=excluded.name,
+        website=excluded.website,
+        phone=excluded.phone,
+        google_maps_url=excluded.google_maps_url,
+        address=excluded.address,
+        category=excluded.category,
+        review_count=excluded.review_count,
+        review_rating=excluded.review_rating,
+        latitude=excluded.latitude,
+        longitude=excluded.longitude,
+        website_kind=excluded.website_kind,
+        website_host=excluded.website_host,
+        content_hash=excluded.content_hash,
+        status='NEW',
+        updated_at=strftime('%s', 'now')
+    WHERE places.content_hash IS NOT excluded.content_hash
+"""
+
+# คอลัมน์ reviews/images ของ gosom ยาวเกิน limit default ของ csv module (128KB)
+try:
+    csv.field_size_limit(sys.maxsize)
+except OverflowError:  # Windows: C long 32-bit
+    csv.field_size_limit(2 ** 31 - 1)
+
+
+def create_tables(conn, upsert=False):
+    """Run pending migrations so places, emails, discovered_urls exist"""
+    ran = apply_migrations(conn)
+    if ran:
+        print(f"[OK] Applied migrations: {', '.join(ran)}")
     print("[OK] Created tables successfully")
+    if upsert:
+        filled = backfill_content_hashes(conn)
+        if filled:
+            print(f"[OK] Backfilled content hash for {filled} existing places")
+
+
+def place_content_hash(name, website, phone, address, category, emails):
+    """Hash ของ fields ที่มีผลต่อการหาอีเมล — review/รูป/เวลาเปิดเปลี่ยนไม่ต้อง scrape ใหม่"""
+    fields = [name, website, phone, address, category, emails]
+    return hashlib.sha1(json.dumps(fields, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def row_to_place(idx, row):
+    """
+    1 แถวของ CSV (dict) → (tuple สำหรับ INSERT_PLACE_SQL, raw JSON ทั้งแถวสำหรับ place_raw_data)
+    ช่องว่าง = NULL
+    """
+    row = {key: (value if value != '' else None) for key, value in row.items() if key}
+
+    place_id = row.get('place_id') or row.get('cid') or f"place_{idx}"
+    name = row.get('title') or row.get('name') or 'Unknown'
+    content_hash = place_content_hash(
+        name, row.get('website'), row.get('phone'), row.get('address'), row.get('category'), row.get('emails')
+    )
+
+    place = (
+        place_id,
+        name,
+        row.get('website'),
+        row.get('phone'),
+        row.get('link') or '',
+        row.get('address'),
+        row.get('category'),
+        row.get('review_count'),  # column affinity INTEGER/REAL แปลง text เป็นตัวเลขให้เอง
+        row.get('review_rating'),
+        row.get('latitude'),
+        row.get('longitude'),
+        *classify_website(row.get('website')),
+        content_hash,
+    )
+    return place, json.dumps(row, ensure_ascii=False)
+
+
+def backfill_content_hashes(conn):
+    """เติม content_hash ให้ place ที่นำเข้าก่อนมี migration 0006 — ไม่งั้น --upsert ครั้งแรกจะ re-queue ทุกแถว"""
+    rows = conn.execute("""
+        SELECT p.place_id, p.name, p.website, p.phone, p.address, p.category, r.codec, r.data
+        FROM places p
+        LEFT JOIN place_raw_data r ON r.place_id = p.place_id
+        WHERE p.content_hash IS NULL
+    """).fetchall()
+    updates = []
+    for place_id, name, website, phone, address, category, codec, data in rows:
+        emails = decode_raw_data(codec, data).get('emails')
+        if not isinstance(emails, str) or emails == '':
+            emails = None  # NaN/ว่าง จาก importer รุ่น pandas = ไม่มีอีเมล
+        updates.append((place_content_hash(name, website, phone, address, category, emails), place_id))
+    conn.executemany("UPDATE places SET content_hash=? WHERE place_id=?", updates)
+    conn.commit()
+    return len(updates)
 
 
-def convert_csv_to_sqlite(csv_file, db_file):
-    """Convert CSV to SQLite"""
+def drop_place_indexes(conn):
+    """Drop secondary indexes ของ places คืน [(name, sql)] ไว้สร้างใหม่ (PRIMARY KEY ไม่แตะ)"""
+    indexes = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type='index' AND tbl_name='places' AND sql IS NOT NULL"
+    ).fetchall()
+    for name, _sql in indexes:
+        conn.execute(f'DROP INDEX IF EXISTS "{name}"')
+    return indexes
+
+
+def existing_hashes(conn, place_ids):
+    """{place_id: content_hash} ของ place ที่มีอยู่แล้วใน DB"""
+    ids = list(set(place_ids))
+    found = {}
+    for start in range(0, len(ids), 500):  # SQLite เก่าจำกัด 999 parameters ต่อ statement
+        chunk = ids[start:start + 500]
+        found.update(conn.execute(
+            f"SELECT place_id, content_hash FROM places WHERE place_id IN ({','.join('?' * len(chunk))})", chunk
+        ).fetchall())
+    return found
+
+
+def insert_batch(cursor, batch, upsert=False):
+    """
+    เขียน 1 batch ของ (place tuple, raw JSON) คืน (จำนวนแถวใหม่, จำนวนแถวเดิมที่อัปเดต)
+    เขียน (และบีบอัด raw data) เฉพาะแถวใหม่ / hash เปลี่ยน — ที่เหลือซ้ำหรือไม่เปลี่ยน
+    """
+    conn = cursor.connection
+    known = existing_hashes(conn, [place[0] for place, _raw in batch])
+    new_ids = set()
+    changed_ids = set()
+    rows = []
+    for place, raw_json in batch:
+        place_id, content_hash = place[0], place[-1]
+        if place_id not in known:
+            if place_id in new_ids and not upsert:
+                continue  # ซ้ำใน batch เดียวกัน — INSERT OR IGNORE เก็บแถวแรก
+            new_ids.add(place_id)
+        elif upsert and known[place_id] != content_hash:
+            changed_ids.add(place_id)
+        else:
+            continue
+        rows.append((place, raw_json))
+
+    cursor.executemany(UPSERT_PLACE_SQL if upsert else INSERT_PLACE_SQL, [place for place, _raw in rows])
+    store_raw_data(conn, ((place[0], raw_json) for place, raw_json in rows), replace=upsert)
+    return len(new_ids), len(changed_ids)
+
+
+def convert_csv_to_sqlite(csv_file, db_file, batch_size=BATCH_SIZE, defer_indexes=None, upsert=False):
+    """
+    Convert CSV to SQLite
+    defer_indexes: None = อัตโนมัติ (ตามขนาดไฟล์), True/False = บังคับ
+    upsert: อัปเดต place เดิมที่ข้อมูลเปลี่ยน (+ status='NEW') แทนการข้าม
+    """
     if not Path(csv_file).exists():
         print(f"[ERROR] File not found: {csv_file}")
         return False
 
-    print(f"[1/3] Reading CSV: {csv_file}")
-
+    conn = None
     try:
-        df = pd.read_csv(csv_file)
-        print(f"[OK] Read {len(df)} places successfully")
-
-        print(f"[INFO] Columns: {', '.join(df.columns[:10])}...")
-
-        print(f"[2/3] Connecting to database: {db_file}")
-        conn = sqlite3.connect(db_file)
+        print(f"[1/3] Connecting to database: {db_file}")
+        conn = pipeline_db_connect(db_file, migrate=False)  # create_tables รัน migrations เอง
         cursor = conn.cursor()
 
-        create_tables(conn)
+        create_tables(conn, upsert=upsert)
+
+        if defer_indexes is None:
+            defer_indexes = Path(csv_file).stat().st_size >= DEFER_INDEX_BYTES
 
-        print(f"[3/3] Inserting {len(df)} places into database...")
+        print(f"[2/3] Streaming CSV: {csv_file} (batch {batch_size})")
+        progress = ProgressReporter('ingest')
+        start_time = time.time()
+        total_rows = 0
         success_count = 0
+        updated_count = 0
         skip_count = 0
+        deferred = []
 
-        for idx, row in df.iterrows():
-            try:
-                place_id = row.get('place_id', '') or row.get('cid', '') or f"place_{idx}"
-                name = row.get('title', '') or row.get('name', 'Unknown')
-                website = row.get('website', None)
-                phone = row.get('phone', None)
-                google_maps_url = row.get('link', '')
-                address = row.get('address', None)
-                category = row.get('category', None)
-                review_count = row.get('review_count', None)
-                review_rating = row.get('review_rating', None)
-                latitude = row.get('latitude', None)
-                longitude = row.get('longitude', None)
-
-                raw_data_json = json.dumps(row.to_dict(), ensure_ascii=False)
-
-                cursor.execute("""
-                    INSERT OR IGNORE INTO places (
-                        place_id, name, website, phone, google_maps_url,
-                        address, category, review_count, review_rating,
-                        latitude, longitude, raw_data, status
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'NEW')
-                """, (
-                    place_id, name, website, phone, google_maps_url,
-                    address, category, review_count, review_rating,
-                    latitude, longitude, raw_data_json
-                ))
-
-                if cursor.rowcount > 0:
-                    success_count += 1
-                else:
+        with open(csv_file, encoding='utf-8-sig', newline='') as f:
+            reader = csv.DictReader(f)
+            print(f"[INFO] Columns: {', '.join((reader.fieldnames or [])[:10])}...")
+
+            # ทั้งไฟล์ (รวม drop/สร้าง index) ใน transaction เดียว — error กลางทาง rollback หมด
+            conn.execute("BEGIN")
+            if defer_indexes:
+                deferred = drop_place_indexes(conn)
+                print(f"[INFO] Deferred {len(deferred)} index(es) until load completes")
+
+            batch = []
+            for idx, row in enumerate(reader):
+                try:
+                    batch.append(row_to_place(idx, row))
+                except Exception as e:
+                    print(f"[WARNING] Row {idx} error: {e}")
                     skip_count += 1
+                    continue
+
+                if len(batch) >= batch_size:
+                    inserted, updated = insert_batch(cursor, batch, upsert=upsert)
+                    success_count += inserted
+                    updated_count += updated
+                    total_rows += len(batch)
+                    batch = []
+                    progress.report(total_rows, success_count + updated_count, skip_count)
+                    if total_rows % (batch_size * 10) == 0:
+                        elapsed = time.time() - start_time
+                        print(f"   ... {total_rows} rows ({total_rows / max(elapsed, 1e-6):.0f} rows/sec)")
 
-            except Exception as e:
-                print(f"[WARNING] Row {idx} error: {e}")
-                skip_count += 1
+            if batch:
+                inserted, updated = insert_batch(cursor, batch, upsert=upsert)
+                success_count += inserted
+                updated_count += updated
+                total_rows += len(batch)
 
+        print(f"[3/3] Committing {total_rows} rows...")
+        for name, sql in deferred:
+            conn.execute(sql)
+        if deferred:
+            print(f"[OK] Rebuilt {len(deferred)} index(es)")
         conn.commit()
-        conn.close()
 
+        elapsed = time.time() - start_time
+        progress.finish(total_rows, success_count + updated_count, skip_count, total=total_rows)
+        skip_count += total_rows - success_count - updated_count
+
+        print(f"\n[SUCCESS] Conversion completed:")
+        print(f"   - Inserted: {success_count} places")
+        if upsert:
+            print(f"   - Updated: {updated_count} places (changed → status='NEW')")
+            print(f"   - Unchanged: {skip_count} places")
+        else:
+            print(f"   - Skipped: {skip_count} places (duplicates)")
+        print(f"   - Speed: {total_rows / max(elapsed, 1e-6):.0f} rows/sec ({elapsed:.2f}s)")
+        print(f"   - Database: {db_file}")
+
+        return True
+
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        print(f"[ERROR] {e}")
+        return False
+
+    finally:
+        if conn:
+            conn.close()
+
+
+def split_complete_records(data):
+    """
+    แยก bytes ที่อ่านเพิ่มมาเป็น (ส่วนที่เป็น record ครบแล้ว, ส่วนที่ยังเขียนไม่จบ)
+    record จบที่ newline ที่ไม่อยู่ใน quote — field ที่มี newline (reviews) จึงไม่ถูกตัดกลาง
+    """
+    end = 0
+    quotes = 0
+    pos = 0
+    while True:
+        newline = data.find(b'\n', pos)
+        if newline < 0:
+            break
+        quotes += data.count(b'"', pos, newline)
+        pos = newline + 1
+        if quotes % 2 == 0:
+            end = pos
+            quotes = 0
+    return data[:end], data[end:]
+
+
+def follow_csv_to_sqlite(csv_file, db_file, stop_file=None, idle_timeout=None, poll_interval=POLL_INTERVAL, upsert=False):
+    """
+    Tail CSV ที่ยังถูกเขียนอยู่ (Stage 1 Docker) แล้ว insert แถวที่ครบทุกรอบ poll (commit ทุกรอบให้ Stage 2 เห็น)
+    หยุดเมื่อ stop_file ถูกสร้าง (Stage 1 จบ) หรือ CSV ไม่โตเลย idle_timeout วินาที — แล้วอ่านส่วนที่เหลือให้หมด
+    """
+    conn = None
+    try:
+        print(f"[1/3] Connecting to database: {db_file}")
+        conn = pipeline_db_connect(db_file, migrate=False)  # create_tables รัน migrations เอง
+        cursor = conn.cursor()
+
+        create_tables(conn, upsert=upsert)
+
+        print(f"[2/3] Following CSV: {csv_file} (stop file: {stop_file or '-'}, idle timeout: {idle_timeout or '-'}s)")
+        progress = ProgressReporter('ingest')
+        start_time = time.time()
+        last_growth = start_time
+        offset = 0
+        pending = b''
+        header = None
+        total_rows = 0
+        success_count = 0
+        updated_count = 0
+
+        while True:
+            # เช็คก่อนอ่าน: ถ้า stop file มีแล้ว รอบนี้คือรอบสุดท้าย (อ่านจนจบไฟล์)
+            finished = bool(stop_file and os.path.exists(stop_file))
+            if idle_timeout and time.time() - last_growth >= idle_timeout:
+                finished = True
+
+            size = os.path.getsize(csv_file) if os.path.exists(csv_file) else 0
+            if size < offset:
+                # ไฟล์ถูกสร้างใหม่ (Stage 1 รอบใหม่) → เริ่มอ่านจากต้นไฟล์
+                print("[INFO] CSV was truncated — restarting from the header")
+                offset, pending, header = 0, b'', None
+
+            if size > offset:
+                with open(csv_file, 'rb') as f:
+                    f.seek(offset)
+                    chunk = f.read(size - offset)
+                offset = size
+                last_growth = time.time()
+                complete, pending = split_complete_records(pending + chunk)
+            else:
+                complete = b''
+
+            if finished and pending:
+                # แถวสุดท้ายที่ไม่มี newline ปิดท้าย
+                complete, pending = complete + pending + b'\n', b''
+
+            if complete:
+                rows = csv.reader(io.StringIO(complete.decode('utf-8-sig' if header is None else 'utf-8', errors='replace')))
+                batch = []
+                for values in rows:
+                    if not values:
+                        continue
+                    if header is None:
+                        header = values
+                        print(f"[INFO] Columns: {', '.join(header[:10])}...")
+                        continue
+                    try:
+                        batch.append(row_to_place(total_rows + len(batch), dict(zip(header, values))))
+                    except Exception as e:
+                        print(f"[WARNING] Row {total_rows + len(batch)} error: {e}")
+                if batch:
+                    inserted, updated = insert_batch(cursor, batch, upsert=upsert)
+                    conn.commit()
+                    total_rows += len(batch)
+                    success_count += inserted
+                    updated_count += updated
+                    print(f"[FOLLOW] +{inserted} new, {updated} updated places ({total_rows} rows read)")
+                    progress.report(total_rows, success_count + updated_count)
+
+            if finished:
+                break
+            time.sleep(poll_interval)
+
+        elapsed = time.time() - start_time
+        progress.finish(total_rows, success_count + updated_count, total=total_rows)
+        print("[3/3] Stage 1 finished — CSV fully ingested")
         print(f"\n[SUCCESS] Conversion completed:")
         print(f"   - Inserted: {success_count} places")
-        print(f"   - Skipped: {skip_count} places (duplicates)")
+        if upsert:
+            print(f"   - Updated: {updated_count} places (changed → status='NEW')")
+            print(f"   - Unchanged: {total_rows - success_count - updated_count} places")
+        else:
+            print(f"   - Skipped: {total_rows - success_count} places (duplicates)")
+        print(f"   - Followed for: {elapsed:.1f}s")
         print(f"   - Database: {db_file}")
 
         return True
 
     except Exception as e:
+        if conn:
+            conn.rollback()
         print(f"[ERROR] {e}")
         return False
 
+    finally:
+        if conn:
+            conn.close()
+
 
 def main():
-    if len(sys.argv) < 3:
-        print("Usage: python scripts/csv_to_sqlite.py <csv_file> <db_file>")
-        print("Example: python scripts/csv_to_sqlite.py output/results.csv pipeline.db")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description='CSV to SQLite Converter',
+        epilog='Example: python scripts/csv_to_sqlite.py output/results.csv pipeline.db',
+    )
+    parser.add_argument('csv_file', help='CSV จาก google-maps-scraper')
+    parser.add_argument('db_file', help='SQLite database path')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help=f'rows ต่อ executemany (default: {BATCH_SIZE})')
+    parser.add_argument('--defer-indexes', action=argparse.BooleanOptionalAction, default=None,
+                        help=f'drop/สร้าง index ของ places ใหม่หลัง load (default: อัตโนมัติเมื่อ CSV >= {DEFER_INDEX_BYTES // 1024 // 1024}MB)')
+    parser.add_argument('--upsert', action='store_true', help='อัปเดต place เดิมที่ข้อมูลเปลี่ยน แล้วตั้ง status=NEW ให้ Stage 2 ทำใหม่')
+    parser.add_argument('--follow', action='store_true', help='tail CSV ที่ Stage 1 กำลังเขียน แล้ว insert แถวใหม่ทันที')
+    parser.add_argument('--stop-file', help='(--follow) หยุดเมื่อไฟล์นี้ถูกสร้าง (Stage 1 จบแล้ว)')
+    parser.add_argument('--idle-timeout', type=float, help='(--follow) หยุดเมื่อ CSV ไม่โตขึ้นกี่วินาที')
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL, help=f'(--follow) วินาทีระหว่างการเช็ค CSV (default: {POLL_INTERVAL})')
+    args = parser.parse_args()
 
-    csv_file = sys.argv[1]
-    db_file = sys.argv[2]
+    if args.follow and not (args.stop_file or args.idle_timeout):
+        parser.error('--follow ต้องใช้คู่กับ --stop-file หรือ --idle-timeout')
 
     print("=" * 60)
     print("CSV to SQLite Converter")
     print("=" * 60)
 
-    success = convert_csv_to_sqlite(csv_file, db_file)
+    if args.follow:
+        success = follow_csv_to_sqlite(
+            args.csv_file,
+            args.db_file,
+            stop_file=args.stop_file,
+            idle_timeout=args.idle_timeout,
+            poll_interval=args.poll_interval,
+            upsert=args.upsert,
+        )
+    else:
+        success = convert_csv_to_sqlite(
+            args.csv_file,
+            args.db_file,
+            batch_size=args.batch_size,
+            defer_indexes=args.defer_indexes,
+            upsert=args.upsert,
+        )
 
     if success:
         print("\n[DONE] Ready for Stage 2!")
@@ -0,0 +1,8 @@
+-- Migration 0003: Stage 4 frontier — URL ที่ Stage 4 เจอบนหน้าที่ scrape ถูกใส่กลับเข้าคิว
+-- depth = ระยะจาก URL ที่ Stage 2/3 เจอ (0), parent_id = discovered URL ที่พาไปเจอ
+
+ALTER TABLE discovered_urls ADD COLUMN depth INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE discovered_urls ADD COLUMN parent_id INTEGER REFERENCES discovered_urls(id);
+
+CREATE INDEX IF NOT EXISTS idx_discovered_urls_status_depth
+ON discovered_urls(status, depth);
@@ -0,0 +1,13 @@
+-- Migration 0004: Fetch ledger — หน้าที่ render แล้ว (ทุก stage) เพื่อไม่ต้อง navigate ซ้ำ
+
+CREATE TABLE IF NOT EXISTS fetch_ledger (
+    url TEXT PRIMARY KEY,  -- URL ที่สั่ง navigate
+    final_url TEXT NOT NULL,  -- URL หลัง redirect
+    fetched_by TEXT NOT NULL,  -- 'STAGE2', 'STAGE3', 'STAGE4'
+    emails TEXT NOT NULL DEFAULT '[]',  -- JSON list ของอีเมลที่ extract ได้
+    links TEXT NOT NULL DEFAULT '[]',  -- JSON list ของ [url, url_type] ที่ extract ได้
+    fetched_at INTEGER NOT NULL DEFAULT (strftime('%s', 'now'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_fetch_ledger_final_url
+ON fetch_ledger(final_url);
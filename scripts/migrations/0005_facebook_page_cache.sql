@@ -0,0 +1,13 @@
+-- Migration 0005: Facebook page cache — ผล scrape ต่อ 1 Facebook page (ใช้ร่วมกัน Stage 3 / Stage 4)
+-- key = page id/slug แบบ canonical ไม่ใช่ URL → หลาย place ที่ลิงก์เพจเดียวกัน render หน้า About ครั้งเดียว
+
+CREATE TABLE IF NOT EXISTS facebook_page_cache (
+    page_key TEXT PRIMARY KEY,  -- 'id:<numeric id>' หรือ slug ตัวเล็ก เช่น 'centaraayutthaya'
+    email TEXT,  -- อีเมลแรกที่เจอ
+    phone TEXT,
+    website TEXT,  -- เว็บไซต์แรกที่เจอ
+    emails TEXT NOT NULL DEFAULT '[]',  -- JSON list ของอีเมลทั้งหมด
+    websites TEXT NOT NULL DEFAULT '[]',  -- JSON list ของ website URLs ทั้งหมด
+    fetched_by TEXT NOT NULL,  -- 'STAGE3', 'STAGE4'
+    fetched_at INTEGER NOT NULL DEFAULT (strftime('%s', 'now'))
+);
@@ -0,0 +1,5 @@
+-- Migration 0006: content hash ของ fields ที่มีผลต่อการหาอีเมล (name, website, phone, address, category, emails)
+-- csv_to_sqlite.py --upsert อัปเดตเฉพาะ place ที่ hash เปลี่ยน แล้วตั้ง status='NEW' ให้ Stage 2 ทำใหม่
+-- แถวเก่า (NULL) ถูกเติม hash ตอนรัน --upsert ครั้งแรก
+
+ALTER TABLE places ADD COLUMN content_hash TEXT;
@@ -0,0 +1,46 @@
+-- Migration 0007: ย้าย places.raw_data (JSON ทั้งแถวของ CSV: reviews, images, popular_times, ...) ไปตารางข้าง
+-- places เหลือแต่ column ที่ status scan / GUI ใช้ → อ่านเร็วขึ้น, raw data ถูกบีบอัด (zstd/zlib)
+-- แถวเก่าถูกคัดลอกแบบ codec='none' ก่อน แล้ว pipeline_db.compress_pending_raw_data บีบอัดหลัง migration นี้
+
+CREATE TABLE IF NOT EXISTS place_raw_data (
+    place_id TEXT PRIMARY KEY REFERENCES places(place_id),
+    codec TEXT NOT NULL,  -- 'zstd', 'zlib' หรือ 'none' (ยังไม่บีบอัด)
+    data BLOB NOT NULL
+);
+
+INSERT OR IGNORE INTO place_raw_data (place_id, codec, data)
+SELECT place_id, 'none', CAST(raw_data AS BLOB) FROM places WHERE raw_data IS NOT NULL;
+
+-- SQLite เก่าไม่มี DROP COLUMN → สร้าง places ใหม่ (ไม่มี raw_data) แล้วคัดลอก
+CREATE TABLE places_new (
+    place_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    website TEXT,
+    phone TEXT,
+    google_maps_url TEXT NOT NULL,
+    address TEXT,
+    category TEXT,
+    review_count INTEGER,
+    review_rating REAL,
+    latitude REAL,
+    longitude REAL,
+    status TEXT NOT NULL DEFAULT 'NEW',  -- NEW, PROCESSING, DONE, FAILED
+    created_at INTEGER NOT NULL DEFAULT (strftime('%s', 'now')),
+    updated_at INTEGER NOT NULL DEFAULT (strftime('%s', 'now')),
+    content_hash TEXT
+);
+
+INSERT INTO places_new (
+    rowid, place_id, name, website, phone, google_maps_url, address, category,
+    review_count, review_rating, latitude, longitude, status, created_at, updated_at, content_hash
+)
+SELECT
+    rowid, place_id, name, website, phone, google_maps_url, address, category,
+    review_count, review_rating, latitude, longitude, status, created_at, updated_at, content_hash
+FROM places;
+
+DROP TABLE places;
+ALTER TABLE places_new RENAME TO places;
+
+CREATE INDEX IF NOT EXISTS idx_places_status ON places(status);
+CREATE INDEX IF NOT EXISTS idx_places_name ON places(name);
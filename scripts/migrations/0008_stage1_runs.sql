@@ -0,0 +1,15 @@
+-- Migration 0008: Stage 1 runs — เวลา startup ของ scraper container ต่อรอบ (ดูว่า cold start หายไปหรือยัง)
+
+CREATE TABLE IF NOT EXISTS stage1_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_started_at INTEGER NOT NULL,  -- เวลาเริ่มรอบ (ทุก shard ในรอบเดียวกันใช้ค่าเดียวกัน)
+    shard INTEGER NOT NULL DEFAULT 1,
+    shards INTEGER NOT NULL DEFAULT 1,
+    mode TEXT NOT NULL,  -- 'warm' (docker exec ใน container ที่เปิดค้าง), 'cold' (docker run --rm), 'prewarm'
+    startup_seconds REAL,  -- จนถึง log บรรทัดแรกที่ไม่ใช่การดาวน์โหลด driver/browser (NULL = ไม่มี log)
+    elapsed_seconds REAL,
+    returncode INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_stage1_runs_started
+ON stage1_runs(run_started_at);
@@ -0,0 +1,10 @@
+-- Migration 0009: Query yield curve — จำนวน place ใหม่ที่แต่ละ depth เพิ่มให้ query (ใช้กับ adaptive depth)
+
+CREATE TABLE IF NOT EXISTS query_yield (
+    query TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    results INTEGER NOT NULL,  -- place_id ไม่ซ้ำที่ได้ที่ depth นี้
+    new_results INTEGER,  -- place_id ที่ depth ตื้นกว่าไม่เจอ (NULL = ไม่ได้วัด เช่น เริ่มรันที่ depth นี้เลย)
+    measured_at INTEGER NOT NULL DEFAULT (strftime('%s', 'now')),
+    PRIMARY KEY (query, depth)
+);
@@ -0,0 +1,16 @@
+-- Migration 0010: Geo tiles — ผลการรัน Stage 1 แบบ geo-anchored ต่อ tile (coverage_planner.py)
+
+CREATE TABLE IF NOT EXISTS geo_tiles (
+    query TEXT NOT NULL,
+    tile_key TEXT NOT NULL,  -- "south,west,size_km" ของ tile
+    south REAL NOT NULL,
+    west REAL NOT NULL,
+    north REAL NOT NULL,
+    east REAL NOT NULL,
+    zoom INTEGER NOT NULL,
+    runs INTEGER NOT NULL DEFAULT 0,
+    results INTEGER,  -- place_id ไม่ซ้ำที่รอบล่าสุดได้
+    new_results INTEGER,  -- ที่ยังไม่มีใน DB ก่อนรอบล่าสุด
+    last_run_at INTEGER,
+    PRIMARY KEY (query, tile_key)
+);
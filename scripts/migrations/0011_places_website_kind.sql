@@ -0,0 +1,8 @@
+-- Migration 0011: ประเภท website ของ place — แต่ละ stage เลือกแถวของตัวเองด้วย index แทน LIKE '%facebook.com%'
+-- ค่าของแถวเดิมเติมโดย pipeline_db.backfill_website_kind (post-migration hook)
+
+ALTER TABLE places ADD COLUMN website_kind TEXT;  -- 'site', 'facebook', 'line', 'instagram', 'none'
+ALTER TABLE places ADD COLUMN website_host TEXT;  -- host แบบ normalize (ไม่มี www.)
+
+CREATE INDEX IF NOT EXISTS idx_places_kind_status
+ON places(website_kind, status);
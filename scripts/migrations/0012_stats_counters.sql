@@ -0,0 +1,82 @@
+-- Migration 0012: Stats counters — ตัวนับของ dashboard ที่ trigger อัปเดตทุกครั้งที่เขียน (อ่าน O(1) ไม่ต้อง COUNT(*) ทั้งตาราง)
+-- scope: 'places.status', 'emails.source', 'discovered_urls.status', 'discovered_urls.url_type'
+-- ค่าเริ่มต้นนับโดย pipeline_db.rebuild_stats_counters (post-migration hook) — ใช้ซ่อมถ้าค่าเพี้ยน
+-- หมายเหตุ: INSERT OR REPLACE ไม่ยิง DELETE trigger — เขียน 3 ตารางนี้ด้วย ON CONFLICT DO UPDATE แทน
+
+CREATE TABLE IF NOT EXISTS stats_counters (
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,  -- ค่า NULL เก็บเป็น ''
+    n INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, key)
+) WITHOUT ROWID;
+
+-- places.status
+CREATE TRIGGER IF NOT EXISTS trg_stats_places_insert AFTER INSERT ON places
+BEGIN
+    INSERT INTO stats_counters (scope, key, n) VALUES ('places.status', COALESCE(NEW.status, ''), 1)
+    ON CONFLICT(scope, key) DO UPDATE SET n = n + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_places_delete AFTER DELETE ON places
+BEGIN
+    UPDATE stats_counters SET n = n - 1 WHERE scope = 'places.status' AND key = COALESCE(OLD.status, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_places_status AFTER UPDATE OF status ON places
+WHEN OLD.status IS NOT NEW.status
+BEGIN
+    UPDATE stats_counters SET n = n - 1 WHERE scope = 'places.status' AND key = COALESCE(OLD.status, '');
+    INSERT INTO stats_counters (scope, key, n) VALUES ('places.status', COALESCE(NEW.status, ''), 1)
+    ON CONFLICT(scope, key) DO UPDATE SET n = n + 1;
+END;
+
+-- emails.source
+CREATE TRIGGER IF NOT EXISTS trg_stats_emails_insert AFTER INSERT ON emails
+BEGIN
+    INSERT INTO stats_counters (scope, key, n) VALUES ('emails.source', COALESCE(NEW.source, ''), 1)
+    ON CONFLICT(scope, key) DO UPDATE SET n = n + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_emails_delete AFTER DELETE ON emails
+BEGIN
+    UPDATE stats_counters SET n = n - 1 WHERE scope = 'emails.source' AND key = COALESCE(OLD.source, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_emails_source AFTER UPDATE OF source ON emails
+WHEN OLD.source IS NOT NEW.source
+BEGIN
+    UPDATE stats_counters SET n = n - 1 WHERE scope = 'emails.source' AND key = COALESCE(OLD.source, '');
+    INSERT INTO stats_counters (scope, key, n) VALUES ('emails.source', COALESCE(NEW.source, ''), 1)
+    ON CONFLICT(scope, key) DO UPDATE SET n = n + 1;
+END;
+
+-- discovered_urls.status + discovered_urls.url_type
+CREATE TRIGGER IF NOT EXISTS trg_stats_discovered_insert AFTER INSERT ON discovered_urls
+BEGIN
+    INSERT INTO stats_counters (scope, key, n) VALUES ('discovered_urls.status', COALESCE(NEW.status, ''), 1)
+    ON CONFLICT(scope, key) DO UPDATE SET n = n + 1;
+    INSERT INTO stats_counters (scope, key, n) VALUES ('discovered_urls.url_type', COALESCE(NEW.url_type, ''), 1)
+    ON CONFLICT(scope, key) DO UPDATE SET n = n + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_discovered_delete AFTER DELETE ON discovered_urls
+BEGIN
+    UPDATE stats_counters SET n = n - 1 WHERE scope = 'discovered_urls.status' AND key = COALESCE(OLD.status, '');
+    UPDATE stats_counters SET n = n - 1 WHERE scope = 'discovered_urls.url_type' AND key = COALESCE(OLD.url_type, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_discovered_status AFTER UPDATE OF status ON discovered_urls
+WHEN OLD.status IS NOT NEW.status
+BEGIN
+    UPDATE stats_counters SET n = n - 1 WHERE scope = 'discovered_urls.status' AND key = COALESCE(OLD.status, '');
+    INSERT INTO stats_counters (scope, key, n) VALUES ('discovered_urls.status', COALESCE(NEW.status, ''), 1)
+    ON CONFLICT(scope, key) DO UPDATE SET n = n + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_discovered_type AFTER UPDATE OF url_type ON discovered_urls
+WHEN OLD.url_type IS NOT NEW.url_type
+BEGIN
+    UPDATE stats_counters SET n = n - 1 WHERE scope = 'discovered_urls.url_type' AND key = COALESCE(OLD.url_type, '');
+    INSERT INTO stats_counters (scope, key, n) VALUES ('discovered_urls.url_type', COALESCE(NEW.url_type, ''), 1)
+    ON CONFLICT(scope, key) DO UPDATE SET n = n + 1;
+END;
@@ -0,0 +1,80 @@
+-- Migration 0013: Place summary — 1 แถวต่อ place (อีเมล/แหล่งที่มา/สถานะ) สำหรับแท็บ Success / Failed
+-- trigger บน places/emails อัปเดตทีละ place แทนการ GROUP BY / anti-join ทั้งตารางทุกครั้งที่ rerun
+-- ค่าเริ่มต้นสร้างโดย pipeline_db.rebuild_place_summary (post-migration hook)
+
+CREATE TABLE IF NOT EXISTS place_summary (
+    place_id TEXT PRIMARY KEY,
+    name TEXT,
+    category TEXT,
+    phone TEXT,
+    website TEXT,
+    website_kind TEXT,
+    status TEXT,
+    has_email INTEGER NOT NULL DEFAULT 0,  -- 1 = Success, 0 = Failed
+    email_count INTEGER NOT NULL DEFAULT 0,
+    emails TEXT,  -- คั่นด้วย ,
+    sources TEXT,  -- คั่นด้วย , (ไม่ซ้ำ)
+    updated_at INTEGER
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_place_summary_updated ON place_summary(has_email, updated_at);
+CREATE INDEX IF NOT EXISTS idx_place_summary_status ON place_summary(has_email, status, updated_at);
+CREATE INDEX IF NOT EXISTS idx_place_summary_kind ON place_summary(has_email, website_kind, updated_at);
+CREATE INDEX IF NOT EXISTS idx_place_summary_category ON place_summary(has_email, category, updated_at);
+
+-- places → ข้อมูลของ place
+CREATE TRIGGER IF NOT EXISTS trg_summary_places_insert AFTER INSERT ON places
+BEGIN
+    INSERT OR IGNORE INTO place_summary (place_id, name, category, phone, website, website_kind, status, updated_at)
+    VALUES (NEW.place_id, NEW.name, NEW.category, NEW.phone, NEW.website, NEW.website_kind, NEW.status, NEW.updated_at);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_summary_places_update
+AFTER UPDATE OF name, category, phone, website, website_kind, status, updated_at ON places
+BEGIN
+    UPDATE place_summary SET
+        name = NEW.name,
+        category = NEW.category,
+        phone = NEW.phone,
+        website = NEW.website,
+        website_kind = NEW.website_kind,
+        status = NEW.status,
+        updated_at = NEW.updated_at
+    WHERE place_id = NEW.place_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_summary_places_delete AFTER DELETE ON places
+BEGIN
+    DELETE FROM place_summary WHERE place_id = OLD.place_id;
+END;
+
+-- emails → นับ/รวมอีเมลของ place นั้นใหม่ (idx_emails_place_id)
+CREATE TRIGGER IF NOT EXISTS trg_summary_emails_insert AFTER INSERT ON emails
+BEGIN
+    UPDATE place_summary SET
+        email_count = (SELECT COUNT(*) FROM emails WHERE place_id = NEW.place_id),
+        has_email = 1,
+        emails = (SELECT GROUP_CONCAT(email) FROM emails WHERE place_id = NEW.place_id),
+        sources = (SELECT GROUP_CONCAT(DISTINCT source) FROM emails WHERE place_id = NEW.place_id)
+    WHERE place_id = NEW.place_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_summary_emails_delete AFTER DELETE ON emails
+BEGIN
+    UPDATE place_summary SET
+        email_count = (SELECT COUNT(*) FROM emails WHERE place_id = OLD.place_id),
+        has_email = EXISTS (SELECT 1 FROM emails WHERE place_id = OLD.place_id),
+        emails = (SELECT GROUP_CONCAT(email) FROM emails WHERE place_id = OLD.place_id),
+        sources = (SELECT GROUP_CONCAT(DISTINCT source) FROM emails WHERE place_id = OLD.place_id)
+    WHERE place_id = OLD.place_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_summary_emails_update AFTER UPDATE OF place_id, email, source ON emails
+BEGIN
+    UPDATE place_summary SET
+        email_count = (SELECT COUNT(*) FROM emails WHERE place_id = place_summary.place_id),
+        has_email = EXISTS (SELECT 1 FROM emails WHERE place_id = place_summary.place_id),
+        emails = (SELECT GROUP_CONCAT(email) FROM emails WHERE place_id = place_summary.place_id),
+        sources = (SELECT GROUP_CONCAT(DISTINCT source) FROM emails WHERE place_id = place_summary.place_id)
+    WHERE place_id IN (OLD.place_id, NEW.place_id);
+END;
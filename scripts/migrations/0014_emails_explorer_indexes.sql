@@ -0,0 +1,11 @@
+-- Migration 0014: index สำหรับแท็บ Emails (กรอง/เรียงใน SQL แล้วดึงเฉพาะหน้าที่แสดง)
+-- เรียงตามเวลาที่พบ (ทั้งหมด / ต่อ source) และตัวกรอง category ฝั่ง places
+
+CREATE INDEX IF NOT EXISTS idx_emails_created_at
+ON emails(created_at);
+
+CREATE INDEX IF NOT EXISTS idx_emails_source_created_at
+ON emails(source, created_at);
+
+CREATE INDEX IF NOT EXISTS idx_places_category
+ON places(category);
@@ -0,0 +1,53 @@
+-- Migration 0015: FTS5 สำหรับช่องค้นหาใน Results Explorer (Emails / Success / Failed)
+-- tokenizer trigram: ค้นแบบ substring ไม่สนตัวพิมพ์เล็กใหญ่ และใช้กับภาษาไทย (ไม่มีช่องว่างคั่นคำ) ได้
+-- external content — ไม่เก็บข้อความซ้ำ มีแค่ index; trigger ด้านล่าง sync ทุกครั้งที่เขียน places/emails
+-- หมายเหตุ: INSERT OR REPLACE บน places/emails จะข้าม delete trigger (index ไม่ตรง) — ใช้ UPSERT/UPDATE แทน
+
+CREATE VIRTUAL TABLE IF NOT EXISTS places_fts USING fts5(
+    name, category, address, website,
+    content='places', content_rowid='rowid', tokenize='trigram'
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS emails_fts USING fts5(
+    email,
+    content='emails', content_rowid='id', tokenize='trigram'
+);
+
+INSERT INTO places_fts(places_fts) VALUES ('rebuild');
+INSERT INTO emails_fts(emails_fts) VALUES ('rebuild');
+
+CREATE TRIGGER IF NOT EXISTS trg_places_fts_insert AFTER INSERT ON places
+BEGIN
+    INSERT INTO places_fts(rowid, name, category, address, website)
+    VALUES (new.rowid, new.name, new.category, new.address, new.website);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_places_fts_delete AFTER DELETE ON places
+BEGIN
+    INSERT INTO places_fts(places_fts, rowid, name, category, address, website)
+    VALUES ('delete', old.rowid, old.name, old.category, old.address, old.website);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_places_fts_update AFTER UPDATE OF name, category, address, website ON places
+BEGIN
+    INSERT INTO places_fts(places_fts, rowid, name, category, address, website)
+    VALUES ('delete', old.rowid, old.name, old.category, old.address, old.website);
+    INSERT INTO places_fts(rowid, name, category, address, website)
+    VALUES (new.rowid, new.name, new.category, new.address, new.website);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_emails_fts_insert AFTER INSERT ON emails
+BEGIN
+    INSERT INTO emails_fts(rowid, email) VALUES (new.id, new.email);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_emails_fts_delete AFTER DELETE ON emails
+BEGIN
+    INSERT INTO emails_fts(emails_fts, rowid, email) VALUES ('delete', old.id, old.email);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_emails_fts_update AFTER UPDATE OF email ON emails
+BEGIN
+    INSERT INTO emails_fts(emails_fts, rowid, email) VALUES ('delete', old.id, old.email);
+    INSERT INTO emails_fts(rowid, email) VALUES (new.id, new.email);
+END;
@@ -0,0 +1,19 @@
+-- Migration 0016: ความถูกต้องของรูปแบบอีเมลเป็น generated column + index (ค่าใน index คำนวณตอนเขียนแถว)
+-- เทียบเท่า regex ^[^\s@]+@[^\s@]+\.[^\s@]+$ หลัง strip (เดิมตรวจทีละแถวใน Python)
+-- (มี @ ตัวเดียวและไม่อยู่ตัวแรก, ไม่มีช่องว่าง, โดเมนมี . ที่มีตัวอักษรทั้งสองฝั่ง)
+-- ล้างอีเมลเสียหลัง pipeline = DELETE ... WHERE is_valid = 0 ครั้งเดียว; ตัวกรองใน GUI ใช้ index เดียวกัน
+
+ALTER TABLE emails ADD COLUMN is_valid INTEGER GENERATED ALWAYS AS (
+    CASE
+        WHEN trim(email, char(32, 9, 10, 11, 12, 13)) = '' THEN 0
+        WHEN trim(email, char(32, 9, 10, 11, 12, 13)) GLOB ('*[' || char(32, 9, 10, 11, 12, 13, 160) || ']*') THEN 0
+        WHEN instr(trim(email, char(32, 9, 10, 11, 12, 13)), '@') <= 1 THEN 0
+        WHEN instr(substr(trim(email, char(32, 9, 10, 11, 12, 13)),
+                          instr(trim(email, char(32, 9, 10, 11, 12, 13)), '@') + 1), '@') > 0 THEN 0
+        WHEN substr(trim(email, char(32, 9, 10, 11, 12, 13)),
+                    instr(trim(email, char(32, 9, 10, 11, 12, 13)), '@') + 1) GLOB '?*.?*' THEN 1
+        ELSE 0
+    END
+) VIRTUAL;
+
+CREATE INDEX IF NOT EXISTS idx_emails_is_valid ON emails(is_valid);
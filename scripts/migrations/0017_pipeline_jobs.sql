@@ -0,0 +1,31 @@
+-- Migration 0017: Pipeline jobs — คิวงานที่ GUI ส่งให้ supervisor (pipeline_jobs.py) รันเบื้องหลัง
+-- GUI แค่ submit + อ่านสถานะ; ปิด/refresh หน้าเว็บแล้ว pipeline ยังรันต่อ และงานที่เข้าคิวรันต่อกันทีละงาน
+
+CREATE TABLE IF NOT EXISTS pipeline_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    status TEXT NOT NULL DEFAULT 'QUEUED',  -- QUEUED, RUNNING, CANCELLING, DONE, FAILED, CANCELLED
+    query TEXT NOT NULL,
+    options TEXT NOT NULL,  -- JSON ของตัวเลือก runner (depth, shards, ...)
+    current_stage TEXT,
+    supervisor_pid INTEGER,
+    log_dir TEXT,  -- log ของแต่ละ stage: <log_dir>/<stage>.log
+    error TEXT,
+    submitted_at INTEGER NOT NULL DEFAULT (strftime('%s', 'now')),
+    started_at INTEGER,
+    finished_at INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_pipeline_jobs_status
+ON pipeline_jobs(status, id);
+
+CREATE TABLE IF NOT EXISTS pipeline_job_stages (
+    job_id INTEGER NOT NULL,
+    stage TEXT NOT NULL,  -- stage1, ingest, stage2, stage3, stage4, purge
+    status TEXT NOT NULL,  -- RUNNING, DONE, FAILED, CANCELLED
+    pid INTEGER,
+    log_path TEXT,
+    returncode INTEGER,
+    started_at INTEGER,
+    finished_at INTEGER,
+    PRIMARY KEY (job_id, stage)
+) WITHOUT ROWID;
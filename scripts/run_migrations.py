@@ -1,12 +1,23 @@
 # -*- coding: utf-8 -*-
 """
 Run Database Migrations
-รันจาก root: python scripts/run_migrations.py
+รันจาก root: python scripts/run_migrations.py [--vacuum] [--rebuild-stats] [--rebuild-search]
+--vacuum: คืนพื้นที่หลัง migration ที่ย้าย/บีบอัดข้อมูล (เช่น 0007 raw data) ให้ไฟล์ DB เล็กลงจริง
+--rebuild-stats: นับ stats_counters (ตัวเลข dashboard) ใหม่จากตารางจริง ถ้าค่าเพี้ยน
+--rebuild-search: สร้าง index ค้นหา (places_fts / emails_fts) ใหม่ ถ้าผลค้นหาไม่ตรงข้อมูล
 """
 import sys
-import sqlite3
+import argparse
 import os
 
+# ให้ import pipeline_db จาก project root ได้
+_script_dir = os.path.dirname(os.path.abspath(__file__))
+_project_root = os.path.dirname(_script_dir)
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+
+from pipeline_db import connect, apply_migrations, get_applied_migrations, rebuild_stats_counters, rebuild_search_index
+
 if sys.platform == 'win32':
     try:
         sys.stdout.reconfigure(encoding='utf-8')
@@ -20,9 +31,8 @@ MIGRATIONS_DIR = os.path.join(SCRIPT_DIR, 'migrations')
 DB_PATH = os.path.join(PROJECT_ROOT, 'pipeline.db')
 
 
-def run_migrations():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+def run_migrations(vacuum=False, rebuild_stats=False, rebuild_search=False):
+    conn = connect(DB_PATH, migrate=False)
 
     print("="*70)
     print("🔄 Running Database Migrations")
@@ -34,21 +44,36 @@ def run_migrations():
         conn.close()
         return
 
+    applied = get_applied_migrations(conn)
     migration_files = sorted([f for f in os.listdir(MIGRATIONS_DIR) if f.endswith('.sql')])
-
     for migration_file in migration_files:
-        print(f"Running: {migration_file}...")
+        if migration_file in applied:
+            print(f"  ⏭️  {migration_file} already applied")
+
+    try:
+        ran = apply_migrations(conn, verbose=True)
+        if not ran:
+            print("  (nothing to apply)")
+    except Exception as e:
+        print(f"  ❌ Migration failed (rolled back): {e}")
+        conn.close()
+        sys.exit(1)
+
+    if rebuild_stats:
+        rows = rebuild_stats_counters(conn)
+        print(f"  ✅ Rebuilt stats_counters ({rows} rows)")
 
-        with open(os.path.join(MIGRATIONS_DIR, migration_file), 'r', encoding='utf-8') as f:
-            sql = f.read()
+    if rebuild_search:
+        rebuild_search_index(conn)
+        print("  ✅ Rebuilt search index (places_fts, emails_fts)")
 
-        try:
-            cursor.executescript(sql)
-            print(f"  ✅ {migration_file} completed")
-        except Exception as e:
-            print(f"  ⚠️  {migration_file} skipped (already exists or error): {e}")
+    if vacuum:
+        size_before = os.path.getsize(DB_PATH)
+        print("  🧹 VACUUM...")
+        conn.execute("VACUUM")
+        size_after = os.path.getsize(DB_PATH)
+        print(f"  ✅ {size_before / 1024 / 1024:.1f} MB → {size_after / 1024 / 1024:.1f} MB")
 
-    conn.commit()
     conn.close()
 
     print()
@@ -58,4 +83,9 @@ def run_migrations():
 
 
 if __name__ == "__main__":
-    run_migrations()
+    parser = argparse.ArgumentParser(description='Run Database Migrations')
+    parser.add_argument('--vacuum', action='store_true', help='VACUUM หลัง migration (คืนพื้นที่ไฟล์ DB)')
+    parser.add_argument('--rebuild-stats', action='store_true', help='นับ stats_counters ใหม่จากตารางจริง')
+    parser.add_argument('--rebuild-search', action='store_true', help='สร้าง index ค้นหา (FTS5) ใหม่')
+    args = parser.parse_args()
+    run_migrations(vacuum=args.vacuum, rebuild_stats=args.rebuild_stats, rebuild_search=args.rebuild_search)
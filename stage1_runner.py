@@ -0,0 +1,638 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stage 1: Google Maps Scraper runner (Docker) 🐳
+- แบ่ง config/queries.txt เป็น N shards แล้วรัน gosom/google-maps-scraper N containers พร้อมกัน
+- แต่ละ shard มีไฟล์ queries/results ของตัวเอง (output/shards/)
+- shard ไหนจบก่อน นำเข้า SQLite ทันที (csv_to_sqlite.py — place ซ้ำข้าม shard ถูก dedupe ด้วย place_id)
+- ทุกบรรทัด log มี prefix [SHARD k/N] ให้ GUI แยกแสดง progress ราย shard
+- Warm start: driver/browser ที่ scraper ดาวน์โหลดเก็บใน named volume (ไม่หายเมื่อ container ถูกลบ)
+  และรันผ่าน docker exec ใน container ที่เปิดค้างไว้ — cold start 5–15 นาทีเกิดครั้งเดียว
+- บันทึกเวลา startup ของแต่ละรอบในตาราง stage1_runs
+- Adaptive depth: เริ่มตื้น แล้วเพิ่ม depth เฉพาะ query ที่ depth ล่าสุดยังได้ place ใหม่ ≥ threshold
+  (yield curve ต่อ query เก็บในตาราง query_yield ใช้เลือก depth เริ่มต้นรอบถัดไป)
+รันจาก root: python stage1_runner.py --shards 4 --depth 2
+"""
+import sys
+import os
+import re
+import csv
+import json
+import time
+import queue
+import signal
+import argparse
+import threading
+import subprocess
+
+import pipeline_db
+from progress_events import ProgressReporter, PROGRESS_ENV
+
+if sys.platform == 'win32':
+    try:
+        sys.stdout.reconfigure(encoding='utf-8')
+    except Exception:
+        pass
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+SCRAPER_IMAGE = 'gosom/google-maps-scraper'
+SHARDS_DIR = 'output/shards'  # relative กับ project root (= /work ใน container)
+
+# scraper ดาวน์โหลด driver/browser ลง /opt ตอนเริ่ม ("Downloading driver path=/opt")
+CACHE_VOLUME = 'gmaps-scraper-cache'
+CACHE_MOUNT = '/opt'
+WARM_CONTAINER = 'gmaps-scraper-warm'
+SHARD_CONTAINER_PREFIX = 'gmaps-scraper-shard'  # ชื่อ container ของ docker run (cold) — ไว้ rm -f ตอนยกเลิก
+
+# log ช่วง startup (ยังไม่เริ่ม scrape) — บรรทัดแรกที่ไม่ตรง pattern นี้ถือว่า startup เสร็จ
+STARTUP_LINE = re.compile(r'download|install|driver|playwright|browser', re.IGNORECASE)
+
+
+def _docker(*args, timeout=60):
+    """รันคำสั่ง docker สั้น ๆ คืน CompletedProcess (None ถ้ารันไม่ได้)"""
+    try:
+        return subprocess.run(['docker', *args], capture_output=True, text=True, encoding='utf-8', errors='ignore', timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+
+def ensure_cache_volume():
+    """สร้าง named volume เก็บ driver/browser (มีอยู่แล้วก็ไม่เป็นไร)"""
+    result = _docker('volume', 'create', CACHE_VOLUME)
+    return result is not None and result.returncode == 0
+
+
+def scraper_entrypoint():
+    """ENTRYPOINT ของ image (ใช้กับ docker exec) — None ถ้ายังไม่มี image"""
+    result = _docker('image', 'inspect', '--format', '{{json .Config.Entrypoint}}', SCRAPER_IMAGE)
+    if result is None or result.returncode != 0:
+        return None
+    try:
+        entrypoint = json.loads(result.stdout.strip() or 'null')
+    except ValueError:
+        return None
+    return entrypoint or None
+
+
+def ensure_warm_container(work_dir):
+    """
+    เปิด container ค้างไว้ (sleep) ให้ docker exec scraper ได้ทันที — คืน entrypoint หรือ None (ใช้ docker run แทน)
+    container เดิมที่ mount work_dir เดียวกันและยังรันอยู่ถูกใช้ซ้ำ
+    """
+    entrypoint = scraper_entrypoint()
+    if not entrypoint:
+        return None
+
+    result = _docker('inspect', WARM_CONTAINER)
+    if result is not None and result.returncode == 0:
+        try:
+            info = json.loads(result.stdout)[0]
+            running = info.get('State', {}).get('Running')
+            mounts = {
+                m.get('Destination'): m.get('Name') if m.get('Type') == 'volume' else m.get('Source')
+                for m in info.get('Mounts', [])
+            }
+            if running and mounts.get('/work') == work_dir and mounts.get(CACHE_MOUNT) == CACHE_VOLUME:
+                return entrypoint
+        except (ValueError, IndexError):
+            pass
+        _docker('rm', '-f', WARM_CONTAINER)
+
+    result = _docker(
+        'run', '-d', '--name', WARM_CONTAINER,
+        '-v', f"{CACHE_VOLUME}:{CACHE_MOUNT}",
+        '-v', f"{work_dir}:/work",
+        '--entrypoint', 'sleep',
+        SCRAPER_IMAGE, 'infinity',
+    )
+    if result is None or result.returncode != 0:
+        return None
+    return entrypoint
+
+
+def stop_warm_container():
+    """ปิด container ที่เปิดค้างไว้ (volume ยังอยู่ — ครั้งหน้าไม่ต้องดาวน์โหลดใหม่)"""
+    result = _docker('rm', '-f', WARM_CONTAINER)
+    return result is not None and result.returncode == 0
+
+
+def install_stop_handler():
+    """
+    SIGTERM (ยกเลิก job จาก pipeline_jobs.py) → SystemExit ให้ finally ของ runner ปิด container ที่ยังรัน
+    Windows: CTRL_BREAK_EVENT มาเป็น SIGBREAK
+    """
+    def stop(signum, frame):
+        raise SystemExit(128 + signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    if hasattr(signal, 'SIGBREAK'):
+        signal.signal(signal.SIGBREAK, stop)
+
+
+def shard_container_name(shard_no):
+    return f"{SHARD_CONTAINER_PREFIX}-{os.getpid()}-{shard_no}"
+
+
+def build_scraper_cmd(work_dir, queries_file, results_file, depth, exit_on_inactivity='3m', entrypoint=None,
+                      extra_args=None, name=None):
+    """
+    คำสั่งรัน scraper 1 ตัว (queries_file / results_file เป็น path relative กับ work_dir)
+    entrypoint: ถ้ามี = docker exec ใน warm container, ไม่งั้น docker run --rm (mount cache volume เหมือนกัน)
+    extra_args: args เพิ่มของ scraper เช่น ['-geo', '13.75,100.5', '-zoom', '15']
+    name: ชื่อ container ของ docker run (ไม่ใช้กับ docker exec)
+    """
+    scraper_args = [
+        "-input",
+        f"/work/{queries_file}",
+        "-results",
+        f"/work/{results_file}",
+        "-depth",
+        str(depth),
+        "-exit-on-inactivity",
+        exit_on_inactivity,
+    ] + list(extra_args or [])
+    if entrypoint:
+        return ["docker", "exec", WARM_CONTAINER] + list(entrypoint) + scraper_args
+    return [
+        "docker",
+        "run",
+        "--rm",
+    ] + (["--name", name] if name else []) + [
+        "-v",
+        f"{CACHE_VOLUME}:{CACHE_MOUNT}",
+        "-v",
+        f"{work_dir}:/work",
+        SCRAPER_IMAGE,
+    ] + scraper_args
+
+
+def record_runs(db_path, runs):
+    """บันทึกเวลา startup/elapsed ของแต่ละ shard ลง stage1_runs"""
+    conn = pipeline_db.connect(db_path)
+    try:
+        conn.executemany("""
+            INSERT INTO stage1_runs (run_started_at, shard, shards, mode, startup_seconds, elapsed_seconds, returncode)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, runs)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def read_queries(path):
+    """อ่าน queries (1 บรรทัด = 1 query, ข้ามบรรทัดว่าง/ซ้ำ)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return list(dict.fromkeys(line.strip() for line in f if line.strip()))
+
+
+def split_queries(queries, shards):
+    """แบ่งแบบ round-robin → list ของ shard (ไม่มี shard ว่าง)"""
+    shards = max(1, min(shards, len(queries)))
+    return [queries[i::shards] for i in range(shards)]
+
+
+def read_result_ids(path):
+    """set ของ place_id ในไฟล์ผลของ scraper (key เดียวกับ csv_to_sqlite.py)"""
+    csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+    ids = set()
+    try:
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            for row in csv.DictReader(f):
+                place_id = row.get('place_id') or row.get('cid')
+                if place_id:
+                    ids.add(place_id)
+    except OSError:
+        pass
+    return ids
+
+
+def _pump(shard_no, stream, lines):
+    """อ่าน stdout ของ process ทีละบรรทัดส่งเข้าคิวกลาง"""
+    for line in iter(stream.readline, ''):
+        lines.put((shard_no, line.rstrip()))
+    stream.close()
+
+
+class ShardedStage1Runner:
+    def __init__(self, db_path, queries_path, shards=2, depth=2, work_dir=None, ingest_args=None,
+                 results_file=None, import_results=True, warm=True, exit_on_inactivity='3m'):
+        """
+        Args:
+            db_path: SQLite database ที่นำเข้าผล
+            queries_path: ไฟล์ queries (1 บรรทัดต่อ query)
+            shards: จำนวน containers ที่รันพร้อมกัน (ไม่เกินจำนวน queries)
+            work_dir: path ของ project ที่ Docker daemon เห็น (ตอน GUI รันใน container) — default = project root
+            ingest_args: args เพิ่มให้ csv_to_sqlite.py เช่น ['--upsert']
+            results_file: เขียนผลลงไฟล์นี้ (relative กับ project root) แทน output/shards/ — บังคับ 1 shard
+            import_results: False = ไม่นำเข้า SQLite (ให้ importer --follow อ่านเอง)
+            warm: ใช้ warm container (docker exec) ถ้าได้
+        """
+        self.db_path = db_path
+        self.queries_path = queries_path
+        self.shards = 1 if results_file else shards
+        self.depth = depth
+        self.work_dir = work_dir or PROJECT_ROOT
+        self.ingest_args = ingest_args or []
+        self.results_file = results_file
+        self.import_results = import_results
+        self.warm = warm
+        self.exit_on_inactivity = exit_on_inactivity
+
+        # Stats
+        self.stats = {}  # {shard_no: {'queries', 'returncode', 'elapsed', 'startup', 'imported'}}
+
+    def prepare_shards(self, groups=None):
+        """
+        เขียนไฟล์ queries ของแต่ละ shard คืน [(shard_no, queries_file, results_file)]
+        groups: list ของ list queries ต่อ shard (default = แบ่ง queries_path แบบ round-robin)
+        """
+        if groups is None:
+            queries = read_queries(self.queries_path)
+            groups = split_queries(queries, self.shards) if queries else []
+        if not groups:
+            return []
+
+        os.makedirs(os.path.join(PROJECT_ROOT, SHARDS_DIR), exist_ok=True)
+        self.stats = {}
+        shard_files = []
+        for shard_no, shard_queries in enumerate(groups, 1):
+            queries_file = f"{SHARDS_DIR}/queries_{shard_no}.txt"
+            results_file = self.results_file or f"{SHARDS_DIR}/results_{shard_no}.csv"
+            os.makedirs(os.path.dirname(os.path.join(PROJECT_ROOT, results_file)), exist_ok=True)
+            with open(os.path.join(PROJECT_ROOT, queries_file), 'w', encoding='utf-8') as f:
+                f.write("\n".join(shard_queries))
+            # ไฟล์ผลรอบก่อนต้องไม่ถูกนำเข้าซ้ำ
+            open(os.path.join(PROJECT_ROOT, results_file), 'w', encoding='utf-8').close()
+            shard_files.append((shard_no, queries_file, results_file))
+            self.stats[shard_no] = {
+                'queries': len(shard_queries), 'returncode': None, 'elapsed': 0.0, 'startup': None,
+                'imported': not self.import_results, 'results_file': results_file,
+            }
+        return shard_files
+
+    def log(self, shard_no, message):
+        print(f"[SHARD {shard_no}/{len(self.stats)}] {message}", flush=True)
+
+    def import_shard(self, shard_no, results_file):
+        """นำเข้าผลของ shard ที่จบแล้ว (dedupe ด้วย place_id ใน csv_to_sqlite.py)"""
+        cmd = [
+            sys.executable, os.path.join(PROJECT_ROOT, 'scripts', 'csv_to_sqlite.py'),
+            os.path.join(PROJECT_ROOT, results_file), self.db_path,
+        ] + self.ingest_args
+        # progress ของ importer ไม่ปนกับ progress ของ Stage 1 (นับเป็น shard)
+        env = {k: v for k, v in os.environ.items() if k != PROGRESS_ENV}
+        result = subprocess.run(cmd, cwd=PROJECT_ROOT, capture_output=True, text=True, encoding='utf-8', errors='ignore',
+                                env=env)
+        for line in result.stdout.splitlines():
+            if line.strip().startswith(('- Inserted', '- Updated', '- Skipped', '- Unchanged', '[ERROR]')):
+                self.log(shard_no, f"[IMPORT] {line.strip()}")
+        return result.returncode == 0
+
+    def run(self, groups=None, max_parallel=None, shard_args=None):
+        """
+        รันทุก shard พร้อมกัน (ไม่เกิน max_parallel containers) นำเข้าทีละ shard ที่จบ
+        shard_args: list ของ args เพิ่มของ scraper ต่อ shard (ลำดับเดียวกับ groups)
+        คืน True ถ้าทุก shard สำเร็จ
+        """
+        shard_files = self.prepare_shards(groups)
+        if not shard_files:
+            print(f"[ERROR] No queries in {self.queries_path}")
+            return False
+
+        entrypoint = None
+        if self.warm and ensure_cache_volume():
+            entrypoint = ensure_warm_container(self.work_dir)
+        mode = 'warm' if entrypoint else 'cold'
+        run_started_at = int(time.time())
+        print(f"[START] Stage 1: {len(shard_files)} shard(s), depth {self.depth}, {mode} container", flush=True)
+        if entrypoint:
+            print(f"[INFO] Reusing container {WARM_CONTAINER} (cache volume {CACHE_VOLUME})", flush=True)
+
+        lines = queue.Queue()
+        running = {}  # shard_no → (process, results_file, start_time, reader thread)
+        pending = list(shard_files)
+        max_parallel = max_parallel or len(shard_files)
+        # progress นับเป็น shard (ไม่รู้จำนวน place ล่วงหน้า) — shard จบไม่บ่อย ไม่ต้อง throttle
+        progress = ProgressReporter('stage1', min_interval=0)
+        progress.report(0, total=len(shard_files))
+
+        def start_next():
+            shard_no, queries_file, results_file = pending.pop(0)
+            cmd = build_scraper_cmd(
+                self.work_dir, queries_file, results_file, self.depth, self.exit_on_inactivity, entrypoint,
+                shard_args[shard_no - 1] if shard_args else None, shard_container_name(shard_no),
+            )
+            process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                cwd=PROJECT_ROOT,
+                text=True,
+                encoding='utf-8',
+                errors='ignore',
+                bufsize=1,
+            )
+            reader = threading.Thread(target=_pump, args=(shard_no, process.stdout, lines), daemon=True)
+            reader.start()
+            running[shard_no] = (process, results_file, time.time(), reader)
+            self.log(shard_no, f"[START] {self.stats[shard_no]['queries']} queries → {results_file}")
+
+        try:
+            while pending and len(running) < max_parallel:
+                start_next()
+
+            while running:
+                try:
+                    shard_no, line = lines.get(timeout=1)
+                    if line:
+                        self.log(shard_no, line)
+                        self.note_startup(shard_no, line, running)
+                except queue.Empty:
+                    pass
+
+                for shard_no, (process, results_file, start_time, reader) in list(running.items()):
+                    if process.poll() is None:
+                        continue
+                    reader.join(timeout=5)
+                    # log ที่เหลือของ shard นี้
+                    while not lines.empty():
+                        other_no, line = lines.get_nowait()
+                        if line:
+                            self.log(other_no, line)
+                            self.note_startup(other_no, line, running)
+                    del running[shard_no]
+
+                    elapsed = time.time() - start_time
+                    self.stats[shard_no].update(returncode=process.returncode, elapsed=elapsed)
+                    if process.returncode != 0:
+                        self.log(shard_no, f"[FAILED] exit code {process.returncode} after {elapsed:.0f}s")
+                    elif self.import_results:
+                        self.log(shard_no, f"[DONE] scraped in {elapsed:.0f}s — importing...")
+                        self.stats[shard_no]['imported'] = self.import_shard(shard_no, results_file)
+                        self.log(shard_no, "[OK] imported" if self.stats[shard_no]['imported'] else "[ERROR] import failed")
+                    else:
+                        self.log(shard_no, f"[DONE] scraped in {elapsed:.0f}s → {results_file}")
+
+                    finished = [s for s in self.stats.values() if s['returncode'] is not None]
+                    succeeded = sum(1 for s in finished if s['returncode'] == 0 and s['imported'])
+                    progress.report(len(finished), succeeded, len(finished) - succeeded, total=len(shard_files))
+
+                    while pending and len(running) < max_parallel:
+                        start_next()
+        except BaseException:
+            # ถูกหยุดกลางทาง (SIGTERM / Ctrl+C) → ปิด scraper ใน container ด้วย
+            # (docker CLI อยู่ใน process group เดียวกัน อาจโดนสัญญาณและจบไปก่อนแล้ว)
+            started = [shard[0] for shard in shard_files if shard not in pending]
+            self.stop_shards(started, running, warm=bool(entrypoint))
+            raise
+
+        ok = all(s['returncode'] == 0 and s['imported'] for s in self.stats.values())
+
+        try:
+            record_runs(self.db_path, [
+                (run_started_at, shard_no, len(self.stats), mode, s['startup'], s['elapsed'], s['returncode'])
+                for shard_no, s in sorted(self.stats.items())
+            ])
+        except Exception as e:
+            print(f"[WARNING] Could not record Stage 1 run: {e}")
+
+        print(f"\n{'='*60}")
+        for shard_no, s in sorted(self.stats.items()):
+            state = 'OK' if s['returncode'] == 0 and s['imported'] else 'FAILED'
+            startup = f"{s['startup']:.0f}s" if s['startup'] is not None else '-'
+            print(f"[SHARD {shard_no}/{len(self.stats)}] {state} — {s['queries']} queries, {s['elapsed']:.0f}s (startup {startup}, {mode})")
+        print(f"{'='*60}")
+        return ok
+
+    def stop_shards(self, shard_nos, running, warm):
+        """
+        หยุด scraper ของ shard ที่เริ่มไปแล้ว — kill แค่ docker CLI ไม่พอ:
+        docker exec ไม่ส่ง signal เข้า container → ปิด warm container (cache volume ยังอยู่),
+        docker run → rm -f container ตามชื่อของ shard (ที่จบแล้ว/ไม่มี = ไม่เป็นไร)
+        """
+        for shard_no in shard_nos:
+            self.log(shard_no, "[STOP] stopping scraper")
+            if not warm:
+                _docker('rm', '-f', shard_container_name(shard_no), timeout=30)
+        if warm:
+            stop_warm_container()
+        for process, _results_file, _start_time, _reader in running.values():
+            if process.poll() is None:
+                process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        running.clear()
+
+    def note_startup(self, shard_no, line, running):
+        """บรรทัดแรกที่ไม่ใช่ log ดาวน์โหลด driver/browser = startup เสร็จ"""
+        if self.stats[shard_no]['startup'] is not None or shard_no not in running:
+            return
+        if not STARTUP_LINE.search(line):
+            self.stats[shard_no]['startup'] = time.time() - running[shard_no][2]
+
+
+class AdaptiveDepthController:
+    def __init__(self, runner, min_new=10, max_depth=5):
+        """
+        Args:
+            runner: ShardedStage1Runner (ใช้ db_path, shards = จำนวน containers พร้อมกัน)
+            min_new: place ใหม่ขั้นต่ำที่ depth ล่าสุดต้องได้ ถึงจะลอง depth ถัดไป
+            max_depth: depth สูงสุด
+        """
+        self.runner = runner
+        self.min_new = min_new
+        self.max_depth = max_depth
+
+        # Stats
+        self.stats = {}  # {query: {'depth', 'results', 'stopped'}}
+
+    def load_curves(self, queries):
+        """{query: {depth: new_results}} จากรอบก่อน"""
+        conn = pipeline_db.connect(self.runner.db_path)
+        try:
+            curves = {}
+            for query, depth, new_results in conn.execute(
+                f"SELECT query, depth, new_results FROM query_yield WHERE query IN ({','.join('?' * len(queries))})",
+                queries,
+            ):
+                curves.setdefault(query, {})[depth] = new_results
+            return curves
+        finally:
+            conn.close()
+
+    def start_depth(self, curve):
+        """depth ลึกสุดที่รอบก่อนยังคุ้ม (new ≥ min_new) — ไม่มีประวัติเริ่มที่ 1"""
+        productive = [depth for depth, new_results in curve.items() if new_results is not None and new_results >= self.min_new]
+        return min(max(productive, default=1), self.max_depth)
+
+    def record_yield(self, rows):
+        conn = pipeline_db.connect(self.runner.db_path)
+        try:
+            conn.executemany("""
+                INSERT INTO query_yield (query, depth, results, new_results)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(query, depth) DO UPDATE SET
+                    results = excluded.results,
+                    new_results = COALESCE(excluded.new_results, query_yield.new_results),
+                    measured_at = strftime('%s', 'now')
+            """, rows)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def run(self):
+        """รันเป็นรอบ ๆ ตาม depth — คืน True ถ้าทุกรอบสำเร็จ"""
+        queries = read_queries(self.runner.queries_path)
+        if not queries:
+            print(f"[ERROR] No queries in {self.runner.queries_path}")
+            return False
+
+        curves = self.load_curves(queries)
+        depth_of = {q: self.start_depth(curves.get(q, {})) for q in queries}
+        seen = {q: set() for q in queries}
+        ok = True
+
+        while depth_of:
+            depth = min(depth_of.values())
+            wave = [q for q in queries if depth_of.get(q) == depth]
+            print(f"\n[ADAPTIVE] depth {depth}: {len(wave)} quer{'y' if len(wave) == 1 else 'ies'}", flush=True)
+
+            self.runner.depth = depth
+            # 1 query ต่อ shard เพื่อวัด yield แยกราย query, containers พร้อมกันไม่เกิน runner.shards
+            ok = self.runner.run(groups=[[q] for q in wave], max_parallel=self.runner.shards) and ok
+
+            rows = []
+            for shard_no, query in enumerate(wave, 1):
+                shard = self.runner.stats[shard_no]
+                ids = read_result_ids(os.path.join(PROJECT_ROOT, shard['results_file'])) if shard['returncode'] == 0 else set()
+                measured = depth == 1 or bool(seen[query])  # เริ่มที่ depth > 1 จากประวัติ = ยังไม่มีฐานให้เทียบ
+                new_count = len(ids - seen[query])
+                seen[query] |= ids
+                if shard['returncode'] == 0:
+                    rows.append((query, depth, len(ids), new_count if measured else None))
+                self.stats[query] = {'depth': depth, 'results': len(seen[query]), 'stopped': ''}
+                gain = f"+{new_count} new" if measured else "no baseline"
+
+                if shard['returncode'] != 0:
+                    reason = 'failed'
+                elif depth >= self.max_depth:
+                    reason = 'max depth'
+                elif measured and new_count < self.min_new:
+                    reason = f"+{new_count} new < {self.min_new}"
+                elif curves.get(query, {}).get(depth + 1) is not None and curves[query][depth + 1] < self.min_new:
+                    reason = 'saturated last run'  # รอบก่อน depth ถัดไปไม่คุ้ม
+                else:
+                    depth_of[query] = depth + 1
+                    print(f"[ADAPTIVE] \"{query}\" depth {depth}: {len(ids)} results, {gain} → deepen", flush=True)
+                    continue
+
+                del depth_of[query]
+                self.stats[query]['stopped'] = reason
+                print(f"[ADAPTIVE] \"{query}\" depth {depth}: {len(ids)} results, {gain} → stop ({reason})", flush=True)
+
+            try:
+                self.record_yield(rows)
+            except Exception as e:
+                print(f"[WARNING] Could not record query yield: {e}")
+
+        print(f"\n{'='*60}")
+        for query, s in self.stats.items():
+            print(f"[ADAPTIVE] {query}: depth {s['depth']}, {s['results']} places ({s['stopped']})")
+        print(f"{'='*60}")
+        return ok
+
+
+def prewarm(db_path, work_dir=None):
+    """
+    เตรียม cache volume + warm container แล้วรัน scraper กับ queries ว่าง 1 ครั้ง
+    เพื่อให้ดาวน์โหลด driver/browser ลง volume ก่อนผู้ใช้กด START (GUI เรียกตอนเปิดแอป)
+    """
+    work_dir = work_dir or PROJECT_ROOT
+    if not ensure_cache_volume():
+        print("[ERROR] Could not create Docker volume — is Docker running?")
+        return False
+    entrypoint = ensure_warm_container(work_dir)
+    if not entrypoint:
+        print(f"[WARNING] {SCRAPER_IMAGE} not available for warm start (docker pull {SCRAPER_IMAGE})")
+        return False
+
+    os.makedirs(os.path.join(PROJECT_ROOT, SHARDS_DIR), exist_ok=True)
+    queries_file = f"{SHARDS_DIR}/prewarm_queries.txt"
+    results_file = f"{SHARDS_DIR}/prewarm_results.csv"
+    open(os.path.join(PROJECT_ROOT, queries_file), 'w', encoding='utf-8').close()
+
+    print(f"[INFO] Pre-warming {WARM_CONTAINER} (cache volume {CACHE_VOLUME})...", flush=True)
+    started = time.time()
+    cmd = build_scraper_cmd(work_dir, queries_file, results_file, 1, '10s', entrypoint)
+    result = subprocess.run(cmd, cwd=PROJECT_ROOT, capture_output=True, text=True, encoding='utf-8', errors='ignore')
+    elapsed = time.time() - started
+    for line in result.stdout.splitlines()[-10:]:
+        print(f"   {line}")
+
+    try:
+        record_runs(db_path, [(int(started), 1, 1, 'prewarm', elapsed, elapsed, result.returncode)])
+    except Exception as e:
+        print(f"[WARNING] Could not record pre-warm: {e}")
+    print(f"[OK] Pre-warm finished in {elapsed:.0f}s (exit code {result.returncode})")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stage 1: Google Maps Scraper (sharded Docker containers)')
+    parser.add_argument('--db', default='pipeline.db', help='SQLite database path')
+    parser.add_argument('--queries', default='config/queries.txt', help='ไฟล์ queries (1 บรรทัดต่อ query)')
+    parser.add_argument('--shards', type=int, default=2, help='จำนวน containers ที่รันพร้อมกัน')
+    parser.add_argument('--depth', type=int, default=2, help='Search depth ของ scraper')
+    parser.add_argument('--work-dir', help='path ของ project ที่ Docker daemon เห็น (default: project root)')
+    parser.add_argument('--upsert', action='store_true', help='นำเข้าแบบ upsert (อัปเดต place ที่ข้อมูลเปลี่ยน)')
+    parser.add_argument('--results-file', help='เขียนผลลงไฟล์นี้ (relative กับ project root) แทน output/shards/ — 1 shard')
+    parser.add_argument('--no-import', action='store_true', help='ไม่นำเข้า SQLite (ใช้คู่กับ csv_to_sqlite.py --follow)')
+    parser.add_argument('--cold', action='store_true', help='ไม่ใช้ warm container (docker run --rm ทุกครั้ง)')
+    parser.add_argument('--prewarm', action='store_true', help='เตรียม cache volume + warm container แล้วจบ')
+    parser.add_argument('--stop-warm', action='store_true', help='ปิด warm container (cache volume ยังอยู่)')
+    parser.add_argument('--adaptive', action='store_true', help='เพิ่ม depth เฉพาะ query ที่ยังได้ place ใหม่ (--depth = depth สูงสุด)')
+    parser.add_argument('--min-new', type=int, default=10, help='adaptive: place ใหม่ขั้นต่ำต่อ depth ที่จะลอง depth ถัดไป')
+    args = parser.parse_args()
+    install_stop_handler()
+
+    if args.adaptive and args.results_file:
+        parser.error('--adaptive ใช้กับ --results-file ไม่ได้ (ต้องแยกไฟล์ผลต่อ query)')
+
+    if args.stop_warm:
+        print("[OK] Warm container removed" if stop_warm_container() else "[INFO] No warm container")
+        return
+    if args.prewarm:
+        if not prewarm(os.path.abspath(args.db), args.work_dir):
+            sys.exit(1)
+        return
+
+    print("=" * 60)
+    print("Stage 1: Google Maps Scraper (Sharded) 🐳")
+    print("=" * 60)
+
+    runner = ShardedStage1Runner(
+        db_path=os.path.abspath(args.db),
+        queries_path=args.queries,
+        shards=args.shards,
+        depth=args.depth,
+        work_dir=args.work_dir,
+        ingest_args=['--upsert'] if args.upsert else [],
+        results_file=args.results_file,
+        import_results=not args.no_import,
+        warm=not args.cold,
+    )
+    if args.adaptive:
+        ok = AdaptiveDepthController(runner, min_new=args.min_new, max_depth=args.depth).run()
+    else:
+        ok = runner.run()
+    if not ok:
+        print("\n[ERROR] Stage 1 completed with failures")
+        sys.exit(1)
+
+    print("\n[DONE] Stage 1 completed! ✅")
+
+
+if __name__ == "__main__":
+    main()
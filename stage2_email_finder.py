@@ -7,8 +7,7 @@ Stage 2: Email Finder - PLAYWRIGHT VERSION 🚀
 - รัน JavaScript ได้
 """
 import sys
-import sqlite3
-import json
+import os
 import re
 import time
 import argparse
@@ -16,6 +15,10 @@ from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
 from email_validator import validate_email, EmailNotValidError
 from playwright.sync_api import sync_playwright
+from pipeline_db import connect as pipeline_db_connect, load_raw_data, classify_website
+from fetch_ledger import FetchLedger
+from page_archive import PageArchive, DEFAULT_ARCHIVE_PATH
+from progress_events import ProgressReporter
 
 # Fix Windows console encoding
 if sys.platform == 'win32':
@@ -26,9 +29,15 @@ if sys.platform == 'win32':
 
 
 class EmailFinderPlaywright:
-    def __init__(self, db_path, verbose=False):
+    def __init__(self, db_path, verbose=False, ledger_ttl=24, archive_path=None, reextract=False):
         self.db_path = db_path
         self.verbose = verbose
+        self.ledger_ttl = ledger_ttl  # ชั่วโมง, 0 = ไม่ใช้ fetch ledger
+        self.ledger = None
+        self.archive_path = archive_path or (DEFAULT_ARCHIVE_PATH if reextract else None)
+        self.archive = None
+        self.reextract = reextract  # True = อ่าน HTML จาก archive แทนการเปิด browser
+        self.emails_saved = 0  # อีเมลใหม่ที่บันทึก (ไม่นับที่มีอยู่แล้ว) — ส่งใน progress event
         
         # Settings
         self.page_timeout = 8000  # 8 seconds
@@ -49,13 +58,19 @@ class EmailFinderPlaywright:
     
     def connect_db(self):
         """Connect to SQLite database"""
-        self.conn = sqlite3.connect(self.db_path)
+        self.conn = pipeline_db_connect(self.db_path)
         self.cursor = self.conn.cursor()
+        if self.ledger_ttl and not self.reextract:
+            self.ledger = FetchLedger(self.conn, 'STAGE2', ttl_hours=self.ledger_ttl)
+        if self.archive_path:
+            self.archive = PageArchive(self.archive_path)
         if self.verbose:
             print(f"[OK] Connected to database: {self.db_path}")
     
     def close_db(self):
         """Close database connection"""
+        if self.archive:
+            self.archive.close()
         if hasattr(self, 'conn') and self.conn:
             self.conn.close()
             if self.verbose:
@@ -115,36 +130,37 @@ class EmailFinderPlaywright:
     # ==================== Invalid Website Check ====================
     
     def is_invalid_website(self, website_url):
-        """ตรวจสอบว่า website เป็น Facebook/LINE หรือไม่"""
-        if not website_url or not isinstance(website_url, str):
-            return True
-        
-        url_lower = website_url.lower()
-        
-        # Skip Facebook/LINE/Instagram
-        invalid_domains = ['facebook.com', 'fb.com', 'fb.me', 'line.me', 'lin.ee', 'instagram.com']
-        for domain in invalid_domains:
-            if domain in url_lower:
-                return True
-        
-        return False
+        """ตรวจสอบว่า website เป็น Facebook/LINE/Instagram (หรือว่าง) หรือไม่"""
+        return classify_website(website_url)[0] != 'site'
     
     # ==================== Phase 1: Read & Lock ====================
     
     def get_new_records(self, limit=None):
         """Get records with status='NEW'"""
-        sql = "SELECT place_id, name, website, raw_data FROM places WHERE status='NEW'"
+        sql = "SELECT place_id, name, website, website_kind FROM places WHERE status='NEW'"
         if limit:
             sql += f" LIMIT {limit}"
         
         self.cursor.execute(sql)
         records = self.cursor.fetchall()
         
-        if self.verbose:
+        if self.verbose and records:
             print(f"[INFO] Found {len(records)} records with status='NEW'")
         
         return records
     
+    def wait_for_new_records(self, stop_file, limit=None, poll_interval=5):
+        """
+        Follow mode: รอ place ใหม่ที่ importer (csv_to_sqlite.py --follow) เพิ่งใส่
+        คืน [] เมื่อมี stop_file แล้ว (ingest จบ) และไม่มี NEW เหลือ
+        """
+        while True:
+            finished = os.path.exists(stop_file)  # เช็คก่อน query — แถวสุดท้ายถูก commit ก่อนสร้าง stop file
+            records = self.get_new_records(limit)
+            if records or finished:
+                return records
+            time.sleep(poll_interval)
+    
     def lock_record(self, place_id):
         """UPDATE status='PROCESSING'"""
         self.cursor.execute(
@@ -155,10 +171,10 @@ class EmailFinderPlaywright:
     
     # ==================== Phase 2: Extract from Maps Data ====================
     
-    def extract_from_maps_data(self, raw_data_json):
-        """Parse raw_data JSON และดึงอีเมล"""
+    def extract_from_maps_data(self, place_id):
+        """อ่าน raw data ของ place (place_raw_data) และดึงอีเมล"""
         try:
-            raw_data = json.loads(raw_data_json)
+            raw_data = load_raw_data(self.conn, place_id)
             emails_str = raw_data.get('emails', '')
             
             if emails_str and isinstance(emails_str, str) and emails_str.strip():
@@ -230,26 +246,46 @@ class EmailFinderPlaywright:
                 print(f"   [WARNING] Save discovered URL error: {e}")
             return False
     
+    def save_facebook_urls(self, place_id, facebook_urls):
+        """บันทึก Facebook URLs ที่เจอบนหน้าเว็บลง discovered_urls"""
+        if place_id and facebook_urls:
+            if self.verbose:
+                print(f"   [FOUND] {len(facebook_urls)} Facebook URL(s) → saving to discovered_urls")
+            for fb_url in facebook_urls:
+                self.save_discovered_url(place_id, fb_url, 'FACEBOOK')
+    
     def crawl_page(self, url, place_id=None):
-        """ดึงอีเมลจากหน้า URL ด้วย Playwright"""
+        """ดึงอีเมลจากหน้า URL ด้วย Playwright (ใช้ผลจาก fetch ledger ถ้ามี stage ไหน render ไปแล้ว)"""
         try:
-            # Navigate with fast settings
-            self.page.goto(url, wait_until='commit', timeout=self.page_timeout)
-            
-            # Wait for content
-            self.page.wait_for_timeout(self.wait_time)
+            entry = self.ledger.lookup(url) if self.ledger else None
+            if entry:
+                if self.verbose:
+                    print(f"   [LEDGER] Reuse {entry['fetched_by']} fetch of {entry['final_url']}")
+                self.save_facebook_urls(place_id, [link for link, url_type in entry['links'] if url_type == 'FACEBOOK'])
+                # Stage 3 บันทึกอีเมลดิบจาก regex → validate ก่อนใช้
+                return list({e for e in map(self.validate_email, entry['emails']) if e})
             
-            # Get page content
-            html = self.page.content()
+            if self.reextract:
+                # Replay จาก archive (ไม่มี browser)
+                html = self.archive.latest(url)
+                if html is None:
+                    return []
+            else:
+                # Navigate with fast settings (ไป final URL ตรงๆ ถ้าเคย redirect)
+                nav_url = self.ledger.resolve(url) if self.ledger else url
+                self.page.goto(nav_url, wait_until='commit', timeout=self.page_timeout)
+                
+                # Wait for content
+                self.page.wait_for_timeout(self.wait_time)
+                
+                # Get page content
+                html = self.page.content()
+                if self.archive:
+                    self.archive.store(url, self.page.url, html, 'STAGE2')
             
             # 🔗 NEW: Find and save Facebook URLs
-            if place_id:
-                facebook_urls = self.find_facebook_urls(html)
-                if facebook_urls:
-                    if self.verbose:
-                        print(f"   [FOUND] {len(facebook_urls)} Facebook URL(s) → saving to discovered_urls")
-                    for fb_url in facebook_urls:
-                        self.save_discovered_url(place_id, fb_url, 'FACEBOOK')
+            facebook_urls = self.find_facebook_urls(html)
+            self.save_facebook_urls(place_id, facebook_urls)
             
             # Parse with BeautifulSoup
             soup = BeautifulSoup(html, 'lxml')
@@ -274,13 +310,21 @@ class EmailFinderPlaywright:
                 if validated:
                     valid_emails.append(validated)
             
-            return list(set(valid_emails))
+            valid_emails = list(set(valid_emails))
+            if self.ledger:
+                self.ledger.record(url, self.page.url, valid_emails, [(fb_url, 'FACEBOOK') for fb_url in facebook_urls])
+            return valid_emails
             
         except Exception as e:
             if self.verbose:
                 print(f"   [WARNING] Error: {str(e)[:50]}")
             return []
     
+    def pause(self):
+        """หน่วงระหว่างหน้า (ตอน replay จาก archive ไม่ต้องหน่วง)"""
+        if not self.reextract:
+            time.sleep(0.5)
+    
     def crawl_website(self, website_url, place_id):
         """Crawl website - PLAYWRIGHT VERSION"""
         if not website_url or not isinstance(website_url, str):
@@ -308,7 +352,7 @@ class EmailFinderPlaywright:
                 print(f"   [OK] Phase 3.1: Found {len(homepage_emails)} emails")
             return emails
         
-        time.sleep(0.5)
+        self.pause()
         
         # Phase 3.2: Contact Page
         contact_urls = [
@@ -325,7 +369,7 @@ class EmailFinderPlaywright:
                 if self.verbose:
                     print(f"   [OK] Phase 3.2: Found {len(contact_emails)} emails")
                 return emails
-            time.sleep(0.5)
+            self.pause()
         
         # Phase 3.3: About Page
         about_urls = [
@@ -342,7 +386,7 @@ class EmailFinderPlaywright:
                 if self.verbose:
                     print(f"   [OK] Phase 3.3: Found {len(about_emails)} emails")
                 return emails
-            time.sleep(0.5)
+            self.pause()
         
         return emails
     
@@ -363,6 +407,7 @@ class EmailFinderPlaywright:
                 "INSERT OR IGNORE INTO emails (place_id, email, source) VALUES (?, ?, ?)",
                 (place_id, email, source)
             )
+            self.emails_saved += self.cursor.rowcount
             self.conn.commit()
             return True
         except Exception as e:
@@ -382,8 +427,8 @@ class EmailFinderPlaywright:
     
     # ==================== Main Processing ====================
     
-    def process_record(self, place_id, name, website, raw_data_json):
-        """Process 1 record"""
+    def process_record(self, place_id, name, website, website_kind='site'):
+        """Process 1 record (website_kind จาก places — crawl เฉพาะ 'site')"""
         if self.verbose:
             print(f"\n{'='*60}")
             print(f"[PROCESSING] {name} (ID: {place_id})")
@@ -400,13 +445,13 @@ class EmailFinderPlaywright:
             # Phase 2: Extract from Maps Data
             if self.verbose:
                 print(f"   [SEARCH] Phase 2: Maps Data...")
-            maps_emails = self.extract_from_maps_data(raw_data_json)
+            maps_emails = self.extract_from_maps_data(place_id)
             if maps_emails:
                 emails_found = maps_emails
                 source = 'MAPS'
             
             # Phase 3: Crawl Website (if not found yet)
-            if not emails_found and website:
+            if not emails_found and website_kind == 'site':
                 if self.verbose:
                     print(f"   [SEARCH] Phase 3: Website...")
                 website_emails = self.crawl_website(website, place_id)  # Pass place_id
@@ -438,58 +483,132 @@ class EmailFinderPlaywright:
             self.finalize_record(place_id, 'FAILED')
             return False
     
-    def run(self, limit=None):
-        """Main run method"""
+    def run(self, limit=None, follow_stop_file=None):
+        """
+        Main run method
+        follow_stop_file: รอ place ใหม่จาก importer ที่ tail CSV ของ Stage 1 จนกว่าไฟล์นี้จะถูกสร้าง
+        """
         start_time = time.time()
+        progress = ProgressReporter('stage2')
         
         # Connect to database
         self.connect_db()
         
         try:
             # Get records
-            records = self.get_new_records(limit)
+            if follow_stop_file:
+                print(f"[FOLLOW] Waiting for new places until {follow_stop_file} exists...")
+                records = self.wait_for_new_records(follow_stop_file, limit)
+            else:
+                records = self.get_new_records(limit)
             
             if not records:
                 print("[INFO] No records to process (status='NEW')")
+                progress.finish(0, total=0)
                 return
             
-            print(f"[START] Processing {len(records)} records...\n")
-            
-            # Initialize browser
-            self.init_browser()
-            
             success_count = 0
             failed_count = 0
+            processed = 0
             
-            # Process records sequentially
-            for idx, (place_id, name, website, raw_data_json) in enumerate(records, 1):
-                print(f"[{idx}/{len(records)}] ", end="")
+            while records:
+                print(f"[START] Processing {len(records)} records...\n")
                 
-                success = self.process_record(place_id, name, website, raw_data_json)
+                # Initialize browser (ครั้งแรกครั้งเดียว)
+                if not self.page:
+                    self.init_browser()
                 
-                if success:
-                    success_count += 1
-                else:
-                    failed_count += 1
+                # Process records sequentially
+                total = processed + len(records)
+                for idx, (place_id, name, website, website_kind) in enumerate(records, 1):
+                    print(f"[{processed + idx}/{total}] ", end="")
+                    
+                    success = self.process_record(place_id, name, website, website_kind)
+                    
+                    if success:
+                        success_count += 1
+                    else:
+                        failed_count += 1
+                    progress.report(processed + idx, success_count, failed_count, self.emails_saved, total)
+                processed += len(records)
+                
+                if not follow_stop_file or (limit and processed >= limit):
+                    break
+                records = self.wait_for_new_records(follow_stop_file, limit - processed if limit else None)
             
             elapsed = time.time() - start_time
+            progress.finish(processed, success_count, failed_count, self.emails_saved, processed)
             
             print(f"\n{'='*60}")
             print(f"[SUCCESS] {success_count} records")
             print(f"[FAILED] {failed_count} records")
-            print(f"[TIME] {elapsed:.2f} seconds ({elapsed/len(records):.2f}s per record)")
+            print(f"[TIME] {elapsed:.2f} seconds ({elapsed/processed:.2f}s per record)")
+            if self.ledger:
+                print(f"[LEDGER] {self.ledger.summary()}")
+            if self.archive:
+                print(f"[ARCHIVE] {self.archive.summary()}")
             print(f"{'='*60}")
             
         finally:
             # Cleanup
             self.close_browser()
             self.close_db()
+    
+    def run_reextract(self, limit=None):
+        """
+        Re-extract อีเมลจาก HTML ใน archive (ไม่เปิด browser)
+        ทุก place ที่มี website — เจออีเมลใหม่ → บันทึก + status='DONE' (ไม่ลด status ของ place ที่ DONE แล้ว)
+        """
+        start_time = time.time()
+        self.connect_db()
+        
+        try:
+            sql = "SELECT place_id, name, website FROM places WHERE website_kind = 'site'"
+            if limit:
+                sql += f" LIMIT {limit}"
+            self.cursor.execute(sql)
+            records = self.cursor.fetchall()
+            
+            print(f"[START] Re-extracting {len(records)} places from {self.archive_path}...\n")
+            
+            places_with_new = 0
+            new_emails = 0
+            for idx, (place_id, name, website) in enumerate(records, 1):
+                if self.verbose:
+                    print(f"[{idx}/{len(records)}] {name}")
+                emails = self.crawl_website(website, place_id)
+                if not emails:
+                    continue
+                
+                before = self.emails_saved
+                for email in emails:
+                    self.save_email(place_id, email, 'WEBSITE')
+                added = self.emails_saved - before  # rowcount ของ INSERT OR IGNORE (ไม่นับแถวที่ trigger เขียน)
+                if added:
+                    places_with_new += 1
+                    new_emails += added
+                    self.finalize_record(place_id, 'DONE')
+            
+            elapsed = time.time() - start_time
+            
+            print(f"\n{'='*60}")
+            print(f"[NEW EMAILS] {new_emails} emails ใน {places_with_new} places")
+            print(f"[ARCHIVE] {self.archive.summary()}")
+            print(f"[TIME] {elapsed:.2f} seconds")
+            print(f"{'='*60}")
+            
+        finally:
+            self.close_db()
 
 
 def main():
     parser = argparse.ArgumentParser(description='Stage 2: Email Finder (Playwright)')
     parser.add_argument('--db', default='pipeline.db', help='SQLite database path')
     parser.add_argument('--limit', type=int, help='จำกัดจำนวน records')
+    parser.add_argument('--ledger-ttl', type=float, default=24, help='อายุผล fetch ที่ใช้ซ้ำได้ (ชั่วโมง, 0 = ไม่ใช้ ledger)')
+    parser.add_argument('--archive', nargs='?', const=DEFAULT_ARCHIVE_PATH, help=f'เก็บ HTML ที่ fetch ลง archive (default: {DEFAULT_ARCHIVE_PATH})')
+    parser.add_argument('--reextract', action='store_true', help='รัน extraction ใหม่จาก archive โดยไม่เปิด browser')
+    parser.add_argument('--follow-stop-file', help='รอ place ใหม่ระหว่างที่ Stage 1 ยังรัน จนกว่าไฟล์นี้จะถูกสร้าง (ใช้คู่กับ csv_to_sqlite.py --follow)')
     parser.add_argument('--verbose', '-v', action='store_true', help='แสดงข้อความละเอียด')
     
     args = parser.parse_args()
@@ -498,8 +617,17 @@ def main():
     print("Stage 2: Email Finder - PLAYWRIGHT VERSION 🚀")
     print("=" * 60)
     
-    finder = EmailFinderPlaywright(args.db, verbose=args.verbose)
-    finder.run(limit=args.limit)
+    finder = EmailFinderPlaywright(
+        args.db,
+        verbose=args.verbose,
+        ledger_ttl=args.ledger_ttl,
+        archive_path=args.archive,
+        reextract=args.reextract,
+    )
+    if args.reextract:
+        finder.run_reextract(limit=args.limit)
+    else:
+        finder.run(limit=args.limit, follow_stop_file=args.follow_stop_file)
     
     print("\n[DONE] Stage 2 completed! ✅")
 
@@ -5,16 +5,22 @@ Stage 4: Cross-Reference Scraper 🔗
 - Scrape Facebook URLs ที่ Stage 2 เจอ
 - Scrape Website URLs ที่ Stage 3 เจอ
 - หา email เพิ่มเติม
+- Frontier: URL ใหม่ที่เจอบนหน้าที่ scrape ถูกใส่กลับเข้า discovered_urls (depth+1) จนกว่าจะถึง max depth
 """
 import sys
-import sqlite3
 import re
 import time
 import argparse
-from urllib.parse import urlparse
+from collections import deque
+from urllib.parse import urljoin, urlparse, parse_qs
 from bs4 import BeautifulSoup
 from email_validator import validate_email, EmailNotValidError
 from playwright.sync_api import sync_playwright
+from pipeline_db import connect as pipeline_db_connect
+from fetch_ledger import FetchLedger
+from facebook_page_cache import FacebookPageCache
+from page_archive import PageArchive, DEFAULT_ARCHIVE_PATH
+from progress_events import ProgressReporter
 
 # Fix Windows console encoding
 if sys.platform == 'win32':
@@ -24,17 +30,101 @@ if sys.platform == 'win32':
         pass
 
 
+# ==================== Scheduling ====================
+
+# Prior ของโอกาสเจออีเมล (ยิ่งสูง = scrape ก่อน)
+URL_TYPE_PRIOR = {'FACEBOOK': 0.6, 'WEBSITE': 0.5}
+
+# FB URL ที่ Stage 2 เจอบนเว็บของร้านเอง แม่นกว่า URL ที่ Stage 3 ดึงมาจาก HTML ของ Facebook
+STAGE_PRIOR = {'STAGE2': 1.0, 'STAGE3': 0.7, 'STAGE4': 0.8}
+
+# Hosts ที่แทบไม่เคยมีอีเมลของร้าน (CDN, social, link ระบบ)
+JUNK_HOSTS = (
+    'fbcdn.net', 'fbsbx.com', 'instagram.com', 'google.com', 'googleapis.com',
+    'gstatic.com', 'goo.gl', 'youtube.com', 'youtu.be', 'twitter.com', 'x.com',
+    'tiktok.com', 'line.me', 'lin.ee', 'w3.org', 'schema.org', 'apple.com',
+    'microsoft.com', 'cloudflare.com', 'whatsapp.com', 'messenger.com',
+)
+JUNK_FACTOR = 0.05
+
+# วิธีจัดการ URL ของ place ที่มีอีเมลแล้ว
+SATISFIED_MODES = ('defer', 'skip', 'include')
+
+
+def url_host(url):
+    """คืน host ของ URL แบบ lowercase ไม่มี www."""
+    try:
+        host = (urlparse(url).hostname or '').lower()
+    except ValueError:
+        return ''
+    return host[4:] if host.startswith('www.') else host
+
+
+def is_junk_host(host):
+    """host อยู่ใน JUNK_HOSTS (รวม subdomain) หรือไม่"""
+    return any(host == junk or host.endswith('.' + junk) for junk in JUNK_HOSTS)
+
+
+def is_facebook_host(host):
+    return host in ('facebook.com', 'fb.com', 'fb.me') or host.endswith('.facebook.com')
+
+
+def normalize_url(url):
+    """
+    Key สำหรับ visited set — URL เดียวกันที่เขียนต่างกันได้ key เดียวกัน
+    (scheme, www./m., / ท้าย, #fragment, /about ของ Facebook)
+    """
+    try:
+        parsed = urlparse((url or '').strip())
+    except ValueError:
+        return ''
+    host = (parsed.hostname or '').lower()
+    for prefix in ('www.', 'm.', 'mobile.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    path = parsed.path.rstrip('/')
+    query = ''
+    if is_facebook_host(host):
+        if path.endswith('/about'):
+            path = path[:-len('/about')]
+        if path == '/profile.php':
+            query = 'id=' + (parse_qs(parsed.query).get('id') or [''])[0]
+    return f"{host}{path.lower()}" + (f"?{query}" if query else '')
+
+
 class CrossRefScraper:
-    def __init__(self, db_path, verbose=False):
+    def __init__(self, db_path, verbose=False, ledger_ttl=24, archive_path=None, reextract=False, page_cache_ttl=168):
         self.db_path = db_path
         self.verbose = verbose
+        self.ledger_ttl = ledger_ttl  # ชั่วโมง, 0 = ไม่ใช้ fetch ledger
+        self.ledger = None
+        self.page_cache_ttl = page_cache_ttl  # ชั่วโมง, 0 = ไม่ใช้ Facebook page cache
+        self.page_cache = None
+        self.archive_path = archive_path or (DEFAULT_ARCHIVE_PATH if reextract else None)
+        self.archive = None
+        self.reextract = reextract  # True = อ่าน HTML จาก archive แทนการเปิด browser
+        self.emails_saved = 0  # อีเมลใหม่ที่บันทึก (ไม่นับที่มีอยู่แล้ว) — ส่งใน progress event
         
         # Settings
         self.page_timeout = 8000
         self.wait_time = 1500
         
+        # Frontier
+        self.max_depth = 2  # depth ของ URL ที่ Stage 2/3 เจอ = 0
+        self.max_urls_per_place = 10  # จำนวน discovered URLs สูงสุดต่อ place
+        
         # Email regex
         self.email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
+        self.phone_pattern = r'\b(?:0\d{1,2}[\s-]?\d{3}[\s-]?\d{4}|\+66[\s-]?\d{1,2}[\s-]?\d{3}[\s-]?\d{4})\b'  # เหมือน Stage 3 (เก็บลง page cache)
+        
+        # Link patterns (เหมือน Stage 2 / Stage 3)
+        self.facebook_pattern = r'https?://(?:www\.|m\.|mobile\.)?facebook\.com/[^\s\"\'>]+'
+        self.website_pattern = r'https?://(?!(?:www\.|m\.|mobile\.)?facebook\.com)[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}[^\s\"\'>]*'
+        self.contact_keywords = ('contact', 'about', 'ติดต่อ', 'เกี่ยวกับ')
+        
+        # Visited set ต่อ place: {place_id: {normalized url}}
+        self.visited = {}
         
         # Playwright objects
         self.playwright = None
@@ -44,13 +134,21 @@ class CrossRefScraper:
     
     def connect_db(self):
         """Connect to database"""
-        self.conn = sqlite3.connect(self.db_path)
+        self.conn = pipeline_db_connect(self.db_path)
         self.cursor = self.conn.cursor()
+        if self.ledger_ttl and not self.reextract:
+            self.ledger = FetchLedger(self.conn, 'STAGE4', ttl_hours=self.ledger_ttl)
+        if self.page_cache_ttl and not self.reextract:
+            self.page_cache = FacebookPageCache(self.conn, 'STAGE4', ttl_hours=self.page_cache_ttl)
+        if self.archive_path:
+            self.archive = PageArchive(self.archive_path)
         if self.verbose:
             print(f"[OK] Connected to database: {self.db_path}")
     
     def close_db(self):
         """Close database"""
+        if self.archive:
+            self.archive.close()
         if hasattr(self, 'conn') and self.conn:
             self.conn.close()
             if self.verbose:
@@ -105,18 +203,15 @@ class CrossRefScraper:
     
     # ==================== Database Operations ====================
     
-    def get_discovered_urls(self, limit=None):
-        """Get discovered URLs with status='NEW'"""
-        sql = """
-            SELECT id, place_id, url, url_type 
-            FROM discovered_urls 
-            WHERE status='NEW'
-            ORDER BY id
-        """
-        if limit:
-            sql += f" LIMIT {limit}"
-        
-        self.cursor.execute(sql)
+    def get_discovered_urls(self):
+        """Get discovered URLs with status='NEW' (+ found_by_stage, place มีอีเมลแล้วหรือยัง)"""
+        self.cursor.execute("""
+            SELECT d.id, d.place_id, d.url, d.url_type, d.depth, d.found_by_stage,
+                   EXISTS(SELECT 1 FROM emails e WHERE e.place_id = d.place_id) AS has_email
+            FROM discovered_urls d
+            WHERE d.status='NEW'
+            ORDER BY d.id
+        """)
         records = self.cursor.fetchall()
         
         if self.verbose:
@@ -124,6 +219,64 @@ class CrossRefScraper:
         
         return records
     
+    def get_host_history(self):
+        """นับ DONE/FAILED ต่อ host จากรอบก่อนๆ → {host: (done, failed)}"""
+        self.cursor.execute(
+            "SELECT url, status FROM discovered_urls WHERE status IN ('DONE', 'FAILED')"
+        )
+        history = {}
+        for url, status in self.cursor.fetchall():
+            done, failed = history.get(url_host(url), (0, 0))
+            if status == 'DONE':
+                done += 1
+            else:
+                failed += 1
+            history[url_host(url)] = (done, failed)
+        return history
+    
+    def score_url(self, url, url_type, found_by_stage, host_history):
+        """Expected yield ของ URL = prior(url_type) × prior(stage) × success rate ของ host"""
+        host = url_host(url)
+        done, failed = host_history.get(host, (0, 0))
+        # Laplace smoothing: host ที่ไม่เคยเห็นได้ 0.5
+        host_rate = (done + 1) / (done + failed + 2)
+        score = URL_TYPE_PRIOR.get(url_type, 0.1) * STAGE_PRIOR.get(found_by_stage, 0.5) * host_rate
+        if not host or is_junk_host(host):
+            score *= JUNK_FACTOR
+        return score
+    
+    def schedule_urls(self, records, satisfied='defer', limit=None):
+        """
+        เรียงลำดับ URLs: place ที่ยังไม่มีอีเมลก่อน แล้วตาม expected yield
+        satisfied='skip' → ตัด URL ของ place ที่มีอีเมลแล้วออก (คืนแยกเป็น skipped)
+        คืน (scheduled, skipped) — แต่ละตัวเป็น (url_id, place_id, url, url_type, depth)
+        """
+        host_history = self.get_host_history()
+        
+        scored = []
+        skipped = []
+        for url_id, place_id, url, url_type, depth, found_by_stage, has_email in records:
+            row = (url_id, place_id, url, url_type, depth)
+            if has_email and satisfied == 'skip':
+                skipped.append(row)
+                continue
+            score = self.score_url(url, url_type, found_by_stage, host_history)
+            deferred = bool(has_email) and satisfied == 'defer'
+            # URL ชั้นลึกกว่าได้ score ลดลง
+            score /= (1 + depth)
+            scored.append((deferred, -score, url_id, row))
+        
+        scored.sort()
+        scheduled = [item[3] for item in scored]
+        if limit:
+            scheduled = scheduled[:limit]
+        
+        if self.verbose:
+            n_deferred = sum(1 for item in scored[:len(scheduled)] if item[0])
+            print(f"[SCHEDULE] {len(scheduled)} URLs queued ({n_deferred} deferred, {len(skipped)} skipped — place มีอีเมลแล้ว)")
+        
+        return scheduled, skipped
+    
     def lock_discovered_url(self, url_id):
         """UPDATE status='PROCESSING'"""
         self.cursor.execute(
@@ -140,6 +293,43 @@ class CrossRefScraper:
         )
         self.conn.commit()
     
+    def load_visited(self):
+        """โหลด visited set ต่อ place จาก discovered_urls ทุก status + website เดิมของ place"""
+        self.visited = {}
+        self.cursor.execute("""
+            SELECT place_id, url FROM discovered_urls
+            UNION ALL
+            SELECT place_id, website FROM places WHERE website IS NOT NULL AND website != ''
+        """)
+        for place_id, url in self.cursor.fetchall():
+            self.visited.setdefault(place_id, set()).add(normalize_url(url))
+    
+    def save_frontier_urls(self, parent_id, place_id, depth, links):
+        """
+        ใส่ URL ใหม่ที่เจอบนหน้าเข้าคิว (depth+1) — ข้าม URL ที่ place นี้เคยเจอแล้ว
+        คืนจำนวน URL ที่เพิ่ม
+        """
+        if depth >= self.max_depth:
+            return 0
+        
+        visited = self.visited.setdefault(place_id, set())
+        added = 0
+        for url, url_type in links:
+            if len(visited) >= self.max_urls_per_place:
+                break
+            key = normalize_url(url)
+            if not key or key in visited:
+                continue
+            visited.add(key)
+            self.cursor.execute("""
+                INSERT OR IGNORE INTO discovered_urls
+                (place_id, url, url_type, found_by_stage, status, depth, parent_id)
+                VALUES (?, ?, ?, 'STAGE4', 'NEW', ?, ?)
+            """, (place_id, url, url_type, depth + 1, parent_id))
+            added += self.cursor.rowcount
+        self.conn.commit()
+        return added
+    
     def save_email(self, place_id, email, source):
         """Save email to emails table"""
         try:
@@ -147,6 +337,7 @@ class CrossRefScraper:
                 "INSERT OR IGNORE INTO emails (place_id, email, source) VALUES (?, ?, ?)",
                 (place_id, email, source)
             )
+            self.emails_saved += self.cursor.rowcount
             self.conn.commit()
             return True
         except Exception as e:
@@ -171,14 +362,104 @@ class CrossRefScraper:
             return url
         return f"{url}/about" if url else url
 
+    def find_facebook_urls(self, html):
+        """หา Facebook page URLs ใน HTML (กฎเดียวกับ Stage 2)"""
+        cleaned_urls = set()
+        for url in re.findall(self.facebook_pattern, html, re.IGNORECASE):
+            url = re.sub(r'[^a-zA-Z0-9]+$', '', url)
+            skip_patterns = ['/groups/', '/events/', '/hashtag/', '/share/', '/photos/', '/posts/', '/sharer', '/plugins/', '/tr?']
+            if any(skip in url.lower() for skip in skip_patterns):
+                continue
+            if url and len(url) > 25:
+                if '/profile.php?id=' in url or re.search(r'facebook\.com/[a-zA-Z0-9._-]+$', url):
+                    cleaned_urls.add(url)
+        return list(cleaned_urls)
+    
+    def find_website_urls(self, html):
+        """หา Website URLs ใน HTML ของ Facebook (ไม่รวม Facebook/CDN/social) — แกะ l.facebook.com/l.php?u= ด้วย"""
+        cleaned_urls = set()
+        for url in re.findall(self.website_pattern, html, re.IGNORECASE):
+            url = re.sub(r'[)\]\}\>\"\'\s]+$', '', url).replace('\\/', '/')
+            host = url_host(url)
+            if host == 'l.facebook.com':
+                url = (parse_qs(urlparse(url).query).get('u') or [''])[0]
+                host = url_host(url)
+            if not host or is_facebook_host(host) or is_junk_host(host):
+                continue
+            cleaned_urls.add(url.rstrip('/'))
+        return list(cleaned_urls)[:5]
+    
+    def find_contact_urls(self, html, base_url):
+        """หาลิงก์หน้า contact/about ใน host เดียวกับหน้าเว็บ"""
+        base_host = url_host(base_url)
+        soup = BeautifulSoup(html, 'lxml')
+        contact_urls = set()
+        for a in soup.find_all('a', href=True):
+            href = a['href'].strip()
+            label = f"{href} {a.get_text(' ', strip=True)}".lower()
+            if not any(keyword in label for keyword in self.contact_keywords):
+                continue
+            url = urljoin(base_url, href).split('#')[0]
+            if url.startswith(('http://', 'https://')) and url_host(url) == base_host:
+                contact_urls.add(url)
+        return list(contact_urls)[:3]
+    
+    def _ledger_entry(self, url):
+        """
+        ผล fetch ที่ stage ไหนก็ได้ render ไปแล้ว → (emails, links) หรือ None
+        Stage 3 บันทึกอีเมลดิบจาก regex → validate/normalize ก่อนใช้ เหมือนทาง page cache
+        """
+        entry = self.ledger.lookup(url) if self.ledger else None
+        if not entry:
+            return None
+        if self.verbose:
+            print(f"   [LEDGER] Reuse {entry['fetched_by']} fetch of {entry['final_url']}")
+        emails = [e for e in map(self.validate_email, entry['emails']) if e]
+        return list(set(emails)), self._filter_links(entry['links'])
+    
+    def _filter_links(self, links):
+        """Stage 3 เก็บ links แบบไม่กรอง → กรอง Facebook/CDN/social ออกเหมือน find_website_urls"""
+        return [
+            (link, url_type) for link, url_type in links
+            if url_type == 'FACEBOOK' or not (is_facebook_host(url_host(link)) or is_junk_host(url_host(link)))
+        ]
+    
+    def _fetch_html(self, url, wait_until, wait_ms):
+        """
+        HTML ของหน้า: navigate (ไป final URL ตรงๆ ถ้าเคย redirect) แล้วเก็บลง archive
+        หรือ replay จาก archive ในโหมด --reextract (None ถ้าไม่เคยเก็บ)
+        """
+        if self.reextract:
+            return self.archive.latest(url)
+        nav_url = self.ledger.resolve(url) if self.ledger else url
+        self.page.goto(nav_url, wait_until=wait_until, timeout=self.page_timeout)
+        self.page.wait_for_timeout(wait_ms)
+        html = self.page.content()
+        if self.archive:
+            self.archive.store(url, self.page.url, html, 'STAGE4')
+        return html
+    
     def scrape_facebook_url(self, fb_url):
-        """Scrape Facebook URL - ไปที่หน้า About เพื่อดึงอีเมล"""
+        """Scrape Facebook URL - ไปที่หน้า About เพื่อดึงอีเมล คืน (emails, links)"""
         try:
             about_url = self._facebook_about_url(fb_url)
-            self.page.goto(about_url, wait_until='domcontentloaded', timeout=self.page_timeout)
-            self.page.wait_for_timeout(max(self.wait_time, 2500))  # รอให้ About โหลด
+            page_result = self.page_cache.lookup(fb_url) if self.page_cache else None
+            if page_result:
+                # เพจเดียวกันที่ place อื่น (หรือ Stage 3) scrape แล้ว
+                if self.verbose:
+                    print(f"   [CACHE] Reuse {page_result['fetched_by']} result of page '{page_result['page_key']}'")
+                emails = [e for e in map(self.validate_email, page_result['emails']) if e]
+                return list(set(emails)), self._filter_links([(url, 'WEBSITE') for url in page_result['websites']])
+            cached = self._ledger_entry(about_url)
+            if cached:
+                return cached
+            
+            html = self._fetch_html(about_url, 'domcontentloaded', max(self.wait_time, 2500))  # รอให้ About โหลด
+            if html is None:
+                return [], []
             
-            html = self.page.content()
+            # Website URLs บนหน้า Facebook → frontier
+            links = [(url, 'WEBSITE') for url in self.find_website_urls(html)]
             
             # Find emails
             emails = re.findall(self.email_pattern, html, re.IGNORECASE)
@@ -191,23 +472,37 @@ class CrossRefScraper:
                 if validated:
                     valid_emails.append(validated)
             
-            return list(set(valid_emails))
+            valid_emails = list(set(valid_emails))
+            if self.ledger:
+                self.ledger.record(about_url, self.page.url, valid_emails, links)
+            if self.page_cache:
+                phones = re.findall(self.phone_pattern, html)
+                for page_url in (fb_url, self.page.url):
+                    self.page_cache.record(page_url, valid_emails, phones[0] if phones else None, [url for url, _ in links])
+            return valid_emails, links
             
         except Exception as e:
             if self.verbose:
                 print(f"   [ERROR] {str(e)[:50]}")
-            return []
+            return [], []
     
     def scrape_website_url(self, web_url):
-        """Scrape Website URL"""
+        """Scrape Website URL คืน (emails, links)"""
         try:
-            self.page.goto(web_url, wait_until='commit', timeout=self.page_timeout)
-            self.page.wait_for_timeout(self.wait_time)
+            cached = self._ledger_entry(web_url)
+            if cached:
+                return cached
             
-            html = self.page.content()
+            html = self._fetch_html(web_url, 'commit', self.wait_time)
+            if html is None:
+                return [], []
             soup = BeautifulSoup(html, 'lxml')
             text = soup.get_text()
             
+            # Facebook pages + หน้า contact/about ของเว็บเดียวกัน → frontier
+            links = [(url, 'FACEBOOK') for url in self.find_facebook_urls(html)]
+            links += [(url, 'WEBSITE') for url in self.find_contact_urls(html, web_url)]
+            
             # Find emails in both HTML and text
             raw_emails = set()
             raw_emails.update(re.findall(self.email_pattern, text, re.IGNORECASE))
@@ -221,21 +516,24 @@ class CrossRefScraper:
                 if validated:
                     valid_emails.append(validated)
             
-            return list(set(valid_emails))
+            valid_emails = list(set(valid_emails))
+            if self.ledger:
+                self.ledger.record(web_url, self.page.url, valid_emails, links)
+            return valid_emails, links
             
         except Exception as e:
             if self.verbose:
                 print(f"   [ERROR] {str(e)[:50]}")
-            return []
+            return [], []
     
     # ==================== Processing ====================
     
-    def process_discovered_url(self, url_id, place_id, url, url_type):
+    def process_discovered_url(self, url_id, place_id, url, url_type, depth=0):
         """Process 1 discovered URL"""
         if self.verbose:
             print(f"\n{'='*60}")
             print(f"[PROCESSING] {url_type}: {url}")
-            print(f"   Place ID: {place_id}")
+            print(f"   Place ID: {place_id} (depth {depth})")
         
         try:
             # Lock
@@ -243,18 +541,24 @@ class CrossRefScraper:
             
             # Scrape based on type
             emails = []
+            links = []
             if url_type == 'FACEBOOK':
                 if self.verbose:
                     print(f"   [SCRAPE] Facebook page...")
-                emails = self.scrape_facebook_url(url)
+                emails, links = self.scrape_facebook_url(url)
                 source = 'CROSSREF_FB'
                 
             elif url_type == 'WEBSITE':
                 if self.verbose:
                     print(f"   [SCRAPE] Website...")
-                emails = self.scrape_website_url(url)
+                emails, links = self.scrape_website_url(url)
                 source = 'CROSSREF_WEB'
             
+            # Frontier: URL ใหม่ → discovered_urls (depth+1)
+            added = self.save_frontier_urls(url_id, place_id, depth, links)
+            if added and self.verbose:
+                print(f"   [FRONTIER] +{added} URL(s) → discovered_urls (depth {depth + 1})")
+            
             # Save emails
             if emails:
                 for email in emails:
@@ -277,57 +581,181 @@ class CrossRefScraper:
             self.finalize_discovered_url(url_id, 'FAILED')
             return False
     
-    def run(self, limit=None):
+    def run(self, limit=None, satisfied='defer', max_minutes=None):
         """Main execution"""
         start_time = time.time()
+        deadline = start_time + max_minutes * 60 if max_minutes else None
+        progress = ProgressReporter('stage4')
         
         # Connect DB
         self.connect_db()
         
         try:
-            # Get discovered URLs
-            urls = self.get_discovered_urls(limit)
-            
-            if not urls:
-                print("[INFO] No discovered URLs to process (status='NEW')")
-                return
-            
-            print(f"[START] Processing {len(urls)} discovered URLs...\n")
-            
-            # Initialize browser
-            self.init_browser()
+            self.load_visited()
             
             success_count = 0
             failed_count = 0
+            processed = 0
+            rounds = 0
+            satisfied_places = set()
+            stopped = False
             
-            # Process each URL
-            for idx, (url_id, place_id, url, url_type) in enumerate(urls, 1):
-                print(f"[{idx}/{len(urls)}] ", end="")
+            # วนจน frontier หมด: แต่ละรอบ schedule URL ที่ยังเป็น NEW (รวม URL ที่รอบก่อนเพิ่งเพิ่ม)
+            while not stopped:
+                remaining = limit - processed if limit else None
+                if remaining is not None and remaining <= 0:
+                    break
                 
-                success = self.process_discovered_url(url_id, place_id, url, url_type)
+                # Get discovered URLs (เรียงตาม expected yield)
+                urls, skipped = self.schedule_urls(self.get_discovered_urls(), satisfied=satisfied, limit=remaining)
                 
-                if success:
-                    success_count += 1
-                else:
-                    failed_count += 1
+                for url_id, _place_id, _url, _url_type, _depth in skipped:
+                    self.finalize_discovered_url(url_id, 'SKIPPED')
+                
+                if not urls:
+                    if rounds == 0:
+                        print("[INFO] No discovered URLs to process (status='NEW')")
+                        progress.finish(0, total=0)
+                        return
+                    break
+                
+                rounds += 1
+                print(f"[START] Round {rounds}: processing {len(urls)} discovered URLs...\n")
+                
+                # Initialize browser (ครั้งแรกครั้งเดียว)
+                if not self.page:
+                    self.init_browser()
+                
+                # Process each URL — place ที่เพิ่งได้อีเมลในรอบนี้ เลื่อน URL ที่เหลือไปท้ายคิว (หรือข้ามถ้า skip)
+                queue = deque(urls)
+                deferred_ids = set()
+                round_total = processed + len(urls)
+                while queue:
+                    if deadline and time.time() >= deadline:
+                        print(f"\n[TIME LIMIT] หมดเวลา {max_minutes} นาที — เหลือ {len(queue)} URLs (status='NEW')")
+                        stopped = True
+                        break
+                    
+                    url_id, place_id, url, url_type, depth = queue.popleft()
+                    if place_id in satisfied_places:
+                        if satisfied == 'skip':
+                            self.finalize_discovered_url(url_id, 'SKIPPED')
+                            round_total -= 1
+                            continue
+                        if satisfied == 'defer' and url_id not in deferred_ids:
+                            deferred_ids.add(url_id)
+                            queue.append((url_id, place_id, url, url_type, depth))
+                            continue
+                    
+                    processed += 1
+                    print(f"[{processed}/{round_total}] ", end="")
+                    
+                    success = self.process_discovered_url(url_id, place_id, url, url_type, depth)
+                    
+                    if success:
+                        success_count += 1
+                        satisfied_places.add(place_id)
+                    else:
+                        failed_count += 1
+                    # total ของรอบนี้ — frontier อาจเพิ่มรอบถัดไป
+                    progress.report(processed, success_count, failed_count, self.emails_saved, round_total)
             
             elapsed = time.time() - start_time
+            progress.finish(processed, success_count, failed_count, self.emails_saved, processed)
             
             print(f"\n{'='*60}")
             print(f"[SUCCESS] {success_count} URLs")
             print(f"[FAILED] {failed_count} URLs")
-            print(f"[TIME] {elapsed:.2f} seconds ({elapsed/len(urls):.2f}s per URL)")
+            print(f"[ROUNDS] {rounds} (max depth {self.max_depth})")
+            print(f"[PLACES] {len(satisfied_places)} places ได้อีเมลใหม่")
+            if self.page_cache:
+                print(f"[PAGE CACHE] {self.page_cache.summary()}")
+            if self.ledger:
+                print(f"[LEDGER] {self.ledger.summary()}")
+            if self.archive:
+                print(f"[ARCHIVE] {self.archive.summary()}")
+            print(f"[TIME] {elapsed:.2f} seconds ({elapsed/max(processed, 1):.2f}s per URL)")
             print(f"{'='*60}")
             
         finally:
             self.close_browser()
             self.close_db()
+    
+    def run_reextract(self, limit=None):
+        """
+        Re-extract อีเมลจาก HTML ใน archive (ไม่เปิด browser)
+        ทุก discovered URL ที่ process แล้ว — เจออีเมลใหม่ → บันทึก + status='DONE' (ไม่ลด status)
+        """
+        start_time = time.time()
+        self.connect_db()
+        
+        try:
+            self.load_visited()
+            
+            sql = """
+                SELECT id, place_id, url, url_type, depth
+                FROM discovered_urls
+                WHERE status IN ('DONE', 'FAILED')
+                ORDER BY depth, id
+            """
+            if limit:
+                sql += f" LIMIT {limit}"
+            self.cursor.execute(sql)
+            records = self.cursor.fetchall()
+            
+            print(f"[START] Re-extracting {len(records)} discovered URLs from {self.archive_path}...\n")
+            
+            places_with_new = set()
+            new_emails = 0
+            new_urls = 0
+            for idx, (url_id, place_id, url, url_type, depth) in enumerate(records, 1):
+                if self.verbose:
+                    print(f"[{idx}/{len(records)}] {url_type}: {url}")
+                if url_type == 'FACEBOOK':
+                    emails, links = self.scrape_facebook_url(url)
+                    source = 'CROSSREF_FB'
+                else:
+                    emails, links = self.scrape_website_url(url)
+                    source = 'CROSSREF_WEB'
+                
+                # URL ใหม่ที่ extraction ใหม่เจอ → frontier (status NEW, รอรัน Stage 4 ปกติ)
+                new_urls += self.save_frontier_urls(url_id, place_id, depth, links)
+                
+                before = self.emails_saved
+                for email in emails:
+                    self.save_email(place_id, email, source)
+                added = self.emails_saved - before  # rowcount ของ INSERT OR IGNORE (ไม่นับแถวที่ trigger เขียน)
+                if added:
+                    places_with_new.add(place_id)
+                    new_emails += added
+                    self.finalize_discovered_url(url_id, 'DONE')
+            
+            elapsed = time.time() - start_time
+            
+            print(f"\n{'='*60}")
+            print(f"[NEW EMAILS] {new_emails} emails ใน {len(places_with_new)} places")
+            print(f"[FRONTIER] +{new_urls} URLs (status='NEW')")
+            print(f"[ARCHIVE] {self.archive.summary()}")
+            print(f"[TIME] {elapsed:.2f} seconds")
+            print(f"{'='*60}")
+            
+        finally:
+            self.close_db()
 
 
 def main():
     parser = argparse.ArgumentParser(description='Stage 4: Cross-Reference Scraper')
     parser.add_argument('--db', default='pipeline.db', help='SQLite database path')
     parser.add_argument('--limit', type=int, help='จำกัดจำนวน URLs')
+    parser.add_argument('--satisfied', choices=SATISFIED_MODES, default='defer',
+                        help='URL ของ place ที่มีอีเมลแล้ว: defer=ทำทีหลัง, skip=ข้าม (status=SKIPPED), include=ไม่แยก')
+    parser.add_argument('--max-minutes', type=float, help='จำกัดเวลารัน (นาที) — URL ที่เหลือยังเป็น NEW')
+    parser.add_argument('--max-depth', type=int, default=2, help='ความลึกสูงสุดของ frontier (0 = ไม่เพิ่ม URL ใหม่)')
+    parser.add_argument('--max-urls-per-place', type=int, default=10, help='จำนวน discovered URLs สูงสุดต่อ place')
+    parser.add_argument('--ledger-ttl', type=float, default=24, help='อายุผล fetch ที่ใช้ซ้ำได้ (ชั่วโมง, 0 = ไม่ใช้ ledger)')
+    parser.add_argument('--page-cache-ttl', type=float, default=168, help='อายุผล Facebook page ที่ใช้ซ้ำได้ (ชั่วโมง, 0 = ไม่ใช้ cache)')
+    parser.add_argument('--archive', nargs='?', const=DEFAULT_ARCHIVE_PATH, help=f'เก็บ HTML ที่ fetch ลง archive (default: {DEFAULT_ARCHIVE_PATH})')
+    parser.add_argument('--reextract', action='store_true', help='รัน extraction ใหม่จาก archive โดยไม่เปิด browser')
     parser.add_argument('--verbose', '-v', action='store_true', help='แสดงข้อความละเอียด')
     
     args = parser.parse_args()
@@ -336,8 +764,20 @@ def main():
     print("Stage 4: Cross-Reference Scraper 🔗")
     print("=" * 60)
     
-    scraper = CrossRefScraper(args.db, verbose=args.verbose)
-    scraper.run(limit=args.limit)
+    scraper = CrossRefScraper(
+        args.db,
+        verbose=args.verbose,
+        ledger_ttl=args.ledger_ttl,
+        archive_path=args.archive,
+        reextract=args.reextract,
+        page_cache_ttl=args.page_cache_ttl,
+    )
+    scraper.max_depth = args.max_depth
+    scraper.max_urls_per_place = args.max_urls_per_place
+    if args.reextract:
+        scraper.run_reextract(limit=args.limit)
+    else:
+        scraper.run(limit=args.limit, satisfied=args.satisfied, max_minutes=args.max_minutes)
     
     print("\n[DONE] Stage 4 completed! ✅")
 